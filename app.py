@@ -5,54 +5,116 @@
 #
 #############################################################################
 
+# Set STARTUP_PROFILE=1 to log how long each module takes to import
+import startup_profile
+startup_profile.enable_from_env()
+
 import streamlit as st
-from modules import display_my_custom_component, display_post, display_genai_advice, display_activity_summary, display_recent_workouts, display_sensor_data
+from modules import display_my_custom_component, display_post, display_post_feed, display_genai_advice, display_activity_summary, display_recent_workouts, display_sensor_data
+from modules import display_perf_panel, display_activity_rollup
 from data_fetcher import get_user_posts, get_genai_advice, get_user_profile, get_user_sensor_data, get_user_workouts
+from data_fetcher import get_user_posts_page, get_activity_rollup
 
 # New imports
-from datetime import datetime
-from google.cloud import bigquery
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+# Threads shared by every session for running a page's data fetches in
+# parallel. Bounded so a burst of reruns can't open unlimited connections.
+PREFETCH_WORKERS = 6
+_prefetch_pool = ThreadPoolExecutor(max_workers=PREFETCH_WORKERS, thread_name_prefix='prefetch')
+
+# How many workouts the "recent workouts" tab shows
+RECENT_WORKOUTS_LIMIT = 10
+
+# How many weeks of totals the "activity summary" tab shows
+ACTIVITY_SUMMARY_WEEKS = 52
+
+
+def prefetch_page_data():
+    """Starts every data fetch the page needs and returns their futures.
+
+    The fetches run in the background while the tabs are drawn, so each tab
+    only waits for its own data and a slow one (like the Gemini call) doesn't
+    hold up the tabs before it.
+
+    Returns:
+        dict: A concurrent.futures.Future for each tab's data.
+    """
+    return {
+        'posts': _prefetch_pool.submit(get_user_posts_page, 'user3'),
+        # Streamed, so the tab shows Gemini's first words as soon as they arrive
+        'advice': _prefetch_pool.submit(get_genai_advice, 'user1', stream=True),
+        'activity_summary': _prefetch_pool.submit(get_activity_rollup, 'user1', 'week',
+                                                  start_date=date.today() - timedelta(weeks=ACTIVITY_SUMMARY_WEEKS)),
+        'recent_workouts': _prefetch_pool.submit(get_user_workouts, 'user1', limit=RECENT_WORKOUTS_LIMIT),
+        'sensor_data': _prefetch_pool.submit(get_user_sensor_data, 'user1', 'workout1', output='dataframe'),
+    }
+
+
+@contextmanager
+def timed_tab(name):
+    """Records how long a tab took to draw (including waiting for its data)
+    in st.session_state.tab_timings, in seconds."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        st.session_state.setdefault('tab_timings', {})[name] = time.perf_counter() - start
+
 
 # Created tabs and display post code by Copilot using the following prompt: "create a streamlit app that showcases a post. that post will have a timestamp, post_image, username, content (of the post), and user_image."
 def display_app_page():
     """Displays the home page of the app."""
     st.title('Welcome to SDS!')
 
+    # Start all the queries now, each tab below waits for its own result
+    data = prefetch_page_data()
+
     tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(["Home", "GenAI Advice", "Activity Summary", "Recent Workouts", "Sensor Data", "Community"])
-    userId = None # Example data
 
-    with tab1:
+    with tab1, timed_tab("Home"):
         # An example of displaying a custom component called "my_custom_component"
         value = st.text_input('Enter your name')
         display_my_custom_component(value)
 
-        # Get data
-        userId = 'user3'
-        posts = get_user_posts(userId)  # Fetch a list of posts
-        for post in posts: # Show every post
-            display_post(post["username"], post["user_image"], post["timestamp"], post["content"], post["image"])
+        # Get data for user3
+        first_page = data['posts'].result()  # Fetch the newest page of posts
+        display_post_feed('user3', first_page)  # Show them, with a button for older ones
         
-    with tab2:
-        advice = get_genai_advice(userId)
+    with tab2, timed_tab("GenAI Advice"):
+        # The only Gemini call of the page view is the prefetch above
+        advice = data['advice'].result()
         #call method in modules that displays the genAI advice
-        display_genai_advice(advice['timestamp'], advice['content'], advice['image'])
+        display_genai_advice(advice['timestamp'], advice['content'], advice['image'], stream=True)
     
-    with tab3:
-        # Fetch user workouts and display activity summary
-        userId = 'user1'
-        workouts = get_user_workouts(userId)  # Fetch workouts for the user
-        display_activity_summary(workouts)  # Pass workouts to display activity summary
-
-    with tab4:
-        userId = 'user1'
-        workouts = get_user_workouts(userId)
+    with tab3, timed_tab("Activity Summary"):
+        # Show user1's weekly totals, which cost the same however many
+        # workouts they have
+        rollup = data['activity_summary'].result()
+        if rollup is None:
+            # The rollups couldn't be read, so total the workouts instead
+            display_activity_summary(get_user_workouts('user1', incremental=True))
+        else:
+            display_activity_rollup(rollup, 'week')
+
+    with tab4, timed_tab("Recent Workouts"):
+        workouts = data['recent_workouts'].result()
         display_recent_workouts(workouts)
 
-    with tab5:
-        userId = 'user1'
-        sensor_data = get_user_sensor_data(userId, 'workout1')
+    with tab5, timed_tab("Sensor Data"):
+        sensor_data = data['sensor_data'].result()
         display_sensor_data(sensor_data)
 
+    # Set PERF_PANEL=1 to see how long each fetch took in the sidebar
+    if os.environ.get('PERF_PANEL'):
+        display_perf_panel()
+
 # This is the starting point for your app. You do not need to change these lines
 if __name__ == '__main__':
     display_app_page()
+    # Includes the dependencies that were only imported while drawing the page
+    startup_profile.print_report_once()
@@ -0,0 +1,134 @@
+#############################################################################
+# app_test.py
+#
+# This file contains tests for app.py.
+#############################################################################
+
+import datetime
+import os
+import threading
+import unittest
+from unittest.mock import patch
+
+from streamlit.testing.v1 import AppTest
+
+from instrumentation import recorder
+from records import Post, Workout
+
+ADVICE = {'advice_id': 1, 'timestamp': '2024-01-01 00:00:00', 'content': 'Keep going!', 'image': None}
+POSTS = [Post('post1', 'user3', datetime.datetime(2024, 1, 1), 'Hello', '', 'jordan', '')]
+PAGE = {'posts': POSTS, 'next_cursor': None}
+ROLLUP = [{'period_start': '2024-07-29', 'workouts': 1, 'distance': 5.0, 'steps': 8000, 'calories_burned': 400.0,
+           'active_minutes': 60.0}]
+WORKOUTS = [Workout('workout1', datetime.datetime(2024, 7, 29, 7), datetime.datetime(2024, 7, 29, 8), None, None, 5.0, 8000, 400.0)]
+
+
+class TestDisplayAppPage(unittest.TestCase):
+
+    @patch('modules.get_genai_advice', return_value=ADVICE)
+    @patch('data_fetcher.get_genai_advice', return_value=ADVICE)
+    @patch('data_fetcher.get_user_sensor_data', return_value=[])
+    @patch('data_fetcher.get_user_workouts', return_value=WORKOUTS)
+    @patch('data_fetcher.get_user_posts_page', return_value=PAGE)
+    @patch('data_fetcher.get_activity_rollup', return_value=ROLLUP)
+    def test_fetches_are_prefetched_and_timed(self, mock_rollup, mock_posts, mock_workouts, mock_sensor_data, mock_advice, mock_modules_advice):
+        """Tests that every tab's data is fetched once and each tab's time is recorded."""
+        at = AppTest.from_file("app.py", default_timeout=30).run()
+
+        self.assertFalse(at.exception)
+        mock_posts.assert_called_once_with('user3')
+        mock_advice.assert_called_once_with('user1', stream=True)
+        mock_modules_advice.assert_not_called()
+        mock_sensor_data.assert_called_once_with('user1', 'workout1', output='dataframe')
+        mock_workouts.assert_called_once_with('user1', limit=10)
+        self.assertEqual(mock_rollup.call_args[0], ('user1', 'week'))
+        self.assertEqual(set(at.session_state.tab_timings),
+                         {"Home", "GenAI Advice", "Activity Summary", "Recent Workouts", "Sensor Data"})
+
+    @patch('modules.get_genai_advice', return_value=ADVICE)
+    @patch('data_fetcher.get_user_sensor_data', return_value=[])
+    @patch('data_fetcher.get_user_workouts', return_value=WORKOUTS)
+    @patch('data_fetcher.get_user_posts_page', return_value=PAGE)
+    @patch('data_fetcher.get_genai_advice')
+    @patch('data_fetcher.get_activity_rollup', return_value=ROLLUP)
+    def test_home_tab_does_not_wait_for_advice(self, mock_rollup, mock_advice, mock_posts, mock_workouts, mock_sensor_data, mock_modules_advice):
+        """Tests that the fetches run in the background, in parallel with each other."""
+        advice_started = threading.Event()
+        posts_done = threading.Event()
+        waits = []
+
+        def slow_advice(user_id, stream=False):
+            advice_started.set()
+            # Only finishes once posts were fetched on another thread
+            waits.append(posts_done.wait(timeout=5))
+            return ADVICE
+
+        def posts(user_id):
+            waits.append(advice_started.wait(timeout=5))
+            posts_done.set()
+            return PAGE
+
+        mock_advice.side_effect = slow_advice
+        mock_posts.side_effect = posts
+
+        at = AppTest.from_file("app.py", default_timeout=30).run()
+
+        self.assertFalse(at.exception)
+        self.assertEqual(waits, [True, True])
+
+    @patch('modules.get_genai_advice')
+    @patch('data_fetcher.get_genai_advice')
+    @patch('data_fetcher.get_user_sensor_data', return_value=[])
+    @patch('data_fetcher.get_user_workouts', return_value=WORKOUTS)
+    @patch('data_fetcher.get_user_posts_page', return_value=PAGE)
+    @patch('data_fetcher.get_activity_rollup', return_value=ROLLUP)
+    def test_advice_is_streamed(self, mock_rollup, mock_posts, mock_workouts, mock_sensor_data, mock_advice, mock_modules_advice):
+        """Tests that the prefetched stream is what the GenAI Advice tab shows."""
+        mock_advice.return_value = dict(ADVICE, content=iter(["Keep ", "going!"]))
+
+        at = AppTest.from_file("app.py", default_timeout=30).run()
+
+        self.assertFalse(at.exception)
+        self.assertIn(":red[Keep going!]", [title.value.strip() for title in at.title])
+        mock_modules_advice.assert_not_called()
+
+    @patch('modules.get_genai_advice', return_value=ADVICE)
+    @patch('data_fetcher.get_genai_advice', return_value=ADVICE)
+    @patch('data_fetcher.get_user_sensor_data', return_value=[])
+    @patch('data_fetcher.get_user_workouts', return_value=WORKOUTS)
+    @patch('data_fetcher.get_user_posts_page', return_value=PAGE)
+    @patch('data_fetcher.get_activity_rollup', return_value=None)
+    def test_activity_summary_without_rollup(self, mock_rollup, mock_posts, mock_workouts, mock_sensor_data, mock_advice, mock_modules_advice):
+        """Tests that the workouts are shown when the rollups can't be read."""
+        at = AppTest.from_file("app.py", default_timeout=30).run()
+
+        self.assertFalse(at.exception)
+        self.assertEqual(len(at.warning), 0)
+        self.assertIn("Activity Summary", [subheader.value for subheader in at.subheader])
+        mock_workouts.assert_any_call('user1', incremental=True)
+
+    @patch('modules.get_genai_advice', return_value=ADVICE)
+    @patch('data_fetcher.get_genai_advice', return_value=ADVICE)
+    @patch('data_fetcher.get_user_sensor_data', return_value=[])
+    @patch('data_fetcher.get_user_workouts', return_value=WORKOUTS)
+    @patch('data_fetcher.get_user_posts_page', return_value=PAGE)
+    @patch('data_fetcher.get_activity_rollup', return_value=ROLLUP)
+    def test_perf_panel(self, mock_rollup, mock_posts, mock_workouts, mock_sensor_data, mock_advice, mock_modules_advice):
+        """Tests that the performance panel is only shown when PERF_PANEL is set."""
+        recorder.clear()
+        recorder.add({'operation': 'get_user_workouts', 'seconds': 0.2, 'rows': 1})
+
+        at = AppTest.from_file("app.py", default_timeout=30).run()
+        self.assertEqual(len(at.sidebar.subheader), 0)
+
+        with patch.dict(os.environ, {'PERF_PANEL': '1'}):
+            at = AppTest.from_file("app.py", default_timeout=30).run()
+        recorder.clear()
+
+        self.assertFalse(at.exception)
+        self.assertEqual(at.sidebar.subheader[0].value, "Performance")
+        self.assertEqual(at.sidebar.dataframe[0].value['Operation'].tolist(), ['get_user_workouts'])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+#############################################################################
+# async_data_fetcher.py
+#
+# This file contains asyncio versions of the functions in data_fetcher.py.
+#
+# The BigQuery and Vertex AI clients are blocking, so each coroutine runs its
+# fetcher in a worker thread. Awaiting several of them together (for example
+# with fetch_page_data) makes a page wait for its slowest query instead of
+# the sum of all of them.
+#############################################################################
+
+import asyncio
+
+import data_fetcher
+
+
+async def get_user_sensor_data_async(user_id, workout_id, output='records'):
+    """Async version of data_fetcher.get_user_sensor_data."""
+    return await asyncio.to_thread(data_fetcher.get_user_sensor_data, user_id, workout_id, output=output)
+
+
+async def get_sensor_summary_async(user_id, workout_id):
+    """Async version of data_fetcher.get_sensor_summary."""
+    return await asyncio.to_thread(data_fetcher.get_sensor_summary, user_id, workout_id)
+
+
+async def get_user_workouts_async(user_id, output='records', limit=None):
+    """Async version of data_fetcher.get_user_workouts."""
+    if limit is None:
+        return await asyncio.to_thread(data_fetcher.get_user_workouts, user_id, output=output)
+    return await asyncio.to_thread(data_fetcher.get_user_workouts, user_id, output=output, limit=limit)
+
+
+async def get_activity_rollup_async(user_id, period='day', start_date=None, end_date=None):
+    """Async version of data_fetcher.get_activity_rollup."""
+    return await asyncio.to_thread(data_fetcher.get_activity_rollup, user_id, period, start_date, end_date)
+
+
+async def get_user_profile_async(user_id):
+    """Async version of data_fetcher.get_user_profile."""
+    return await asyncio.to_thread(data_fetcher.get_user_profile, user_id)
+
+
+async def get_user_posts_async(user_id):
+    """Async version of data_fetcher.get_user_posts."""
+    return await asyncio.to_thread(data_fetcher.get_user_posts, user_id)
+
+
+async def get_posts_for_users_async(user_ids, limit=None, before_timestamp=None):
+    """Async version of data_fetcher.get_posts_for_users."""
+    return await asyncio.to_thread(data_fetcher.get_posts_for_users, user_ids, limit, before_timestamp)
+
+
+async def get_genai_advice_async(user_id):
+    """Async version of data_fetcher.get_genai_advice."""
+    return await asyncio.to_thread(data_fetcher.get_genai_advice, user_id)
+
+
+async def gather_fetches(**fetches):
+    """Awaits several fetches concurrently.
+
+    Args:
+        **fetches: Awaitables (such as the coroutines above) keyed by the name
+            their result should be returned under.
+
+    Returns:
+        dict: The result of each fetch under its name. If any fetch raises,
+            the exception is re-raised once all of them have finished.
+    """
+    names = list(fetches)
+    results = await asyncio.gather(*fetches.values(), return_exceptions=True)
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return dict(zip(names, results))
+
+
+async def fetch_page_data(user_id, workout_id=None):
+    """Fetches everything the app page needs for a user in one concurrent batch.
+
+    Args:
+        user_id (str): The ID of the user viewing the page.
+        workout_id (str, optional): The workout whose sensor data is shown.
+            Sensor data is skipped when None.
+
+    Returns:
+        dict: 'profile', 'posts', 'workouts' and (if workout_id was given)
+            'sensor_data', each as returned by the matching fetcher.
+    """
+    fetches = {
+        'profile': get_user_profile_async(user_id),
+        'posts': get_user_posts_async(user_id),
+        'workouts': get_user_workouts_async(user_id),
+    }
+    if workout_id is not None:
+        fetches['sensor_data'] = get_user_sensor_data_async(user_id, workout_id)
+    return await gather_fetches(**fetches)
+
+
+def fetch_page_data_sync(user_id, workout_id=None):
+    """Runs fetch_page_data from code that is not already in an event loop,
+    such as a Streamlit script."""
+    return asyncio.run(fetch_page_data(user_id, workout_id))
@@ -0,0 +1,72 @@
+#############################################################################
+# async_data_fetcher_test.py
+#
+# This file contains tests for async_data_fetcher.py.
+#############################################################################
+
+import time
+import unittest
+from unittest.mock import patch
+
+from async_data_fetcher import fetch_page_data, fetch_page_data_sync, gather_fetches, get_user_workouts_async
+
+
+def slow(value, delay=0.2):
+    """Returns a blocking fake fetcher that takes `delay` seconds."""
+    def fetch(*args, **kwargs):
+        time.sleep(delay)
+        return value
+    return fetch
+
+
+class TestAsyncDataFetcher(unittest.IsolatedAsyncioTestCase):
+
+    @patch('data_fetcher.get_user_workouts')
+    async def test_passes_arguments_through(self, mock_get_user_workouts):
+        """Tests that the async fetcher calls the blocking one with the same arguments."""
+        mock_get_user_workouts.return_value = ['workout']
+        self.assertEqual(await get_user_workouts_async('user1', output='dataframe'), ['workout'])
+        mock_get_user_workouts.assert_called_once_with('user1', output='dataframe')
+
+    @patch('data_fetcher.get_user_sensor_data', new=slow(['reading']))
+    @patch('data_fetcher.get_user_workouts', new=slow(['workout']))
+    @patch('data_fetcher.get_user_posts', new=slow(['post']))
+    @patch('data_fetcher.get_user_profile', new=slow({'username': 'remi'}))
+    async def test_page_fetches_run_concurrently(self):
+        """Tests that four 0.2s fetches take about 0.2s in total, not 0.8s."""
+        start = time.perf_counter()
+        data = await fetch_page_data('user1', 'workout1')
+        elapsed = time.perf_counter() - start
+
+        self.assertEqual(data, {
+            'profile': {'username': 'remi'},
+            'posts': ['post'],
+            'workouts': ['workout'],
+            'sensor_data': ['reading'],
+        })
+        self.assertLess(elapsed, 0.6)
+
+    async def test_gather_fetches_raises_errors(self):
+        """Tests that a failing fetch is reported to the caller."""
+        async def ok():
+            return 1
+
+        async def broken():
+            raise RuntimeError("BigQuery error")
+
+        with self.assertRaises(RuntimeError):
+            await gather_fetches(ok=ok(), broken=broken())
+
+
+class TestFetchPageDataSync(unittest.TestCase):
+
+    @patch('data_fetcher.get_user_workouts', return_value=[])
+    @patch('data_fetcher.get_user_posts', return_value=[])
+    @patch('data_fetcher.get_user_profile', return_value={})
+    def test_without_workout(self, mock_profile, mock_posts, mock_workouts):
+        """Tests the blocking wrapper and that sensor data is optional."""
+        self.assertEqual(fetch_page_data_sync('user1'), {'profile': {}, 'posts': [], 'workouts': []})
+
+
+if __name__ == "__main__":
+    unittest.main()
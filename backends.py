@@ -0,0 +1,1145 @@
+#############################################################################
+# backends.py
+#
+# This file contains the storage backends that the functions in
+# data_fetcher.py read from.
+#
+# BigQueryBackend runs the app's queries against the BigQuery project.
+# SQLiteBackend holds the same tables (Users, Friends, Workouts, SensorTypes,
+# SensorData and Posts) in a local SQLite database so the app can be run,
+# tested and benchmarked without a Google Cloud project.
+#
+# Every backend method returns something that behaves like a BigQuery
+# RowIterator: it can be iterated to get rows (which support row.Field,
+# row['Field'] and row.items()) and has to_dataframe() and to_arrow().
+#############################################################################
+
+import datetime
+import os
+import sqlite3
+import threading
+
+from cache import result_cache
+from instrumentation import record_query
+
+# Shared BigQuery clients, one per project. Creating a client resolves
+# credentials and opens a new connection pool, so we only do it once.
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_bigquery_client(project=None):
+    """Returns the process-wide BigQuery client for the given project.
+
+    The client is created lazily on first use and then reused by every
+    fetcher (and every Streamlit session), so its credentials and HTTP
+    connection pool are shared. If `bigquery.Client` has been swapped out
+    (for example by a test patch) a new client is created from it.
+
+    Args:
+        project (str, optional): The Google Cloud project ID. None uses the
+            project from the environment, like `bigquery.Client()` does.
+
+    Returns:
+        bigquery.Client: The shared client.
+    """
+    # Imported here because google.cloud.bigquery is slow to import and not
+    # needed by the SQLite backend
+    from google.cloud import bigquery
+    factory = bigquery.Client
+    entry = _clients.get(project)
+    if entry is not None and entry[0] is factory:
+        return entry[1]
+    with _clients_lock:
+        entry = _clients.get(project)
+        if entry is None or entry[0] is not factory:
+            client = factory(project=project) if project else factory()
+            entry = (factory, client)
+            _clients[project] = entry
+    return entry[1]
+
+
+def reset_bigquery_clients():
+    """Closes and forgets all shared BigQuery clients."""
+    with _clients_lock:
+        for factory, client in _clients.values():
+            close = getattr(client, 'close', None)
+            if callable(close):
+                close()
+        _clients.clear()
+
+
+# The periods the activity rollups are kept for. Weeks start on Monday and
+# both use the UTC date of each workout's StartTimestamp.
+ROLLUP_PERIODS = ('day', 'week')
+
+# The columns of the ActivityRollups table
+ROLLUP_COLUMNS = ('UserId', 'Period', 'PeriodStart', 'Workouts', 'TotalDistance', 'TotalSteps',
+                  'CaloriesBurned', 'ActiveMinutes')
+
+# The columns of the Workouts table, with their BigQuery types
+WORKOUT_COLUMN_TYPES = {
+    'WorkoutId': 'STRING',
+    'UserId': 'STRING',
+    'StartTimestamp': 'TIMESTAMP',
+    'EndTimestamp': 'TIMESTAMP',
+    'StartLocationLat': 'FLOAT64',
+    'StartLocationLong': 'FLOAT64',
+    'EndLocationLat': 'FLOAT64',
+    'EndLocationLong': 'FLOAT64',
+    'TotalDistance': 'FLOAT64',
+    'TotalSteps': 'INT64',
+    'CaloriesBurned': 'FLOAT64',
+}
+
+
+def period_start(timestamp, period):
+    """Returns the first day of the day/week a timestamp falls in (in UTC)."""
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(datetime.timezone.utc)
+    day = timestamp.date()
+    return day if period == 'day' else day - datetime.timedelta(days=day.weekday())
+
+
+def activity_deltas(workouts):
+    """Aggregates new workouts into the amounts to add to the rollups.
+
+    Args:
+        workouts (iterable): Workouts rows (dicts with UserId,
+            StartTimestamp, EndTimestamp, TotalDistance, TotalSteps and
+            CaloriesBurned, timestamps as datetimes).
+
+    Returns:
+        list: One dict per (UserId, Period, PeriodStart) touched, with the
+            ROLLUP_COLUMNS as keys.
+    """
+    deltas = {}
+    for workout in workouts:
+        start, end = workout['StartTimestamp'], workout.get('EndTimestamp')
+        active_minutes = (end - start).total_seconds() / 60 if end is not None else 0.0
+        for period in ROLLUP_PERIODS:
+            key = (workout['UserId'], period, period_start(start, period))
+            delta = deltas.get(key)
+            if delta is None:
+                delta = deltas[key] = dict(zip(ROLLUP_COLUMNS, key + (0, 0.0, 0, 0.0, 0.0)))
+            delta['Workouts'] += 1
+            delta['TotalDistance'] += workout.get('TotalDistance') or 0.0
+            delta['TotalSteps'] += workout.get('TotalSteps') or 0
+            delta['CaloriesBurned'] += workout.get('CaloriesBurned') or 0.0
+            delta['ActiveMinutes'] += active_minutes
+    return list(deltas.values())
+
+
+class Backend:
+    """The queries the data fetchers need. Subclasses implement each one."""
+
+    name = 'backend'
+
+    @property
+    def source(self):
+        """Names the data this backend reads (such as its BigQuery dataset),
+        so data kept on disk from two backends is never mixed up."""
+        return self.name
+
+    def sensor_data(self, user_id, workout_id, page_size=None):
+        """Returns a workout's sensor readings.
+
+        Columns: UserId, SensorId, Name, Units, Timestamp, SensorValue.
+        """
+        raise NotImplementedError
+
+    def sensor_summary(self, user_id, workout_id):
+        """Returns one row of aggregates per sensor of a workout.
+
+        Columns: SensorId, Name, Units, SampleCount, MinValue, MaxValue,
+        MeanValue, P25, Median, P75, P95.
+        """
+        raise NotImplementedError
+
+    def workouts(self, user_id, limit=None, after=None):
+        """Returns a user's workouts.
+
+        Columns: WorkoutId, StartTimestamp, EndTimestamp, StartLocationLat,
+        StartLocationLong, EndLocationLat, EndLocationLong, TotalDistance,
+        TotalSteps, CaloriesBurned.
+
+        With a limit, only the `limit` most recent workouts are returned,
+        newest first (ties broken by WorkoutId, descending).
+
+        With after, a (StartTimestamp, WorkoutId) watermark, only the
+        workouts after it in (StartTimestamp, WorkoutId) order are returned,
+        oldest first.
+        """
+        raise NotImplementedError
+
+    def profile(self, user_id):
+        """Returns at most one row for a user's profile.
+
+        Columns: full_name, username, date_of_birth, profile_image, friends
+        (the friends' user IDs, sorted).
+        """
+        raise NotImplementedError
+
+    def add_workouts(self, workouts):
+        """Stores new workouts and adds them to the activity rollups.
+
+        Args:
+            workouts (list): Workouts rows (dicts with the Workouts columns,
+                timestamps as datetimes) that aren't stored yet.
+        """
+        raise NotImplementedError
+
+    def add_to_activity_rollups(self, workouts):
+        """Adds workouts that are already stored (for example by another
+        service) to the activity rollups.
+
+        Workouts that were added to the rollups before are skipped, checked
+        against the RolledUpWorkouts table in the same transaction, so
+        several processes can add the same workouts without counting them
+        twice.
+
+        Args:
+            workouts (list): Workouts rows, like for add_workouts.
+        """
+        raise NotImplementedError
+
+    def activity_rollup(self, user_id, period, start_date=None, end_date=None):
+        """Returns a user's rollup rows for one period ('day' or 'week'),
+        oldest first, for the periods starting between start_date and
+        end_date (both inclusive, None for no bound).
+
+        Columns: PeriodStart, Workouts, TotalDistance, TotalSteps,
+        CaloriesBurned, ActiveMinutes.
+        """
+        raise NotImplementedError
+
+    def rebuild_activity_rollups(self, user_id=None):
+        """Recomputes the activity rollups of one user (or every user) from
+        their Workouts rows, for example to fill them the first time."""
+        raise NotImplementedError
+
+    def posts(self, user_id):
+        """Returns a user's posts joined with the author's Users row.
+
+        Columns: PostId, AuthorId, Timestamp, Content, PostImageUrl, Username,
+        UserImageUrl.
+        """
+        raise NotImplementedError
+
+    def posts_for_users(self, user_ids, limit=None, before_timestamp=None, before_post_id=None):
+        """Returns the posts of several users, newest first (ties broken by
+        PostId, descending), with the same columns as posts().
+
+        With before_post_id, the posts are the ones after the keyset cursor
+        (before_timestamp, before_post_id) in that order.
+        """
+        raise NotImplementedError
+
+
+class BigQueryBackend(Backend):
+    """Runs the app's queries in BigQuery."""
+
+    name = 'bigquery'
+
+    def __init__(self, dataset="keishlyanysanabriatechx25.bytemeproject", project="keishlyanysanabriatechx25"):
+        """Creates a backend for the given dataset.
+
+        Args:
+            dataset (str): The `project.dataset` holding the app's tables.
+            project (str): The project the sensor data queries are billed to.
+                The other queries use the environment's default project.
+        """
+        self.dataset = dataset
+        self.project = project
+
+    @property
+    def source(self):
+        return f"{self.name}:{self.dataset}"
+
+    #asked Gemini for help on how to write the query since it needed a lot of parameters
+    def sensor_data_query(self, user_id, workout_id):
+        # Builds the query for one workout's sensor readings
+        return f"""
+            SELECT
+            Workouts.UserId,
+            COALESCE(SensorTypes.SensorId, SensorData.SensorId) AS SensorId,
+            SensorTypes.Name,
+            SensorTypes.Units,
+            SensorData.Timestamp,
+            SensorData.SensorValue
+        FROM
+            `{self.dataset}.Workouts` AS Workouts
+        INNER JOIN
+            `{self.dataset}.SensorData` AS SensorData
+        ON Workouts.WorkoutId = SensorData.WorkoutID
+        LEFT JOIN
+            `{self.dataset}.SensorTypes` AS SensorTypes
+        ON SensorData.SensorId = SensorTypes.SensorId
+        WHERE
+        Workouts.UserId = @user_id
+        AND Workouts.WorkoutId = @workout_id;
+        """
+
+    def sensor_data_parameters(self, user_id, workout_id):
+        # The query parameters of sensor_data_query
+        from google.cloud import bigquery
+        return bigquery.QueryJobConfig(
+            query_parameters=[
+                bigquery.ScalarQueryParameter("user_id", "STRING", user_id),
+                bigquery.ScalarQueryParameter("workout_id", "STRING", workout_id),
+            ]
+        )
+
+    def sensor_data(self, user_id, workout_id, page_size=None):
+        client = get_bigquery_client(self.project)
+        query_job = client.query(self.sensor_data_query(user_id, workout_id),
+                                 job_config=self.sensor_data_parameters(user_id, workout_id))
+        record_query(query_job)
+        if page_size is None:
+            return query_job.result()
+        return query_job.result(page_size=page_size)
+
+    def sensor_summary(self, user_id, workout_id):
+        from google.cloud import bigquery
+        client = get_bigquery_client(self.project)
+
+        # Aggregate inside BigQuery so only one row per sensor is sent back.
+        # APPROX_QUANTILES(x, 100) returns the 0th to 100th percentiles.
+        query = f"""
+        WITH Summary AS (
+            SELECT
+                SensorData.SensorId,
+                COUNT(SensorData.SensorValue) AS SampleCount,
+                MIN(SensorData.SensorValue) AS MinValue,
+                MAX(SensorData.SensorValue) AS MaxValue,
+                AVG(SensorData.SensorValue) AS MeanValue,
+                APPROX_QUANTILES(SensorData.SensorValue, 100) AS Percentiles
+            FROM
+                `{self.dataset}.Workouts` AS Workouts
+            INNER JOIN
+                `{self.dataset}.SensorData` AS SensorData
+            ON Workouts.WorkoutId = SensorData.WorkoutID
+            WHERE
+                Workouts.UserId = @user_id
+                AND Workouts.WorkoutId = @workout_id
+            GROUP BY SensorData.SensorId
+        )
+        SELECT
+            Summary.SensorId,
+            SensorTypes.Name,
+            SensorTypes.Units,
+            Summary.SampleCount,
+            Summary.MinValue,
+            Summary.MaxValue,
+            Summary.MeanValue,
+            Summary.Percentiles[OFFSET(25)] AS P25,
+            Summary.Percentiles[OFFSET(50)] AS Median,
+            Summary.Percentiles[OFFSET(75)] AS P75,
+            Summary.Percentiles[OFFSET(95)] AS P95
+        FROM Summary
+        LEFT JOIN
+            `{self.dataset}.SensorTypes` AS SensorTypes
+        ON Summary.SensorId = SensorTypes.SensorId
+        ORDER BY Summary.SensorId
+    """
+
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[
+                bigquery.ScalarQueryParameter("user_id", "STRING", user_id),
+                bigquery.ScalarQueryParameter("workout_id", "STRING", workout_id),
+            ]
+        )
+        query_job = client.query(query, job_config=job_config)
+        record_query(query_job)
+        return query_job.result()
+
+    def workouts(self, user_id, limit=None, after=None):
+        from google.cloud import bigquery
+        client = get_bigquery_client()
+        if after is not None:
+            return self._workouts_after(client, user_id, after)
+        # Only the newest workouts are needed when there is a limit
+        limit_clause = f"""
+        ORDER BY StartTimestamp DESC, WorkoutId DESC
+        LIMIT {int(limit)}""" if limit is not None else ""
+        query = f"""
+        SELECT
+            WorkoutId,
+            StartTimestamp,
+            EndTimestamp,
+            StartLocationLat,
+            StartLocationLong,
+            EndLocationLat,
+            EndLocationLong,
+            TotalDistance,
+            TotalSteps,
+            CaloriesBurned
+        FROM
+            `{self.dataset}.Workouts`
+        WHERE
+            UserId = @user_id{limit_clause}
+    """
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[bigquery.ScalarQueryParameter("user_id", "STRING", user_id)]
+        )
+        query_job = client.query(query, job_config=job_config)
+        record_query(query_job)
+        return query_job.result()
+
+    def _workouts_after(self, client, user_id, after):
+        # The workouts added since the (StartTimestamp, WorkoutId) watermark
+        from google.cloud import bigquery
+        query = f"""
+        SELECT
+            WorkoutId,
+            StartTimestamp,
+            EndTimestamp,
+            StartLocationLat,
+            StartLocationLong,
+            EndLocationLat,
+            EndLocationLong,
+            TotalDistance,
+            TotalSteps,
+            CaloriesBurned
+        FROM
+            `{self.dataset}.Workouts`
+        WHERE
+            UserId = @user_id
+            AND (StartTimestamp > @after_timestamp
+                 OR (StartTimestamp = @after_timestamp AND WorkoutId > @after_workout_id))
+        ORDER BY StartTimestamp, WorkoutId
+    """
+        job_config = bigquery.QueryJobConfig(query_parameters=[
+            bigquery.ScalarQueryParameter("user_id", "STRING", user_id),
+            bigquery.ScalarQueryParameter("after_timestamp", "TIMESTAMP", after[0]),
+            bigquery.ScalarQueryParameter("after_workout_id", "STRING", after[1]),
+        ])
+        query_job = client.query(query, job_config=job_config)
+        record_query(query_job)
+        return query_job.result()
+
+    def profile(self, user_id):
+        from google.cloud import bigquery
+        client = get_bigquery_client()
+
+        query = f"""
+        SELECT Name AS full_name, Username AS username, DateOfBirth AS date_of_birth,
+            ImageUrl AS profile_image,
+            ARRAY(SELECT FriendId FROM `{self.dataset}.Friends`
+                  WHERE UserId = @user_id ORDER BY FriendId) AS friends
+        FROM `{self.dataset}.Users`
+        WHERE UserId = @user_id
+    """
+
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[bigquery.ScalarQueryParameter("user_id", "STRING", user_id)]
+        )
+
+        query_job = client.query(query, job_config=job_config)
+        record_query(query_job)
+        return query_job.result()
+
+    def posts(self, user_id):
+        from google.cloud import bigquery
+        client = get_bigquery_client()
+
+        # Query to fetch posts for the given user_id and join with Users table
+        query = f"""
+        SELECT p.PostId, p.AuthorId, p.Timestamp, p.Content, p.ImageUrl as PostImageUrl,
+            u.Username, u.ImageUrl as UserImageUrl
+        FROM `{self.dataset}.Posts` p
+        JOIN `{self.dataset}.Users` u
+        ON p.AuthorId = u.UserId
+        WHERE p.AuthorId = @user_id
+    """
+
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[bigquery.ScalarQueryParameter("user_id", "STRING", user_id)]
+        )
+        # The query job can be iterated directly to get the rows
+        query_job = client.query(query, job_config=job_config)
+        record_query(query_job)
+        return query_job
+
+    def posts_for_users(self, user_ids, limit=None, before_timestamp=None, before_post_id=None):
+        from google.cloud import bigquery
+        client = get_bigquery_client()
+
+        conditions = ["p.AuthorId IN UNNEST(@user_ids)"]
+        query_parameters = [bigquery.ArrayQueryParameter("user_ids", "STRING", user_ids)]
+        if before_timestamp is not None and before_post_id is not None:
+            conditions.append("(p.Timestamp < @before_timestamp OR (p.Timestamp = @before_timestamp AND p.PostId < @before_post_id))")
+            query_parameters.append(bigquery.ScalarQueryParameter("before_timestamp", "TIMESTAMP", before_timestamp))
+            query_parameters.append(bigquery.ScalarQueryParameter("before_post_id", "STRING", before_post_id))
+        elif before_timestamp is not None:
+            conditions.append("p.Timestamp < @before_timestamp")
+            query_parameters.append(bigquery.ScalarQueryParameter("before_timestamp", "TIMESTAMP", before_timestamp))
+        limit_clause = f"LIMIT {int(limit)}" if limit is not None else ""
+
+        query = f"""
+        SELECT p.PostId, p.AuthorId, p.Timestamp, p.Content, p.ImageUrl as PostImageUrl,
+            u.Username, u.ImageUrl as UserImageUrl
+        FROM `{self.dataset}.Posts` p
+        JOIN `{self.dataset}.Users` u
+        ON p.AuthorId = u.UserId
+        WHERE {" AND ".join(conditions)}
+        ORDER BY p.Timestamp DESC, p.PostId DESC
+        {limit_clause}
+    """
+
+        job_config = bigquery.QueryJobConfig(query_parameters=query_parameters)
+        query_job = client.query(query, job_config=job_config)
+        record_query(query_job)
+        return query_job.result()
+
+
+    def add_workouts(self, workouts):
+        from google.cloud import bigquery
+        workouts = list(workouts)
+        if not workouts:
+            return
+        client = get_bigquery_client()
+
+        # Insert the workouts and add them to the rollups in one
+        # transaction, so the rollups never miss or double count a workout
+        workout_columns = ", ".join(WORKOUT_COLUMN_TYPES)
+        query = self._transaction(f"""
+            INSERT INTO `{self.dataset}.Workouts` ({workout_columns})
+            SELECT {workout_columns} FROM UNNEST(@workouts);
+            {self._add_to_rollups_statements()}""")
+        job_config = bigquery.QueryJobConfig(query_parameters=[
+            self._struct_array("workouts", workouts, WORKOUT_COLUMN_TYPES.items()),
+        ])
+        query_job = client.query(query, job_config=job_config)
+        record_query(query_job)
+        query_job.result()
+
+    def add_to_activity_rollups(self, workouts):
+        from google.cloud import bigquery
+        workouts = list(workouts)
+        if not workouts:
+            return
+        client = get_bigquery_client()
+
+        query = self._transaction(self._add_to_rollups_statements())
+        job_config = bigquery.QueryJobConfig(query_parameters=[
+            self._struct_array("workouts", workouts, WORKOUT_COLUMN_TYPES.items()),
+        ])
+        query_job = client.query(query, job_config=job_config)
+        record_query(query_job)
+        query_job.result()
+
+    def _add_to_rollups_statements(self):
+        # Adds the @workouts that aren't in RolledUpWorkouts yet to the
+        # rollup rows (creating the rows for periods that had no workouts
+        # yet), then records them in RolledUpWorkouts. The MERGE runs first
+        # because it must not see the workouts it is recording.
+        new_workouts = f"""(
+                SELECT * FROM UNNEST(@workouts) AS Workout
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM `{self.dataset}.RolledUpWorkouts` AS Added
+                    WHERE Added.WorkoutId = Workout.WorkoutId))"""
+        return f"""
+            MERGE `{self.dataset}.ActivityRollups` AS Rollups
+            USING ({self.rollup_query('TRUE', new_workouts)}) AS New
+            ON Rollups.UserId = New.UserId AND Rollups.Period = New.Period AND Rollups.PeriodStart = New.PeriodStart
+            WHEN MATCHED THEN UPDATE SET
+                Workouts = Rollups.Workouts + New.Workouts,
+                TotalDistance = Rollups.TotalDistance + New.TotalDistance,
+                TotalSteps = Rollups.TotalSteps + New.TotalSteps,
+                CaloriesBurned = Rollups.CaloriesBurned + New.CaloriesBurned,
+                ActiveMinutes = Rollups.ActiveMinutes + New.ActiveMinutes
+            WHEN NOT MATCHED THEN
+                INSERT ({", ".join(ROLLUP_COLUMNS)})
+                VALUES ({", ".join(f"New.{column}" for column in ROLLUP_COLUMNS)});
+
+            INSERT INTO `{self.dataset}.RolledUpWorkouts` (UserId, WorkoutId)
+            SELECT UserId, WorkoutId FROM {new_workouts};"""
+
+    @staticmethod
+    def _transaction(statements):
+        # A script running the statements in one transaction, which is
+        # rolled back (and the error raised) if any of them fails
+        return f"""
+        BEGIN
+            BEGIN TRANSACTION;
+            {statements}
+
+            COMMIT TRANSACTION;
+        EXCEPTION WHEN ERROR THEN
+            ROLLBACK TRANSACTION;
+            RAISE USING MESSAGE = @@error.message;
+        END;
+    """
+
+    @staticmethod
+    def _struct_array(name, rows, column_types):
+        # An ARRAY<STRUCT> query parameter with a struct per row (a dict)
+        from google.cloud import bigquery
+        column_types = list(column_types)
+        return bigquery.ArrayQueryParameter(name, "STRUCT", [
+            bigquery.StructQueryParameter(None, *[
+                bigquery.ScalarQueryParameter(column, type_, row.get(column)) for column, type_ in column_types
+            ])
+            for row in rows
+        ])
+
+    def activity_rollup(self, user_id, period, start_date=None, end_date=None):
+        from google.cloud import bigquery
+        client = get_bigquery_client()
+
+        conditions = ["UserId = @user_id", "Period = @period"]
+        query_parameters = [
+            bigquery.ScalarQueryParameter("user_id", "STRING", user_id),
+            bigquery.ScalarQueryParameter("period", "STRING", period),
+        ]
+        if start_date is not None:
+            conditions.append("PeriodStart >= @start_date")
+            query_parameters.append(bigquery.ScalarQueryParameter("start_date", "DATE", start_date))
+        if end_date is not None:
+            conditions.append("PeriodStart <= @end_date")
+            query_parameters.append(bigquery.ScalarQueryParameter("end_date", "DATE", end_date))
+
+        query = f"""
+        SELECT PeriodStart, Workouts, TotalDistance, TotalSteps, CaloriesBurned, ActiveMinutes
+        FROM `{self.dataset}.ActivityRollups`
+        WHERE {" AND ".join(conditions)}
+        ORDER BY PeriodStart
+    """
+
+        job_config = bigquery.QueryJobConfig(query_parameters=query_parameters)
+        query_job = client.query(query, job_config=job_config)
+        record_query(query_job)
+        return query_job.result()
+
+    def rollup_query(self, condition, source=None):
+        # Builds the query that aggregates Workouts rows (of the Workouts
+        # table, or of the `source` subquery) into rollup rows
+        source = source or f"`{self.dataset}.Workouts`"
+        totals = """COUNT(*) AS Workouts,
+                IFNULL(SUM(TotalDistance), 0) AS TotalDistance,
+                IFNULL(SUM(TotalSteps), 0) AS TotalSteps,
+                IFNULL(SUM(CaloriesBurned), 0) AS CaloriesBurned,
+                IFNULL(SUM(TIMESTAMP_DIFF(EndTimestamp, StartTimestamp, SECOND)), 0) / 60 AS ActiveMinutes"""
+        return f"""
+            SELECT UserId, 'day' AS Period, DATE(StartTimestamp) AS PeriodStart,
+                {totals}
+            FROM {source}
+            WHERE {condition}
+            GROUP BY UserId, PeriodStart
+            UNION ALL
+            SELECT UserId, 'week' AS Period, DATE_TRUNC(DATE(StartTimestamp), WEEK(MONDAY)) AS PeriodStart,
+                {totals}
+            FROM {source}
+            WHERE {condition}
+            GROUP BY UserId, PeriodStart
+        """
+
+    def rebuild_activity_rollups(self, user_id=None):
+        from google.cloud import bigquery
+        client = get_bigquery_client()
+
+        condition = "TRUE" if user_id is None else "UserId = @user_id"
+        # The rows are replaced in a transaction, so readers never see a user
+        # without rollups
+        replace = self._transaction(f"""
+            DELETE FROM `{self.dataset}.ActivityRollups` WHERE {condition};
+            INSERT INTO `{self.dataset}.ActivityRollups` ({", ".join(ROLLUP_COLUMNS)})
+            {self.rollup_query(condition)};
+            DELETE FROM `{self.dataset}.RolledUpWorkouts` WHERE {condition};
+            INSERT INTO `{self.dataset}.RolledUpWorkouts` (UserId, WorkoutId)
+            SELECT UserId, WorkoutId FROM `{self.dataset}.Workouts` WHERE {condition};""")
+        # The tables are created the first time
+        query = f"""
+        CREATE TABLE IF NOT EXISTS `{self.dataset}.ActivityRollups` (
+            UserId STRING, Period STRING, PeriodStart DATE, Workouts INT64, TotalDistance FLOAT64,
+            TotalSteps INT64, CaloriesBurned FLOAT64, ActiveMinutes FLOAT64);
+        CREATE TABLE IF NOT EXISTS `{self.dataset}.RolledUpWorkouts` (UserId STRING, WorkoutId STRING);
+        {replace}"""
+        job_config = None
+        if user_id is not None:
+            job_config = bigquery.QueryJobConfig(
+                query_parameters=[bigquery.ScalarQueryParameter("user_id", "STRING", user_id)]
+            )
+
+        query_job = client.query(query, job_config=job_config)
+        record_query(query_job)
+        query_job.result()
+
+
+class LocalRow:
+    """A result row that can be read like a BigQuery Row."""
+
+    __slots__ = ('_names', '_values')
+
+    def __init__(self, names, values):
+        self._names = names
+        self._values = values
+
+    def __getattr__(self, name):
+        try:
+            return self._values[self._names[name]]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            return self._values[self._names[key]]
+        return self._values[key]
+
+    def get(self, key, default=None):
+        index = self._names.get(key)
+        return default if index is None else self._values[index]
+
+    def keys(self):
+        return self._names.keys()
+
+    def values(self):
+        return tuple(self._values)
+
+    def items(self):
+        return [(name, self._values[index]) for name, index in self._names.items()]
+
+    def __eq__(self, other):
+        if isinstance(other, LocalRow):
+            return self.items() == other.items()
+        return NotImplemented
+
+    def __repr__(self):
+        return f"LocalRow({dict(self.items())!r})"
+
+
+class LocalResult:
+    """The rows returned by a SQLiteBackend query."""
+
+    def __init__(self, columns, rows):
+        self.columns = list(columns)
+        names = {name: index for index, name in enumerate(self.columns)}
+        self.rows = [LocalRow(names, row) for row in rows]
+        self.total_rows = len(self.rows)
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def __len__(self):
+        return len(self.rows)
+
+    def to_dataframe(self, **kwargs):
+        """Returns the rows as a pandas DataFrame with datetime64 timestamps."""
+        import pandas as pd
+        frame = pd.DataFrame.from_records([row.values() for row in self.rows], columns=self.columns)
+        for column in self.columns:
+            if column in SQLiteBackend.TIMESTAMP_COLUMNS:
+                frame[column] = pd.to_datetime(frame[column], utc=True)
+        return frame
+
+    def to_arrow(self, **kwargs):
+        """Returns the rows as a pyarrow Table."""
+        import pyarrow as pa
+        return pa.Table.from_pandas(self.to_dataframe(), preserve_index=False)
+
+
+class _Percentile:
+    """A SQLite aggregate, percentile(value, fraction), standing in for
+    BigQuery's APPROX_QUANTILES. It returns the value nearest to the given
+    fraction (0 to 1) of the sorted non-NULL values."""
+
+    def __init__(self):
+        self.values = []
+        self.fraction = 0.5
+
+    def step(self, value, fraction):
+        if value is not None:
+            self.values.append(value)
+        self.fraction = fraction
+
+    def finalize(self):
+        if not self.values:
+            return None
+        self.values.sort()
+        return self.values[round(self.fraction * (len(self.values) - 1))]
+
+
+class SQLiteBackend(Backend):
+    """Runs the app's queries against a local SQLite copy of the tables."""
+
+    name = 'sqlite'
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS Users (
+            UserId TEXT PRIMARY KEY, Name TEXT, Username TEXT, DateOfBirth TEXT, ImageUrl TEXT);
+        CREATE TABLE IF NOT EXISTS Friends (
+            UserId TEXT, FriendId TEXT);
+        CREATE TABLE IF NOT EXISTS Workouts (
+            WorkoutId TEXT PRIMARY KEY, UserId TEXT, StartTimestamp TEXT, EndTimestamp TEXT,
+            StartLocationLat REAL, StartLocationLong REAL, EndLocationLat REAL, EndLocationLong REAL,
+            TotalDistance REAL, TotalSteps INTEGER, CaloriesBurned REAL);
+        CREATE TABLE IF NOT EXISTS SensorTypes (
+            SensorId TEXT PRIMARY KEY, Name TEXT, Units TEXT);
+        CREATE TABLE IF NOT EXISTS SensorData (
+            SensorId TEXT, WorkoutID TEXT, Timestamp TEXT, SensorValue REAL);
+        CREATE TABLE IF NOT EXISTS Posts (
+            PostId TEXT PRIMARY KEY, AuthorId TEXT, Timestamp TEXT, Content TEXT, ImageUrl TEXT);
+        CREATE TABLE IF NOT EXISTS ActivityRollups (
+            UserId TEXT, Period TEXT, PeriodStart TEXT, Workouts INTEGER, TotalDistance REAL,
+            TotalSteps INTEGER, CaloriesBurned REAL, ActiveMinutes REAL,
+            PRIMARY KEY (UserId, Period, PeriodStart));
+        CREATE TABLE IF NOT EXISTS RolledUpWorkouts (
+            UserId TEXT, WorkoutId TEXT PRIMARY KEY);
+        CREATE INDEX IF NOT EXISTS FriendsByUser ON Friends (UserId);
+        CREATE INDEX IF NOT EXISTS WorkoutsByUser ON Workouts (UserId, StartTimestamp);
+        CREATE INDEX IF NOT EXISTS SensorDataByWorkout ON SensorData (WorkoutID);
+        CREATE INDEX IF NOT EXISTS PostsByAuthor ON Posts (AuthorId, Timestamp);
+    """
+
+    # Columns stored as ISO text and returned as datetime/date objects
+    TIMESTAMP_COLUMNS = {'Timestamp', 'StartTimestamp', 'EndTimestamp'}
+    DATE_COLUMNS = {'DateOfBirth', 'date_of_birth', 'PeriodStart'}
+
+    def __init__(self, path=':memory:'):
+        """Opens (and creates the tables in) a SQLite database.
+
+        Args:
+            path (str): The database file, or ':memory:' for a throwaway one.
+        """
+        self.path = path
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._connection.create_aggregate('percentile', 2, _Percentile)
+            self._connection.executescript(self.SCHEMA)
+
+    @property
+    def source(self):
+        if self.path == ':memory:':
+            # Only this object (in this process) can read the database
+            return f"{self.name}::memory:{os.getpid()}:{id(self)}"
+        return f"{self.name}:{os.path.abspath(self.path)}"
+
+    def close(self):
+        self._connection.close()
+
+    def insert(self, table, rows):
+        """Adds rows to a table.
+
+        Args:
+            table (str): One of the table names in SCHEMA.
+            rows (iterable): Dictionaries mapping column names to values.
+                datetime/date values are stored as ISO strings.
+
+        Returns:
+            int: The number of rows inserted.
+        """
+        rows = list(rows)
+        if not rows:
+            return 0
+        with self._lock:
+            self._connection.executemany(*self._insert_statement(table, rows))
+            self._connection.commit()
+        return len(rows)
+
+    def _insert_statement(self, table, rows):
+        # The INSERT statement and parameters for adding rows to a table
+        columns = list(rows[0])
+        statement = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+        return statement, [[self._to_sql(row.get(column)) for column in columns] for row in rows]
+
+    def query(self, sql, parameters=()):
+        """Runs a query and returns its rows as a LocalResult."""
+        with self._lock:
+            cursor = self._connection.execute(sql, parameters)
+            columns = [description[0] for description in cursor.description]
+            rows = cursor.fetchall()
+        return LocalResult(columns, self._convert_rows(columns, rows))
+
+    def stream(self, sql, parameters=(), page_size=1000):
+        """Runs a query and yields its rows, fetching page_size rows at a time.
+
+        Only one page of rows is held in memory, like iterating a BigQuery
+        result with a page size.
+        """
+        # A separate cursor, so other queries can run between pages
+        with self._lock:
+            cursor = self._connection.cursor()
+            cursor.execute(sql, parameters)
+            columns = [description[0] for description in cursor.description]
+        names = {name: index for index, name in enumerate(columns)}
+        try:
+            while True:
+                with self._lock:
+                    rows = cursor.fetchmany(page_size)
+                if not rows:
+                    return
+                for row in self._convert_rows(columns, rows):
+                    yield LocalRow(names, row)
+        finally:
+            cursor.close()
+
+    def _convert_rows(self, columns, rows):
+        # Converts the stored values of the columns that need it, e.g. ISO
+        # strings back to datetimes
+        converters = [self._converter(column) for column in columns]
+        if not any(converters):
+            return rows
+        return [
+            tuple(convert(value) if convert and value is not None else value for convert, value in zip(converters, row))
+            for row in rows
+        ]
+
+    def sensor_data(self, user_id, workout_id, page_size=None):
+        query = """
+            SELECT
+                Workouts.UserId,
+                COALESCE(SensorTypes.SensorId, SensorData.SensorId) AS SensorId,
+                SensorTypes.Name,
+                SensorTypes.Units,
+                SensorData.Timestamp,
+                SensorData.SensorValue
+            FROM Workouts
+            INNER JOIN SensorData ON Workouts.WorkoutId = SensorData.WorkoutID
+            LEFT JOIN SensorTypes ON SensorData.SensorId = SensorTypes.SensorId
+            WHERE Workouts.UserId = ? AND Workouts.WorkoutId = ?
+        """
+        if page_size is not None:
+            return self.stream(query, (user_id, workout_id), page_size)
+        return self.query(query, (user_id, workout_id))
+
+    def sensor_summary(self, user_id, workout_id):
+        return self.query("""
+            SELECT
+                Summary.SensorId,
+                SensorTypes.Name,
+                SensorTypes.Units,
+                Summary.SampleCount,
+                Summary.MinValue,
+                Summary.MaxValue,
+                Summary.MeanValue,
+                Summary.P25,
+                Summary.Median,
+                Summary.P75,
+                Summary.P95
+            FROM (
+                SELECT
+                    SensorData.SensorId,
+                    COUNT(SensorData.SensorValue) AS SampleCount,
+                    MIN(SensorData.SensorValue) AS MinValue,
+                    MAX(SensorData.SensorValue) AS MaxValue,
+                    AVG(SensorData.SensorValue) AS MeanValue,
+                    percentile(SensorData.SensorValue, 0.25) AS P25,
+                    percentile(SensorData.SensorValue, 0.5) AS Median,
+                    percentile(SensorData.SensorValue, 0.75) AS P75,
+                    percentile(SensorData.SensorValue, 0.95) AS P95
+                FROM Workouts
+                INNER JOIN SensorData ON Workouts.WorkoutId = SensorData.WorkoutID
+                WHERE Workouts.UserId = ? AND Workouts.WorkoutId = ?
+                GROUP BY SensorData.SensorId
+            ) AS Summary
+            LEFT JOIN SensorTypes ON Summary.SensorId = SensorTypes.SensorId
+            ORDER BY Summary.SensorId
+        """, (user_id, workout_id))
+
+    def workouts(self, user_id, limit=None, after=None):
+        conditions, parameters = ["UserId = ?"], [user_id]
+        order_clause = ""
+        if after is not None:
+            conditions.append("(StartTimestamp > ? OR (StartTimestamp = ? AND WorkoutId > ?))")
+            parameters += [self._to_sql(after[0]), self._to_sql(after[0]), after[1]]
+            order_clause = "ORDER BY StartTimestamp, WorkoutId"
+        if limit is not None:
+            order_clause = f"ORDER BY StartTimestamp DESC, WorkoutId DESC LIMIT {int(limit)}"
+        return self.query(f"""
+            SELECT WorkoutId, StartTimestamp, EndTimestamp, StartLocationLat, StartLocationLong,
+                EndLocationLat, EndLocationLong, TotalDistance, TotalSteps, CaloriesBurned
+            FROM Workouts
+            WHERE {" AND ".join(conditions)}
+            {order_clause}
+        """, parameters)
+
+    def profile(self, user_id):
+        users = self.query("""
+            SELECT Name AS full_name, Username AS username, DateOfBirth AS date_of_birth,
+                ImageUrl AS profile_image
+            FROM Users
+            WHERE UserId = ?
+        """, (user_id,))
+        if not len(users):
+            return users
+        friends = self.query("SELECT FriendId FROM Friends WHERE UserId = ? ORDER BY FriendId", (user_id,))
+        return LocalResult(users.columns + ['friends'], [users.rows[0].values() + ([row.FriendId for row in friends],)])
+
+    def posts(self, user_id):
+        return self.query("""
+            SELECT p.PostId, p.AuthorId, p.Timestamp, p.Content, p.ImageUrl AS PostImageUrl,
+                u.Username, u.ImageUrl AS UserImageUrl
+            FROM Posts p
+            JOIN Users u ON p.AuthorId = u.UserId
+            WHERE p.AuthorId = ?
+        """, (user_id,))
+
+    def posts_for_users(self, user_ids, limit=None, before_timestamp=None, before_post_id=None):
+        conditions = [f"p.AuthorId IN ({', '.join('?' * len(user_ids))})"]
+        parameters = list(user_ids)
+        if before_timestamp is not None and before_post_id is not None:
+            conditions.append("(p.Timestamp < ? OR (p.Timestamp = ? AND p.PostId < ?))")
+            parameters += [self._to_sql(before_timestamp), self._to_sql(before_timestamp), before_post_id]
+        elif before_timestamp is not None:
+            conditions.append("p.Timestamp < ?")
+            parameters.append(self._to_sql(before_timestamp))
+        limit_clause = f"LIMIT {int(limit)}" if limit is not None else ""
+        return self.query(f"""
+            SELECT p.PostId, p.AuthorId, p.Timestamp, p.Content, p.ImageUrl AS PostImageUrl,
+                u.Username, u.ImageUrl AS UserImageUrl
+            FROM Posts p
+            JOIN Users u ON p.AuthorId = u.UserId
+            WHERE {" AND ".join(conditions)}
+            ORDER BY p.Timestamp DESC, p.PostId DESC
+            {limit_clause}
+        """, parameters)
+
+    # Aggregates Workouts rows into rollup rows. Weeks start on Monday:
+    # strftime('%w') is 0 on Sunday, so a day is (%w + 6) % 7 days after it.
+    ROLLUP_QUERY = """
+        SELECT UserId, 'day' AS Period, date(StartTimestamp) AS PeriodStart, {totals}
+        FROM Workouts
+        WHERE {condition}
+        GROUP BY UserId, PeriodStart
+        UNION ALL
+        SELECT UserId, 'week' AS Period,
+            date(StartTimestamp, '-' || ((CAST(strftime('%w', StartTimestamp) AS INTEGER) + 6) % 7) || ' days') AS PeriodStart,
+            {totals}
+        FROM Workouts
+        WHERE {condition}
+        GROUP BY UserId, PeriodStart
+    """
+    ROLLUP_TOTALS = """COUNT(*), COALESCE(SUM(TotalDistance), 0), COALESCE(SUM(TotalSteps), 0),
+        COALESCE(SUM(CaloriesBurned), 0),
+        COALESCE(SUM(strftime('%s', EndTimestamp) - strftime('%s', StartTimestamp)), 0) / 60.0"""
+
+    def add_workouts(self, workouts):
+        workouts = list(workouts)
+        if not workouts:
+            return
+        # One transaction, so the rollups never miss or double count a workout
+        with self._lock, self._connection:
+            self._connection.executemany(*self._insert_statement('Workouts', workouts))
+            self._add_to_rollups(workouts)
+
+    def add_to_activity_rollups(self, workouts):
+        workouts = list(workouts)
+        if not workouts:
+            return
+        with self._lock, self._connection:
+            self._add_to_rollups(workouts)
+
+    def _add_to_rollups(self, workouts):
+        # Adds the workouts that aren't in RolledUpWorkouts yet to the
+        # rollups and records them there. Runs in the caller's transaction.
+        user_ids = sorted({workout['UserId'] for workout in workouts})
+        added = {row[0] for row in self._connection.execute(
+            f"SELECT WorkoutId FROM RolledUpWorkouts WHERE UserId IN ({', '.join('?' * len(user_ids))})", user_ids)}
+        workouts = [workout for workout in workouts if workout['WorkoutId'] not in added]
+        upsert = f"""
+            INSERT INTO ActivityRollups ({", ".join(ROLLUP_COLUMNS)}) VALUES ({", ".join("?" * len(ROLLUP_COLUMNS))})
+            ON CONFLICT (UserId, Period, PeriodStart) DO UPDATE SET
+                Workouts = Workouts + excluded.Workouts,
+                TotalDistance = TotalDistance + excluded.TotalDistance,
+                TotalSteps = TotalSteps + excluded.TotalSteps,
+                CaloriesBurned = CaloriesBurned + excluded.CaloriesBurned,
+                ActiveMinutes = ActiveMinutes + excluded.ActiveMinutes
+        """
+        self._connection.executemany(upsert, [[self._to_sql(delta[column]) for column in ROLLUP_COLUMNS]
+                                              for delta in activity_deltas(workouts)])
+        self._connection.executemany("INSERT INTO RolledUpWorkouts (UserId, WorkoutId) VALUES (?, ?)",
+                                     [(workout['UserId'], workout['WorkoutId']) for workout in workouts])
+
+    def activity_rollup(self, user_id, period, start_date=None, end_date=None):
+        conditions = ["UserId = ?", "Period = ?"]
+        parameters = [user_id, period]
+        if start_date is not None:
+            conditions.append("PeriodStart >= ?")
+            parameters.append(self._to_sql(start_date))
+        if end_date is not None:
+            conditions.append("PeriodStart <= ?")
+            parameters.append(self._to_sql(end_date))
+        return self.query(f"""
+            SELECT PeriodStart, Workouts, TotalDistance, TotalSteps, CaloriesBurned, ActiveMinutes
+            FROM ActivityRollups
+            WHERE {" AND ".join(conditions)}
+            ORDER BY PeriodStart
+        """, parameters)
+
+    def rebuild_activity_rollups(self, user_id=None):
+        condition, parameters = ("1", []) if user_id is None else ("UserId = ?", [user_id])
+        select = self.ROLLUP_QUERY.format(totals=self.ROLLUP_TOTALS, condition=condition)
+        with self._lock, self._connection:
+            self._connection.execute(f"DELETE FROM ActivityRollups WHERE {condition}", parameters)
+            self._connection.execute(f"INSERT INTO ActivityRollups ({', '.join(ROLLUP_COLUMNS)}) {select}", parameters * 2)
+            self._connection.execute(f"DELETE FROM RolledUpWorkouts WHERE {condition}", parameters)
+            self._connection.execute(f"INSERT INTO RolledUpWorkouts (UserId, WorkoutId) SELECT UserId, WorkoutId FROM Workouts WHERE {condition}", parameters)
+
+    @staticmethod
+    def _to_sql(value):
+        # Timestamps are stored as UTC ISO strings so they sort correctly
+        if isinstance(value, datetime.datetime):
+            if value.tzinfo is None:
+                value = value.replace(tzinfo=datetime.timezone.utc)
+            return value.astimezone(datetime.timezone.utc).isoformat()
+        if isinstance(value, datetime.date):
+            return value.isoformat()
+        return value
+
+    @classmethod
+    def _converter(cls, column):
+        if column in cls.TIMESTAMP_COLUMNS:
+            return datetime.datetime.fromisoformat
+        if column in cls.DATE_COLUMNS:
+            return datetime.date.fromisoformat
+        return None
+
+
+def create_backend(spec):
+    """Creates a backend from a short description.
+
+    Args:
+        spec (str): 'bigquery', or 'sqlite:<path>' for a local database file
+            ('sqlite:' alone uses an in-memory database).
+
+    Returns:
+        Backend: The new backend.
+    """
+    if spec == 'bigquery':
+        return BigQueryBackend()
+    if spec.startswith('sqlite:'):
+        return SQLiteBackend(spec[len('sqlite:'):] or ':memory:')
+    raise ValueError(f"Unknown data backend: {spec!r}")
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def get_backend():
+    """Returns the backend the fetchers use.
+
+    It is created on first use from the DATA_BACKEND environment variable
+    (see create_backend), defaulting to BigQuery.
+    """
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend(os.environ.get('DATA_BACKEND', 'bigquery'))
+    return _backend
+
+
+def set_backend(backend):
+    """Makes the fetchers use a different backend and clears cached results.
+
+    Args:
+        backend (Backend or None): The new backend. None goes back to the
+            default from the environment.
+    """
+    global _backend
+    with _backend_lock:
+        _backend = backend
+    result_cache.clear()
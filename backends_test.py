@@ -0,0 +1,377 @@
+#############################################################################
+# backends_test.py
+#
+# This file contains tests for backends.py, running the data fetchers
+# against the local SQLite backend.
+#############################################################################
+
+import datetime
+import inspect
+import unittest
+from unittest.mock import patch
+
+from backends import BigQueryBackend, SQLiteBackend, create_backend, get_backend, set_backend
+from data_fetcher import add_workouts, get_activity_rollup, rebuild_activity_rollups, sync_user_workouts
+from data_fetcher import get_posts_for_users, get_sensor_summary, get_user_posts, get_user_posts_page, get_user_profile, get_user_sensor_data, get_user_workouts
+from records import Workout
+
+UTC = datetime.timezone.utc
+
+
+def load_sample_data(backend):
+    """Fills a SQLiteBackend with two users, their workouts and posts."""
+    backend.insert('Users', [
+        {'UserId': 'user1', 'Name': 'Remi', 'Username': 'remi_the_rems', 'DateOfBirth': datetime.date(1990, 1, 1),
+         'ImageUrl': 'https://example.com/remi.jpg'},
+        {'UserId': 'user2', 'Name': 'Blake', 'Username': 'blake', 'DateOfBirth': datetime.date(1991, 2, 3),
+         'ImageUrl': 'https://example.com/blake.jpg'},
+    ])
+    backend.insert('Friends', [{'UserId': 'user1', 'FriendId': 'user2'}])
+    backend.insert('Workouts', [
+        {'WorkoutId': 'workout1', 'UserId': 'user1',
+         'StartTimestamp': datetime.datetime(2024, 7, 29, 7, 0, tzinfo=UTC),
+         'EndTimestamp': datetime.datetime(2024, 7, 29, 8, 0, tzinfo=UTC),
+         'StartLocationLat': 37.7749, 'StartLocationLong': -122.4194,
+         'EndLocationLat': 37.8049, 'EndLocationLong': -122.4210,
+         'TotalDistance': 5.0, 'TotalSteps': 8000, 'CaloriesBurned': 400.0},
+    ])
+    backend.insert('SensorTypes', [{'SensorId': 'sensor1', 'Name': 'Heart Rate', 'Units': 'bpm'}])
+    backend.insert('SensorData', [
+        {'SensorId': 'sensor1', 'WorkoutID': 'workout1',
+         'Timestamp': datetime.datetime(2024, 7, 29, 7, 0, second, tzinfo=UTC), 'SensorValue': 100.0 + second}
+        for second in range(3)
+    ])
+    backend.insert('Posts', [
+        {'PostId': 'post1', 'AuthorId': 'user1', 'Timestamp': datetime.datetime(2024, 1, 1, tzinfo=UTC),
+         'Content': 'First', 'ImageUrl': None},
+        {'PostId': 'post2', 'AuthorId': 'user2', 'Timestamp': datetime.datetime(2024, 1, 2, tzinfo=UTC),
+         'Content': 'Second', 'ImageUrl': 'https://example.com/post.jpg'},
+    ])
+
+
+class TestSQLiteBackend(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = SQLiteBackend()
+        load_sample_data(self.backend)
+        set_backend(self.backend)
+
+    def tearDown(self):
+        set_backend(None)
+        self.backend.close()
+
+    def test_workouts(self):
+        """Tests that workouts come back like they do from BigQuery."""
+        self.assertEqual(get_user_workouts('user1'), [Workout(
+            workout_id='workout1',
+            start_timestamp=datetime.datetime(2024, 7, 29, 7, 0, tzinfo=UTC),
+            end_timestamp=datetime.datetime(2024, 7, 29, 8, 0, tzinfo=UTC),
+            start_lat_lng=(37.7749, -122.4194),
+            end_lat_lng=(37.8049, -122.4210),
+            distance=5.0,
+            steps=8000,
+            calories_burned=400.0,
+        )])
+        self.assertEqual(get_user_workouts('user2'), [])
+
+    def test_recent_workouts(self):
+        """Tests that a limit returns only the newest workouts, newest first."""
+        self.backend.insert('Workouts', [
+            {'WorkoutId': f'workout{day}', 'UserId': 'user1',
+             'StartTimestamp': datetime.datetime(2024, 8, day, 7, 0, tzinfo=UTC)}
+            for day in range(2, 6)
+        ])
+        recent = get_user_workouts('user1', limit=2)
+        self.assertEqual([workout['workout_id'] for workout in recent], ['workout5', 'workout4'])
+        self.assertEqual(len(get_user_workouts('user1')), 5)
+
+    def test_workouts_dataframe(self):
+        """Tests that columnar output has datetime timestamps."""
+        import pandas as pd
+        frame = get_user_workouts('user1', output='dataframe')
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(frame['start_timestamp']))
+        self.assertEqual(frame['distance'].tolist(), [5.0])
+
+    def test_sensor_data(self):
+        """Tests that sensor readings are joined with their sensor type."""
+        rows = get_user_sensor_data('user1', 'workout1')
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(rows[0].name, 'Heart Rate')
+        self.assertEqual(rows[0].units, 'bpm')
+        self.assertEqual(rows[2].value, 102.0)
+        self.assertEqual(rows[0].timestamp, datetime.datetime(2024, 7, 29, 7, 0, tzinfo=UTC))
+        self.assertEqual(get_user_sensor_data('user2', 'workout1'), [])
+
+    def test_sensor_data_pages(self):
+        """Tests that a page size streams the readings instead of fetching them all."""
+        rows = self.backend.sensor_data('user1', 'workout1', page_size=2)
+        self.assertTrue(inspect.isgenerator(rows))
+
+        first = next(rows)
+        # Other queries can run while the stream is open
+        self.assertEqual(len(get_user_workouts('user1')), 1)
+        rest = list(rows)
+
+        self.assertEqual(first.SensorValue, 100.0)
+        self.assertEqual([row.SensorValue for row in rest], [101.0, 102.0])
+        self.assertEqual(rest[0].Timestamp, datetime.datetime(2024, 7, 29, 7, 0, 1, tzinfo=UTC))
+
+    def test_sensor_summary(self):
+        """Tests that readings are aggregated per sensor."""
+        self.backend.insert('SensorData', [{'SensorId': 'sensor2', 'WorkoutID': 'workout1',
+            'Timestamp': datetime.datetime(2024, 7, 29, 7, 0, tzinfo=UTC), 'SensorValue': 7.0}])
+        summary = get_sensor_summary('user1', 'workout1')
+        self.assertEqual(summary[0], {
+            'SensorId': 'sensor1', 'Name': 'Heart Rate', 'Units': 'bpm', 'SampleCount': 3,
+            'MinValue': 100.0, 'MaxValue': 102.0, 'MeanValue': 101.0,
+            'P25': 100.0, 'Median': 101.0, 'P75': 102.0, 'P95': 102.0,
+        })
+        self.assertEqual(summary[1]['SensorId'], 'sensor2')
+        self.assertIsNone(summary[1]['Name'])
+        self.assertEqual(get_sensor_summary('user2', 'workout1'), [])
+
+    def test_profile(self):
+        """Tests that the profile includes the friends list."""
+        profile = get_user_profile('user1')
+        self.assertEqual(profile['full_name'], 'Remi')
+        self.assertEqual(profile['date_of_birth'], datetime.date(1990, 1, 1))
+        self.assertEqual(profile.friends, ('user2',))
+        self.assertIsNone(get_user_profile('nobody'))
+
+    def test_posts(self):
+        """Tests single-user and batched post fetches."""
+        posts = get_user_posts('user1')
+        self.assertEqual(posts[0].timestamp, datetime.datetime(2024, 1, 1, tzinfo=UTC))
+        self.assertEqual(posts[0]['image'], '')
+
+        feed = get_posts_for_users(['user1', 'user2'])
+        self.assertEqual([post['post_id'] for post in feed], ['post2', 'post1'])
+        feed = get_posts_for_users(['user1', 'user2'], limit=1, before_timestamp=datetime.datetime(2024, 1, 2, tzinfo=UTC))
+        self.assertEqual([post['post_id'] for post in feed], ['post1'])
+
+
+class TestActivityRollups(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = SQLiteBackend()
+        set_backend(self.backend)
+
+    def tearDown(self):
+        set_backend(None)
+        self.backend.close()
+
+    @staticmethod
+    def workout(workout_id, start, minutes=60, distance=5.0):
+        return {'WorkoutId': workout_id, 'UserId': 'user1', 'StartTimestamp': start,
+                'EndTimestamp': start + datetime.timedelta(minutes=minutes),
+                'TotalDistance': distance, 'TotalSteps': 1000, 'CaloriesBurned': 100.0}
+
+    def test_incremental_updates(self):
+        """Tests that new workouts are added to the existing day and week totals."""
+        # Sunday 2024-08-04 belongs to the week starting Monday 2024-07-29
+        add_workouts([self.workout('workout1', datetime.datetime(2024, 7, 29, 7, tzinfo=UTC))])
+        self.assertEqual(get_activity_rollup('user1', 'week')[0]['workouts'], 1)
+
+        add_workouts([
+            self.workout('workout2', datetime.datetime(2024, 7, 29, 18, tzinfo=UTC), minutes=30, distance=2.5),
+            self.workout('workout3', datetime.datetime(2024, 8, 4, 23, tzinfo=UTC)),
+            self.workout('workout4', datetime.datetime(2024, 8, 5, 1, tzinfo=UTC)),
+        ])
+
+        self.assertEqual(get_activity_rollup('user1', 'week'), [
+            {'period_start': '2024-07-29', 'workouts': 3, 'distance': 12.5, 'steps': 3000,
+             'calories_burned': 300.0, 'active_minutes': 150.0},
+            {'period_start': '2024-08-05', 'workouts': 1, 'distance': 5.0, 'steps': 1000,
+             'calories_burned': 100.0, 'active_minutes': 60.0},
+        ])
+        days = get_activity_rollup('user1', 'day', start_date=datetime.date(2024, 8, 1), end_date=datetime.date(2024, 8, 4))
+        self.assertEqual([day['period_start'] for day in days], ['2024-08-04'])
+
+    def test_rebuild_matches_incremental(self):
+        """Tests that recomputing from Workouts gives the same totals."""
+        start = datetime.datetime(2024, 7, 1, 6, 15, tzinfo=UTC)
+        add_workouts([self.workout(f'workout{day}', start + datetime.timedelta(days=day, hours=day % 5), minutes=20 + day)
+                      for day in range(40)])
+        incremental = {period: get_activity_rollup('user1', period) for period in ('day', 'week')}
+
+        rebuild_activity_rollups()
+
+        for period, rows in incremental.items():
+            rebuilt = get_activity_rollup('user1', period)
+            self.assertEqual([row['period_start'] for row in rebuilt], [row['period_start'] for row in rows])
+            for before, after in zip(rows, rebuilt):
+                self.assertAlmostEqual(before['active_minutes'], after['active_minutes'])
+                self.assertEqual(before['workouts'], after['workouts'])
+
+    def test_workouts_written_elsewhere(self):
+        """Tests that workouts written outside the app reach the rollups once, when synced."""
+        from cache import result_cache
+        from data_fetcher import reset_workout_sync
+        add_workouts([self.workout('workout1', datetime.datetime(2024, 7, 29, 7, tzinfo=UTC))])
+        self.assertEqual(get_activity_rollup('user1', 'week')[0]['workouts'], 1)
+
+        self.backend.insert('Workouts', [self.workout('workout2', datetime.datetime(2024, 7, 30, 7, tzinfo=UTC))])
+        result_cache.clear()
+        self.assertEqual(get_activity_rollup('user1', 'week')[0]['workouts'], 2)
+
+        # Another process (or a restart) syncing the same workouts doesn't count them again
+        reset_workout_sync()
+        result_cache.clear()
+        self.assertEqual(get_activity_rollup('user1', 'week')[0]['workouts'], 2)
+
+    def test_duplicate_workout_is_rejected(self):
+        """Tests that a workout that was already added doesn't change the totals."""
+        workout = self.workout('workout1', datetime.datetime(2024, 7, 29, 7, tzinfo=UTC))
+        add_workouts([workout])
+        with self.assertRaises(Exception):
+            add_workouts([workout])
+        self.assertEqual(get_activity_rollup('user1', 'day')[0]['workouts'], 1)
+
+    def test_unknown_period(self):
+        with self.assertRaises(ValueError):
+            get_activity_rollup('user1', 'month')
+
+
+class TestIncrementalWorkouts(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = SQLiteBackend()
+        load_sample_data(self.backend)
+        set_backend(self.backend)
+
+    def tearDown(self):
+        set_backend(None)
+        self.backend.close()
+
+    def add(self, workout_id, day):
+        self.backend.insert('Workouts', [{'WorkoutId': workout_id, 'UserId': 'user1',
+                                          'StartTimestamp': datetime.datetime(2024, 8, day, 7, 0, tzinfo=UTC)}])
+
+    def test_only_new_workouts_are_fetched(self):
+        """Tests that later syncs only ask for workouts after the watermark."""
+        self.assertEqual([w['workout_id'] for w in sync_user_workouts('user1')], ['workout1'])
+        self.add('workout3', 2)
+        self.add('workout2', 2)
+
+        with patch.object(self.backend, 'workouts', wraps=self.backend.workouts) as spy:
+            synced = sync_user_workouts('user1')
+
+        spy.assert_called_once_with('user1', after=(datetime.datetime(2024, 7, 29, 7, 0, tzinfo=UTC), 'workout1'))
+        self.assertEqual([w['workout_id'] for w in synced], ['workout1', 'workout2', 'workout3'])
+        self.assertEqual(synced, sorted(get_user_workouts('user1'), key=lambda w: (w.start_timestamp, w.workout_id)))
+
+    def test_reconciliation(self):
+        """Tests that changes behind the watermark are picked up by a full sync."""
+        self.add('workout2', 2)
+        sync_user_workouts('user1')
+        with self.backend._connection:
+            self.backend._connection.execute("DELETE FROM Workouts WHERE WorkoutId = 'workout1'")
+
+        self.assertEqual(len(sync_user_workouts('user1')), 2)
+        with patch('data_fetcher.WORKOUT_RECONCILE_INTERVAL', 0):
+            self.assertEqual([w['workout_id'] for w in sync_user_workouts('user1')], ['workout2'])
+
+    def test_add_workouts_keeps_watermark(self):
+        """Tests that writing workouts doesn't make the next sync fetch everything."""
+        get_user_workouts('user1', incremental=True)
+        # Older than the watermark, so only the merge can bring it in
+        add_workouts([{'WorkoutId': 'workout0', 'UserId': 'user1',
+                       'StartTimestamp': datetime.datetime(2024, 7, 1, 7, 0, tzinfo=UTC), 'TotalDistance': 2.0}])
+
+        with patch.object(self.backend, 'workouts', wraps=self.backend.workouts) as spy:
+            synced = get_user_workouts('user1', incremental=True)
+
+        spy.assert_called_once_with('user1', after=(datetime.datetime(2024, 7, 29, 7, 0, tzinfo=UTC), 'workout1'))
+        self.assertEqual([w['workout_id'] for w in synced], ['workout0', 'workout1'])
+        self.assertEqual(synced[0].distance, 2.0)
+
+    def test_synced_copies_are_bounded(self):
+        """Tests that the least recently synced user's copy is dropped, so it is fetched in full again."""
+        import data_fetcher
+        with patch.object(data_fetcher._synced_workouts, 'max_size', 1):
+            sync_user_workouts('user1')
+            sync_user_workouts('user2')
+            with patch.object(self.backend, 'workouts', wraps=self.backend.workouts) as spy:
+                sync_user_workouts('user1')
+
+        spy.assert_called_once_with('user1')
+
+    def test_invalidate_forgets_synced_copy(self):
+        """Tests that invalidating a user makes their next sync a full fetch."""
+        from data_fetcher import invalidate
+        sync_user_workouts('user1')
+        invalidate('user1')
+
+        with patch.object(self.backend, 'workouts', wraps=self.backend.workouts) as spy:
+            sync_user_workouts('user1')
+
+        spy.assert_called_once_with('user1')
+
+    def test_incremental_mode(self):
+        """Tests get_user_workouts(incremental=True), newest first with a limit."""
+        self.add('workout2', 2)
+        self.assertEqual([w['workout_id'] for w in get_user_workouts('user1', limit=1, incremental=True)], ['workout2'])
+        with self.assertRaises(ValueError):
+            get_user_workouts('user1', output='dataframe', incremental=True)
+
+
+class TestPostPagination(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = SQLiteBackend()
+        self.backend.insert('Users', [{'UserId': 'user1', 'Name': 'Remi', 'Username': 'remi', 'ImageUrl': ''}])
+        # Posts 0-4 share a timestamp, so the PostId tie-break matters
+        self.backend.insert('Posts', [
+            {'PostId': f'post{i}', 'AuthorId': 'user1', 'Content': str(i),
+             'Timestamp': datetime.datetime(2024, 1, 1 if i < 5 else i, tzinfo=UTC)}
+            for i in range(12)
+        ])
+        set_backend(self.backend)
+
+    def tearDown(self):
+        set_backend(None)
+        self.backend.close()
+
+    def test_pages_cover_every_post_once(self):
+        """Tests that following the cursors returns each post exactly once, newest first."""
+        seen = []
+        cursor = None
+        pages = 0
+        while True:
+            page = get_user_posts_page('user1', page_size=5, cursor=cursor)
+            seen += [post['post_id'] for post in page['posts']]
+            pages += 1
+            cursor = page['next_cursor']
+            if cursor is None:
+                break
+
+        self.assertEqual(pages, 3)
+        self.assertEqual(seen, [f'post{i}' for i in range(11, 4, -1)] + [f'post{i}' for i in range(4, -1, -1)])
+
+    def test_last_full_page_has_no_cursor(self):
+        """Tests that a page that ends exactly at the last post says there is no more."""
+        page = get_user_posts_page('user1', page_size=12)
+        self.assertEqual(len(page['posts']), 12)
+        self.assertIsNone(page['next_cursor'])
+
+
+class TestBackendSelection(unittest.TestCase):
+
+    def tearDown(self):
+        set_backend(None)
+
+    def test_create_backend(self):
+        """Tests the DATA_BACKEND descriptions."""
+        self.assertIsInstance(create_backend('bigquery'), BigQueryBackend)
+        self.assertEqual(create_backend('sqlite:').path, ':memory:')
+        with self.assertRaises(ValueError):
+            create_backend('postgres')
+
+    def test_default_is_bigquery(self):
+        """Tests that BigQuery is used unless told otherwise."""
+        set_backend(None)
+        self.assertIsInstance(get_backend(), BigQueryBackend)
+
+
+if __name__ == "__main__":
+    unittest.main()
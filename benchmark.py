@@ -0,0 +1,569 @@
+#############################################################################
+# benchmark.py
+#
+# This file contains the benchmark suite for the app's hot paths:
+#   - each data fetcher's row decoding, run against a fake BigQuery client
+#     that returns synthetic rows (no network),
+#   - each display_* function, run in Streamlit's headless AppTest harness,
+#   - internals.create_component's templating.
+#
+# It is not a test file, so pytest doesn't collect it. Run it directly:
+#
+#     python benchmark.py                          # print a report
+#     python benchmark.py --scale 10               # 10x more synthetic data
+#     python benchmark.py --save before.json       # keep the numbers
+#     python benchmark.py --baseline before.json   # fail on regressions
+#
+# Timings are the median of --repeat warm runs (one untimed run first, so
+# caches such as the compiled templates are filled like in a running app).
+# Peak memory is measured in a separate run with tracemalloc.
+#############################################################################
+
+import argparse
+import contextlib
+import datetime
+import json
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from unittest.mock import patch
+
+from backends import reset_bigquery_clients
+from cache import result_cache
+from image_validation import image_cache
+
+UTC = datetime.timezone.utc
+START = datetime.datetime(2024, 1, 1, tzinfo=UTC)
+
+SENSOR_TYPES = [
+    {'SensorId': 'sensor1', 'Name': 'Heart Rate', 'Units': 'bpm'},
+    {'SensorId': 'sensor2', 'Name': 'Cadence', 'Units': 'spm'},
+    {'SensorId': 'sensor3', 'Name': 'Speed', 'Units': 'km/h'},
+]
+
+
+#############################################################################
+# Synthetic data. Each generator returns rows shaped like the matching table
+# in backends.SQLiteBackend.SCHEMA, so they can also be inserted into it.
+#############################################################################
+
+def make_users(count, seed=0):
+    """Returns `count` Users rows."""
+    rng = random.Random(seed)
+    return [{
+        'UserId': f'user{index}',
+        'Name': f'User {index}',
+        'Username': f'user_{index}',
+        'DateOfBirth': datetime.date(1970 + rng.randrange(40), rng.randrange(1, 13), rng.randrange(1, 29)),
+        'ImageUrl': f'https://example.com/users/{index}.jpg',
+    } for index in range(count)]
+
+
+def make_workouts(users, per_user, seed=0):
+    """Returns `per_user` Workouts rows for each user, one per day."""
+    rng = random.Random(seed)
+    workouts = []
+    for user in users:
+        for day in range(per_user):
+            start = START + datetime.timedelta(days=day, hours=rng.randrange(6, 20))
+            lat, lng = 37.7 + rng.random() / 10, -122.4 + rng.random() / 10
+            workouts.append({
+                'WorkoutId': f"{user['UserId']}-workout{day}",
+                'UserId': user['UserId'],
+                'StartTimestamp': start,
+                'EndTimestamp': start + datetime.timedelta(minutes=rng.randrange(20, 120)),
+                'StartLocationLat': lat,
+                'StartLocationLong': lng,
+                'EndLocationLat': lat + rng.random() / 100,
+                'EndLocationLong': lng + rng.random() / 100,
+                'TotalDistance': round(rng.uniform(1, 20), 2),
+                'TotalSteps': rng.randrange(1000, 30000),
+                'CaloriesBurned': round(rng.uniform(100, 1200), 1),
+            })
+    return workouts
+
+
+def make_posts(users, per_user, seed=0):
+    """Returns `per_user` Posts rows for each user, one per hour."""
+    rng = random.Random(seed)
+    return [{
+        'PostId': f"{user['UserId']}-post{index}",
+        'AuthorId': user['UserId'],
+        'Timestamp': START + datetime.timedelta(hours=index, minutes=rng.randrange(60)),
+        'Content': f"Workout number {index} done! " * rng.randrange(1, 5),
+        'ImageUrl': f"https://example.com/posts/{user['UserId']}/{index}.jpg" if rng.random() < 0.5 else None,
+    } for user in users for index in range(per_user)]
+
+
+def make_sensor_data(workout, per_sensor, seed=0):
+    """Returns `per_sensor` SensorData rows (one per second) for each sensor
+    in SENSOR_TYPES during a workout."""
+    rng = random.Random(seed)
+    rows = []
+    for sensor in SENSOR_TYPES:
+        value = rng.uniform(50, 150)
+        for second in range(per_sensor):
+            value += rng.uniform(-1, 1)
+            rows.append({
+                'SensorId': sensor['SensorId'],
+                'WorkoutID': workout['WorkoutId'],
+                'Timestamp': workout['StartTimestamp'] + datetime.timedelta(seconds=second),
+                'SensorValue': value,
+            })
+    return rows
+
+
+def make_dataset(scale=1, seed=0):
+    """Returns synthetic tables sized by `scale`.
+
+    At scale 1: 10 users with 50 workouts and 20 posts each, and 3 sensors
+    with 3,000 readings each for the first workout.
+    """
+    users = make_users(10 * scale, seed)
+    workouts = make_workouts(users, 50, seed)
+    return {
+        'Users': users,
+        'Workouts': workouts,
+        'Posts': make_posts(users, 20, seed),
+        'SensorTypes': SENSOR_TYPES,
+        'SensorData': make_sensor_data(workouts[0], 3000 * scale, seed),
+    }
+
+
+#############################################################################
+# Query results as a fake BigQuery client would return them
+#############################################################################
+
+def _sensor_rows(data):
+    # The rows of the sensor data query for the first workout
+    types = {sensor['SensorId']: sensor for sensor in data['SensorTypes']}
+    user_id = data['Workouts'][0]['UserId']
+    return [{
+        'UserId': user_id,
+        'SensorId': row['SensorId'],
+        'Name': types[row['SensorId']]['Name'],
+        'Units': types[row['SensorId']]['Units'],
+        'Timestamp': row['Timestamp'],
+        'SensorValue': row['SensorValue'],
+    } for row in data['SensorData']]
+
+
+def _post_rows(data):
+    # The rows of the posts queries, joined with the author
+    users = {user['UserId']: user for user in data['Users']}
+    rows = [{
+        'PostId': post['PostId'],
+        'AuthorId': post['AuthorId'],
+        'Timestamp': post['Timestamp'],
+        'Content': post['Content'],
+        'PostImageUrl': post['ImageUrl'],
+        'Username': users[post['AuthorId']]['Username'],
+        'UserImageUrl': users[post['AuthorId']]['ImageUrl'],
+    } for post in data['Posts']]
+    return sorted(rows, key=lambda row: (row['Timestamp'], row['PostId']), reverse=True)
+
+
+def _profile_rows(data):
+    # The row of the profile query for the first user, whose friends are
+    # all the other users
+    user, *others = data['Users']
+    return [{
+        'full_name': user['Name'],
+        'username': user['Username'],
+        'date_of_birth': user['DateOfBirth'],
+        'profile_image': user['ImageUrl'],
+        'friends': [other['UserId'] for other in others],
+    }]
+
+
+def _sensor_summary_rows(data):
+    # The rows of the sensor summary query for the first workout, one per
+    # sensor
+    rows = []
+    for sensor in data['SensorTypes']:
+        values = sorted(row['SensorValue'] for row in data['SensorData'] if row['SensorId'] == sensor['SensorId'])
+        rows.append(dict(sensor, SampleCount=len(values), MinValue=values[0], MaxValue=values[-1],
+                         MeanValue=statistics.fmean(values), P25=values[len(values) // 4],
+                         Median=values[len(values) // 2], P75=values[len(values) * 3 // 4],
+                         P95=values[len(values) * 95 // 100]))
+    return rows
+
+
+def _rollup_rows(data, period='day'):
+    # The rows of the activity rollup query: totals per user and day (or
+    # week starting on Monday), oldest first
+    totals = {}
+    for workout in data['Workouts']:
+        start = workout['StartTimestamp'].date()
+        if period == 'week':
+            start -= datetime.timedelta(days=start.weekday())
+        row = totals.setdefault((start, workout['UserId']), {
+            'PeriodStart': start, 'Workouts': 0, 'TotalDistance': 0.0, 'TotalSteps': 0,
+            'CaloriesBurned': 0.0, 'ActiveMinutes': 0.0,
+        })
+        row['Workouts'] += 1
+        row['TotalDistance'] += workout['TotalDistance']
+        row['TotalSteps'] += workout['TotalSteps']
+        row['CaloriesBurned'] += workout['CaloriesBurned']
+        row['ActiveMinutes'] += (workout['EndTimestamp'] - workout['StartTimestamp']).total_seconds() / 60
+    return [totals[key] for key in sorted(totals)]
+
+
+def _workout_rows(data):
+    # The rows of the workouts query, without the UserId column
+    return [{key: value for key, value in workout.items() if key != 'UserId'} for workout in data['Workouts']]
+
+
+class FakeQueryJob:
+    """A finished query job holding google.cloud.bigquery Row objects."""
+
+    def __init__(self, rows):
+        from google.cloud.bigquery.table import Row
+        names = {name: index for index, name in enumerate(rows[0])} if rows else {}
+        self.rows = [Row(tuple(row.values()), names) for row in rows]
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def result(self, page_size=None, **kwargs):
+        return self
+
+
+class FakeBigQueryClient:
+    """Answers every query with the same rows."""
+
+    def __init__(self, rows):
+        self.job = FakeQueryJob(rows)
+
+    def query(self, query, job_config=None, **kwargs):
+        return self.job
+
+
+@contextlib.contextmanager
+def fake_bigquery(rows):
+    """Makes the data fetchers query a FakeBigQueryClient returning `rows`."""
+    client = FakeBigQueryClient(rows)
+    reset_bigquery_clients()
+    try:
+        with patch('google.cloud.bigquery.Client', return_value=client):
+            yield client
+    finally:
+        reset_bigquery_clients()
+
+
+#############################################################################
+# The benchmarks. Each is a context manager that sets up its data and yields
+# (run, items): the function to time and how many items one run processes.
+#############################################################################
+
+BENCHMARKS = {}
+
+
+def benchmark(name):
+    """Registers a benchmark under `name`."""
+    def register(func):
+        BENCHMARKS[name] = contextlib.contextmanager(func)
+        return func
+    return register
+
+
+@benchmark('fetch.sensor_data')
+def bench_fetch_sensor_data(data):
+    import data_fetcher
+    rows = _sensor_rows(data)
+    # __wrapped__ skips the result cache and no sensor store is used, so
+    # every run decodes the rows
+    with fake_bigquery(rows), patch('data_fetcher.get_sensor_store', return_value=None):
+        yield lambda: data_fetcher.get_user_sensor_data.__wrapped__('user0', 'user0-workout0'), len(rows)
+
+
+@benchmark('fetch.sensor_data_stored')
+def bench_fetch_sensor_data_stored(data):
+    import tempfile
+    import pyarrow as pa
+    import data_fetcher
+    from sensor_store import SensorDataStore
+    rows = _sensor_rows(data)
+    with tempfile.TemporaryDirectory() as directory:
+        store = SensorDataStore(directory)
+        store.put(data_fetcher.get_backend().source, 'user0', 'user0-workout0', pa.Table.from_pylist(rows))
+        # Every run reads the memory-mapped file of a workout already stored
+        with patch('data_fetcher.get_sensor_store', return_value=store):
+            yield lambda: data_fetcher.get_user_sensor_data.__wrapped__('user0', 'user0-workout0', 'arrow'), len(rows)
+
+
+@benchmark('fetch.sensor_summary')
+def bench_fetch_sensor_summary(data):
+    import data_fetcher
+    rows = _sensor_summary_rows(data)
+    with fake_bigquery(rows):
+        yield lambda: data_fetcher.get_sensor_summary.__wrapped__('user0', 'user0-workout0'), len(rows)
+
+
+@benchmark('fetch.profile')
+def bench_fetch_profile(data):
+    import data_fetcher
+    rows = _profile_rows(data)
+    with fake_bigquery(rows):
+        yield lambda: data_fetcher.get_user_profile.__wrapped__('user0'), len(rows)
+
+
+@benchmark('fetch.activity_rollup')
+def bench_fetch_activity_rollup(data):
+    import data_fetcher
+    rows = _rollup_rows(data)
+    # Only reading the rollup is timed, not syncing the user's workouts
+    with fake_bigquery(rows), patch('data_fetcher.sync_user_workouts'):
+        yield lambda: data_fetcher.get_activity_rollup.__wrapped__('user0'), len(rows)
+
+
+@benchmark('fetch.workouts')
+def bench_fetch_workouts(data):
+    import data_fetcher
+    rows = _workout_rows(data)
+    with fake_bigquery(rows):
+        yield lambda: data_fetcher.get_user_workouts.__wrapped__('user0'), len(rows)
+
+
+@benchmark('fetch.posts')
+def bench_fetch_posts(data):
+    import data_fetcher
+    rows = _post_rows(data)
+    with fake_bigquery(rows):
+        yield lambda: data_fetcher.get_user_posts.__wrapped__('user0'), len(rows)
+
+
+@benchmark('fetch.posts_page')
+def bench_fetch_posts_page(data):
+    import data_fetcher
+    # The query returns one post more than a page, to tell if there is a next one
+    rows = _post_rows(data)[:data_fetcher.POSTS_PAGE_SIZE + 1]
+    with fake_bigquery(rows):
+        yield lambda: data_fetcher.get_user_posts_page.__wrapped__('user0'), data_fetcher.POSTS_PAGE_SIZE
+
+
+@benchmark('fetch.posts_for_users')
+def bench_fetch_posts_for_users(data):
+    import data_fetcher
+    rows = _post_rows(data)
+    user_ids = [user['UserId'] for user in data['Users']]
+    with fake_bigquery(rows):
+        yield lambda: data_fetcher.get_posts_for_users.__wrapped__(user_ids), len(rows)
+
+
+def _run_app(script, *args):
+    # Run a display function as a Streamlit script in the headless harness
+    from streamlit.testing.v1 import AppTest
+    at = AppTest.from_function(script, args=args, default_timeout=60).run()
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+
+
+def _activity_summary_app(workouts):
+    from modules import display_activity_summary
+    display_activity_summary(workouts)
+
+
+def _activity_rollup_app(rollup):
+    from modules import display_activity_rollup
+    display_activity_rollup(rollup, 'week')
+
+
+def _recent_workouts_app(workouts):
+    from modules import display_recent_workouts
+    display_recent_workouts(workouts)
+
+
+def _sensor_data_app(readings):
+    from modules import display_sensor_data
+    display_sensor_data(readings)
+
+
+def _post_feed_app(page):
+    from modules import display_post_feed
+    display_post_feed('user0', page)
+
+
+def _genai_advice_app(advice):
+    from modules import display_genai_advice
+    display_genai_advice(advice['timestamp'], advice['content'], advice['image'])
+
+
+def _workout_records(data):
+    # Workouts in the format returned by get_user_workouts
+    import data_fetcher
+    with fake_bigquery(_workout_rows(data)):
+        return data_fetcher.get_user_workouts.__wrapped__('user0')
+
+
+@benchmark('display.activity_summary')
+def bench_display_activity_summary(data):
+    workouts = _workout_records(data)
+    yield lambda: _run_app(_activity_summary_app, workouts), len(workouts)
+
+
+@benchmark('display.activity_rollup')
+def bench_display_activity_rollup(data):
+    import data_fetcher
+    # Weekly totals, as shown on the Activity Summary tab
+    with fake_bigquery(_rollup_rows(data, 'week')), patch('data_fetcher.sync_user_workouts'):
+        rollup = data_fetcher.get_activity_rollup.__wrapped__('user0', 'week')
+    yield lambda: _run_app(_activity_rollup_app, rollup), len(rollup)
+
+
+@benchmark('display.recent_workouts')
+def bench_display_recent_workouts(data):
+    workouts = _workout_records(data)[:10]
+    yield lambda: _run_app(_recent_workouts_app, workouts), len(workouts)
+
+
+@benchmark('display.sensor_data')
+def bench_display_sensor_data(data):
+    readings = _sensor_rows(data)
+    yield lambda: _run_app(_sensor_data_app, readings), len(readings)
+
+
+@benchmark('display.post_feed')
+def bench_display_post_feed(data):
+    import data_fetcher
+    with fake_bigquery(_post_rows(data)):
+        posts = data_fetcher.get_posts_for_users.__wrapped__([user['UserId'] for user in data['Users']], 20)
+    page = {'posts': posts, 'next_cursor': None}
+    # Treat every image as valid instead of requesting it
+    with patch('modules.validate_images', side_effect=lambda urls: {url: True for url in urls}):
+        yield lambda: _run_app(_post_feed_app, page), len(posts)
+
+
+@benchmark('display.genai_advice')
+def bench_display_genai_advice(data):
+    advice = {'advice_id': 'advice1', 'timestamp': '2025-03-12 10:00:00', 'image': None,
+              'content': 'Keep it up! ' * 50}
+    yield lambda: _run_app(_genai_advice_app, advice), 1
+
+
+@benchmark('internals.create_component')
+def bench_create_component(data):
+    from internals import create_component
+    names = [user['Name'] for user in data['Users']]
+
+    def run():
+        for name in names:
+            create_component({'NAME': name}, 'my_custom_component')
+
+    # Only the templating is timed, not sending the HTML to Streamlit
+    with patch('internals.components.html'):
+        yield run, len(names)
+
+
+#############################################################################
+# Running, reporting and comparing
+#############################################################################
+
+def _clear_caches():
+    result_cache.clear()
+    image_cache.clear()
+
+
+def run_benchmark(name, data, repeat=5):
+    """Runs one benchmark.
+
+    Returns:
+        dict: 'items' processed per run, 'seconds' (the median run time),
+            'items_per_second' and 'peak_bytes' (peak traced memory).
+    """
+    with BENCHMARKS[name](data) as (run, items):
+        _clear_caches()
+        run()  # warm up
+        times = []
+        for _ in range(repeat):
+            _clear_caches()
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+
+        _clear_caches()
+        tracemalloc.start()
+        try:
+            run()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+
+    seconds = statistics.median(times)
+    return {
+        'items': items,
+        'seconds': seconds,
+        'items_per_second': items / seconds if seconds else float('inf'),
+        'peak_bytes': peak,
+    }
+
+
+def run_benchmarks(names=None, scale=1, repeat=5):
+    """Runs the named benchmarks (all of them by default) on a dataset of
+    the given scale and returns their results by name."""
+    data = make_dataset(scale)
+    return {name: run_benchmark(name, data, repeat) for name in (names or BENCHMARKS)}
+
+
+def compare(results, baseline, tolerance=0.2):
+    """Finds the benchmarks that got slower or use more memory than before.
+
+    Args:
+        results (dict): The results of run_benchmarks.
+        baseline (dict): Earlier results, for example loaded from --save.
+        tolerance (float): How much worse (0.2 is 20%) a number can get
+            before it counts as a regression.
+
+    Returns:
+        list: A message for each regression. Empty if there are none.
+    """
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            continue
+        for metric in ('seconds', 'peak_bytes'):
+            if result[metric] > before[metric] * (1 + tolerance):
+                regressions.append(f"{name}: {metric} went from {before[metric]:.6g} to {result[metric]:.6g}")
+    return regressions
+
+
+def print_results(results, file=None):
+    """Prints results as a table."""
+    file = file if file is not None else sys.stdout
+    print(f"{'benchmark':<28} {'items':>8} {'median (ms)':>12} {'items/s':>12} {'peak (KiB)':>11}", file=file)
+    for name, result in results.items():
+        print(f"{name:<28} {result['items']:>8} {result['seconds'] * 1000:>12.2f} "
+              f"{result['items_per_second']:>12.0f} {result['peak_bytes'] / 1024:>11.0f}", file=file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks the app's data fetchers and display functions.")
+    parser.add_argument('names', nargs='*', help="benchmarks to run (default: all); a prefix such as 'fetch.' runs a group")
+    parser.add_argument('--scale', type=int, default=1, help="multiplies the size of the synthetic data")
+    parser.add_argument('--repeat', type=int, default=5, help="timed runs per benchmark")
+    parser.add_argument('--save', help="write the results to this JSON file")
+    parser.add_argument('--baseline', help="compare against results saved with --save and exit 1 on regressions")
+    parser.add_argument('--tolerance', type=float, default=0.2, help="allowed slowdown/memory growth (default 0.2 = 20%%)")
+    args = parser.parse_args(argv)
+
+    names = [name for name in BENCHMARKS if not args.names or any(name.startswith(prefix) for prefix in args.names)]
+    results = run_benchmarks(names, args.scale, args.repeat)
+    print_results(results)
+
+    if args.save:
+        with open(args.save, 'w') as file:
+            json.dump(results, file, indent=2)
+    if args.baseline:
+        with open(args.baseline) as file:
+            regressions = compare(results, json.load(file), args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,67 @@
+#############################################################################
+# benchmark_test.py
+#
+# This file contains tests for benchmark.py. They only check that the
+# benchmarks run and that regressions are detected, not how fast anything is.
+#############################################################################
+
+import unittest
+
+from backends import SQLiteBackend
+from benchmark import BENCHMARKS, compare, make_dataset, run_benchmarks
+
+
+class TestDataset(unittest.TestCase):
+
+    def test_scale(self):
+        """Tests that the synthetic tables grow with the scale."""
+        small, large = make_dataset(1), make_dataset(2)
+        self.assertEqual(len(small['Users']), 10)
+        self.assertEqual(len(large['Users']), 20)
+        self.assertEqual(len(large['SensorData']), 2 * len(small['SensorData']))
+
+    def test_rows_fit_the_schema(self):
+        """Tests that the synthetic rows can be loaded into the SQLite backend."""
+        backend = SQLiteBackend()
+        for table, rows in make_dataset(1).items():
+            self.assertEqual(backend.insert(table, rows), len(rows))
+        backend.close()
+
+
+class TestRunBenchmarks(unittest.TestCase):
+
+    def test_fetch_and_component_benchmarks(self):
+        """Tests that benchmarks report time, throughput and memory."""
+        results = run_benchmarks(['fetch.workouts', 'fetch.posts', 'internals.create_component'], repeat=1)
+        self.assertEqual(results['fetch.workouts']['items'], 500)
+        for result in results.values():
+            self.assertGreater(result['seconds'], 0)
+            self.assertGreater(result['items_per_second'], 0)
+            self.assertGreater(result['peak_bytes'], 0)
+
+    def test_fetch_benchmarks_decode_their_rows(self):
+        """Tests that fetchers which return None on errors get rows they can decode."""
+        data = make_dataset()
+        for name in ('fetch.profile', 'fetch.sensor_summary', 'fetch.activity_rollup', 'fetch.posts_page'):
+            with self.subTest(name=name), BENCHMARKS[name](data) as (run, items):
+                self.assertIsNotNone(run())
+
+    def test_display_benchmark(self):
+        """Tests that display functions run in the headless harness."""
+        results = run_benchmarks(['display.recent_workouts'], repeat=1)
+        self.assertEqual(results['display.recent_workouts']['items'], 10)
+
+
+class TestCompare(unittest.TestCase):
+
+    def test_regressions(self):
+        """Tests that only changes beyond the tolerance are reported."""
+        baseline = {'fetch.posts': {'seconds': 1.0, 'peak_bytes': 1000}}
+        self.assertEqual(compare({'fetch.posts': {'seconds': 1.1, 'peak_bytes': 1000}}, baseline), [])
+        regressions = compare({'fetch.posts': {'seconds': 1.5, 'peak_bytes': 2000}}, baseline)
+        self.assertEqual(len(regressions), 2)
+        self.assertEqual(compare({'fetch.workouts': {'seconds': 9.0, 'peak_bytes': 1}}, baseline), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
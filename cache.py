@@ -0,0 +1,176 @@
+#############################################################################
+# cache.py
+#
+# This file contains the in-memory result cache that sits in front of the
+# functions in data_fetcher.py.
+#
+# The cache lives at module level, so it is shared by every Streamlit
+# session running in the same process.
+#############################################################################
+
+import functools
+import inspect
+import threading
+import time
+from collections import OrderedDict
+
+
+class ResultCache:
+    """A thread-safe LRU cache whose entries expire after a per-entry TTL.
+
+    Each entry remembers which user(s) it belongs to so that everything
+    cached for a user can be dropped with `invalidate(user_id)` when new data
+    is written for them.
+    """
+
+    def __init__(self, max_size=256, clock=time.monotonic):
+        """Creates an empty cache.
+
+        Args:
+            max_size (int): The most entries kept before the least recently
+                used one is evicted.
+            clock (callable): Returns the current time in seconds. Tests can
+                pass a fake clock.
+        """
+        self.max_size = max_size
+        self._clock = clock
+        self._entries = OrderedDict()  # key -> (expires_at, value, users)
+        self._lock = threading.Lock()
+        self._hits = {}
+        self._misses = {}
+        self._evictions = 0
+
+    def get(self, key):
+        """Looks up a key.
+
+        Args:
+            key (tuple): The cache key. The first item is the name used for
+                the hit/miss counters.
+
+        Returns:
+            tuple: (found, value). value is None when found is False.
+        """
+        name = key[0]
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > self._clock():
+                self._entries.move_to_end(key)
+                self._hits[name] = self._hits.get(name, 0) + 1
+                return True, entry[1]
+            if entry is not None:
+                del self._entries[key]
+            self._misses[name] = self._misses.get(name, 0) + 1
+            return False, None
+
+    def set(self, key, value, ttl, users=()):
+        """Stores a value for `ttl` seconds, evicting the LRU entry if full.
+
+        Args:
+            key (tuple): The cache key.
+            value: The value to store.
+            ttl (float): How many seconds the value stays fresh.
+            users (iterable): The user IDs the value belongs to.
+        """
+        with self._lock:
+            self._entries[key] = (self._clock() + ttl, value, frozenset(users))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, user_id):
+        """Drops every entry that belongs to the given user.
+
+        Returns:
+            int: The number of entries removed.
+        """
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if user_id in entry[2]]
+            for key in stale:
+                del self._entries[key]
+            return len(stale)
+
+    def clear(self):
+        """Drops every entry and resets the counters."""
+        with self._lock:
+            self._entries.clear()
+            self._hits.clear()
+            self._misses.clear()
+            self._evictions = 0
+
+    def stats(self):
+        """Returns the hit/miss counters.
+
+        Returns:
+            dict: 'size', 'evictions', total 'hits' and 'misses', and
+                'functions', which maps each cached name to its own
+                {'hits': ..., 'misses': ...}.
+        """
+        with self._lock:
+            names = set(self._hits) | set(self._misses)
+            return {
+                'size': len(self._entries),
+                'evictions': self._evictions,
+                'hits': sum(self._hits.values()),
+                'misses': sum(self._misses.values()),
+                'functions': {
+                    name: {'hits': self._hits.get(name, 0), 'misses': self._misses.get(name, 0)}
+                    for name in sorted(names)
+                },
+            }
+
+
+# The cache shared by all fetchers
+result_cache = ResultCache()
+
+
+def _freeze(value):
+    # Make list/dict/set arguments usable as part of a cache key
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (set, frozenset)):
+        return tuple(sorted(value))
+    return value
+
+
+def _users_of(arguments):
+    # Find the user(s) a call is about from its 'user_id'/'user_ids' argument
+    if arguments.get('user_id') is not None:
+        return (arguments['user_id'],)
+    return tuple(arguments.get('user_ids') or ())
+
+
+def cached(ttl, cache=None):
+    """Caches a fetcher's results, keyed by function name and arguments.
+
+    Results of None (which fetchers return on errors) are never cached. The
+    original function stays available as `func.__wrapped__`.
+
+    Args:
+        ttl (float): How many seconds results stay fresh.
+        cache (ResultCache, optional): The cache to use. Defaults to the
+            shared `result_cache`.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            store = cache if cache is not None else result_cache
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key = (func.__name__,) + tuple(_freeze(value) for value in bound.arguments.values())
+            found, value = store.get(key)
+            if found:
+                return value
+            value = func(*args, **kwargs)
+            if value is not None:
+                store.set(key, value, ttl, _users_of(bound.arguments))
+            return value
+
+        wrapper.ttl = ttl
+        return wrapper
+
+    return decorator
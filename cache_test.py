@@ -0,0 +1,131 @@
+#############################################################################
+# cache_test.py
+#
+# This file contains tests for cache.py.
+#############################################################################
+
+import unittest
+from unittest.mock import MagicMock, patch
+
+from cache import ResultCache, cached
+
+
+class FakeClock:
+    """A clock that only moves when the test tells it to."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.cache = ResultCache(max_size=2, clock=self.clock)
+
+    def test_hit_and_miss_counters(self):
+        """Tests that lookups are counted per function."""
+        self.assertEqual(self.cache.get(('get_user_posts', 'user1')), (False, None))
+        self.cache.set(('get_user_posts', 'user1'), ['post'], ttl=10)
+        self.assertEqual(self.cache.get(('get_user_posts', 'user1')), (True, ['post']))
+
+        stats = self.cache.stats()
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 1)
+        self.assertEqual(stats['functions']['get_user_posts'], {'hits': 1, 'misses': 1})
+
+    def test_entries_expire(self):
+        """Tests that an entry is gone once its TTL has passed."""
+        self.cache.set(('f', 1), 'value', ttl=10)
+        self.clock.now = 9.9
+        self.assertTrue(self.cache.get(('f', 1))[0])
+        self.clock.now = 10
+        self.assertFalse(self.cache.get(('f', 1))[0])
+        self.assertEqual(self.cache.stats()['size'], 0)
+
+    def test_least_recently_used_is_evicted(self):
+        """Tests that the bounded cache evicts the least recently used entry."""
+        self.cache.set(('f', 1), 'one', ttl=10)
+        self.cache.set(('f', 2), 'two', ttl=10)
+        self.cache.get(('f', 1))  # 2 is now the least recently used
+        self.cache.set(('f', 3), 'three', ttl=10)
+
+        self.assertTrue(self.cache.get(('f', 1))[0])
+        self.assertFalse(self.cache.get(('f', 2))[0])
+        self.assertTrue(self.cache.get(('f', 3))[0])
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+
+    def test_invalidate_user(self):
+        """Tests that invalidate only drops the given user's entries."""
+        self.cache.set(('f', 'user1'), 'a', ttl=10, users=['user1'])
+        self.cache.set(('f', 'user2'), 'b', ttl=10, users=['user2'])
+
+        self.assertEqual(self.cache.invalidate('user1'), 1)
+        self.assertFalse(self.cache.get(('f', 'user1'))[0])
+        self.assertTrue(self.cache.get(('f', 'user2'))[0])
+
+
+class TestCachedDecorator(unittest.TestCase):
+
+    def setUp(self):
+        self.cache = ResultCache(clock=FakeClock())
+        self.fetch = MagicMock(return_value=['row'])
+
+        @cached(ttl=60, cache=self.cache)
+        def get_rows(user_id, limit=10):
+            return self.fetch(user_id, limit)
+
+        self.get_rows = get_rows
+
+    def test_repeated_call_is_served_from_cache(self):
+        """Tests that the wrapped function only runs once for the same arguments."""
+        self.assertEqual(self.get_rows('user1'), ['row'])
+        self.assertEqual(self.get_rows('user1', limit=10), ['row'])
+        self.assertEqual(self.get_rows(user_id='user1'), ['row'])
+        self.fetch.assert_called_once_with('user1', 10)
+
+    def test_different_arguments_are_cached_separately(self):
+        """Tests that the key includes every argument."""
+        self.get_rows('user1')
+        self.get_rows('user1', limit=5)
+        self.get_rows('user2')
+        self.assertEqual(self.fetch.call_count, 3)
+
+    def test_none_is_not_cached(self):
+        """Tests that error results (None) are fetched again next time."""
+        self.fetch.return_value = None
+        self.get_rows('user1')
+        self.get_rows('user1')
+        self.assertEqual(self.fetch.call_count, 2)
+
+    def test_invalidate_refetches(self):
+        """Tests that invalidating a user makes the next call hit the source."""
+        self.get_rows('user1')
+        self.cache.invalidate('user1')
+        self.get_rows('user1')
+        self.assertEqual(self.fetch.call_count, 2)
+
+
+class TestCachedFetchers(unittest.TestCase):
+
+    @patch('google.cloud.bigquery.Client')
+    def test_workouts_query_runs_once(self, mock_bigquery_client):
+        """Tests that get_user_workouts only queries BigQuery once per user."""
+        from data_fetcher import get_user_workouts, invalidate
+        mock_client = mock_bigquery_client.return_value
+        mock_client.query.return_value.result.return_value = []
+
+        get_user_workouts('user1')
+        get_user_workouts('user1')
+        self.assertEqual(mock_client.query.call_count, 1)
+
+        invalidate('user1')
+        get_user_workouts('user1')
+        self.assertEqual(mock_client.query.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,26 @@
+#############################################################################
+# conftest.py
+#
+# This file contains pytest setup shared by all the test files.
+#############################################################################
+
+import pytest
+
+from cache import result_cache
+from data_fetcher import reset_workout_sync
+from image_validation import image_cache
+from sensor_store import set_sensor_store
+
+
+@pytest.fixture(autouse=True)
+def clear_result_cache():
+    # Every test starts with empty caches so mocked queries and requests run,
+    # and without the on-disk sensor store unless the test sets one up
+    result_cache.clear()
+    image_cache.clear()
+    reset_workout_sync()
+    set_sensor_store(None)
+    yield
+    result_cache.clear()
+    image_cache.clear()
+    reset_workout_sync()
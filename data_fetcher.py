@@ -9,18 +9,83 @@
 #############################################################################
 
 import random
-from google.cloud import bigquery
+import importlib
 import os
-import vertexai
-from vertexai.generative_models import GenerativeModel
 from dotenv import load_dotenv
 import datetime
 import pytz
+import itertools
+import threading
+import time
+import types
+import hashlib
+import json
+from cache import ResultCache, cached, result_cache
+from instrumentation import instrumented, measure, record_call, record_error
+from backends import get_backend, set_backend, get_bigquery_client, reset_bigquery_clients, ROLLUP_PERIODS, WORKOUT_COLUMN_TYPES
+from sensor_store import get_sensor_store, set_sensor_store
+from records import Record, Workout, Post, SensorSample, UserProfile
 
 _vertexai_initialized = False
 
-# Import for get_user_posts
-from google.cloud import bigquery
+# BigQuery and Vertex AI take seconds to import, so they are only imported
+# the first time they are used. They are still available as
+# data_fetcher.bigquery, data_fetcher.vertexai and data_fetcher.GenerativeModel
+# (which is also how tests patch them).
+_LAZY_IMPORTS = {
+    'bigquery': ('google.cloud.bigquery', None),
+    'vertexai': ('vertexai', None),
+    'GenerativeModel': ('vertexai.generative_models', 'GenerativeModel'),
+}
+
+
+def __getattr__(name):
+    # Called for module attributes that don't exist yet. Imports a lazy
+    # dependency and keeps it as a normal module attribute from then on.
+    if name not in _LAZY_IMPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    module_name, attribute = _LAZY_IMPORTS[name]
+    value = importlib.import_module(module_name)
+    if attribute is not None:
+        value = getattr(value, attribute)
+    globals()[name] = value
+    return value
+
+
+def _lazy(name):
+    # Look up a lazy dependency (or whatever a test patched in its place)
+    # from inside this module, where __getattr__ isn't used
+    return globals()[name] if name in globals() else __getattr__(name)
+
+# How long (in seconds) each fetcher's results stay in the shared cache.
+# Sensor data never changes once a workout is recorded, posts change the most.
+SENSOR_DATA_TTL = 60 * 60
+WORKOUTS_TTL = 5 * 60
+PROFILE_TTL = 10 * 60
+POSTS_TTL = 60
+ACTIVITY_ROLLUP_TTL = 5 * 60
+
+# How long (in seconds) generated advice is reused while the user's workouts
+# stay the same. Set GENAI_ADVICE_TTL to change it.
+GENAI_ADVICE_TTL = int(os.environ.get('GENAI_ADVICE_TTL', 6 * 60 * 60))
+
+
+def invalidate(user_id):
+    """Drops every cached result (and the synced workouts) for a user. Call
+    this after writing new data (a workout, a post, a profile change) for
+    them.
+
+    Returns:
+        int: The number of cached results removed.
+    """
+    reset_workout_sync(user_id)
+    return result_cache.invalidate(user_id)
+
+
+def cache_stats():
+    """Returns the hit/miss counters of the shared result cache."""
+    return result_cache.stats()
+
 
 users = {
     'user1': {
@@ -54,122 +119,421 @@ users = {
 }
 
 
-#asked Gemini for help on how to write the query since it needed a lot of parameters
-def get_user_sensor_data(user_id, workout_id):
+# Number of sensor rows per chunk (and per BigQuery result page) when streaming
+SENSOR_DATA_PAGE_SIZE = 10000
+
+
+def iter_user_sensor_data(user_id, workout_id, chunk_size=SENSOR_DATA_PAGE_SIZE):
+    """Streams a workout's sensor readings in fixed-size chunks.
 
-    '''Fetches data from BigQuery using a given SQL query.
+    Rows are downloaded from the backend one page (of `chunk_size` rows) at a
+    time, so only about one chunk is held in memory at once. Errors are
+    raised to the caller.
 
     Args:
-        query_string: The SQL query to execute.
-        project_id: The Google Cloud project ID.
+        user_id (str): The ID of the user who did the workout.
+        workout_id (str): The ID of the workout.
+        chunk_size (int): The number of rows per chunk. The last chunk may be
+            smaller.
+
+    Yields:
+        list: Up to `chunk_size` SensorSample records.
+    """
+    results = iter(get_backend().sensor_data(user_id, workout_id, page_size=chunk_size))
+
+    while True:
+        chunk = [SensorSample.from_row(row) for row in itertools.islice(results, chunk_size)]
+        if not chunk:
+            return
+        yield chunk
+
+
+# The ways fetchers can return their rows: a list of records (the default,
+# see records.py), a pandas DataFrame or a pyarrow Table
+OUTPUT_FORMATS = ('records', 'dataframe', 'arrow')
+
+# Column names used for workouts in dataframe/arrow mode. They match the
+# fields of Workout where there is one.
+WORKOUT_COLUMNS = {
+    'WorkoutId': 'workout_id',
+    'StartTimestamp': 'start_timestamp',
+    'EndTimestamp': 'end_timestamp',
+    'TotalDistance': 'distance',
+    'TotalSteps': 'steps',
+    'CaloriesBurned': 'calories_burned',
+}
+
+# The location columns of workouts, combined into (latitude, longitude) pairs
+# named like the Workout fields in dataframe mode
+WORKOUT_LOCATIONS = {
+    'start_lat_lng': ('StartLocationLat', 'StartLocationLong'),
+    'end_lat_lng': ('EndLocationLat', 'EndLocationLong'),
+}
+
+
+def _check_output(output):
+    # Fail early on a typo instead of silently returning records
+    if output not in OUTPUT_FORMATS:
+        raise ValueError(f"output must be one of {OUTPUT_FORMATS}, got {output!r}")
+
+
+def _to_columnar(results, output, columns=None):
+    # Build a DataFrame/Table straight from the BigQuery result, skipping the
+    # per-row records. The Storage Read API is used when it is installed,
+    # otherwise the rows are downloaded as Arrow over the REST API.
+    if output == 'arrow':
+        table = results.to_arrow(create_bqstorage_client=True)
+        if columns:
+            table = table.rename_columns([columns.get(name, name) for name in table.column_names])
+        return table
+    frame = results.to_dataframe(create_bqstorage_client=True)
+    if columns:
+        frame = frame.rename(columns=columns)
+    return frame
+
+
+def _with_locations(frame):
+    # Replace a workouts DataFrame's latitude/longitude columns with the
+    # (latitude, longitude) pairs of Workout.start_lat_lng/end_lat_lng, or
+    # None where either is missing, and put the columns in Workout order
+    import pandas as pd
+
+    for name, (lat, lng) in WORKOUT_LOCATIONS.items():
+        if lat in frame.columns and lng in frame.columns:
+            frame[name] = [(a, b) if pd.notna(a) and pd.notna(b) else None for a, b in zip(frame[lat], frame[lng])]
+            frame = frame.drop(columns=[lat, lng])
+    ordered = [column for column in Workout.COLUMNS if column in frame.columns]
+    return frame[ordered + [column for column in frame.columns if column not in ordered]]
+
+
+def _from_arrow(table, output):
+    # Convert a pyarrow Table to the requested output format
+    if output == 'arrow':
+        return table
+    if output == 'dataframe':
+        return table.to_pandas()
+    return SensorSample.from_arrow(table)
+
+
+def _stored_sensor_data(store, user_id, workout_id):
+    # Read a workout's readings from the sensor store, fetching and storing
+    # them first if they aren't there. Workouts without readings aren't
+    # stored, in case their data hasn't been uploaded yet.
+    backend = get_backend()
+    with measure('sensor_store.get') as record:
+        table = store.get(backend.source, user_id, workout_id)
+        record['rows'] = None if table is None else table.num_rows
+    if table is None:
+        table = _to_columnar(backend.sensor_data(user_id, workout_id), 'arrow')
+        if table.num_rows:
+            store.put(backend.source, user_id, workout_id, table)
+    return table
+
+
+@cached(ttl=SENSOR_DATA_TTL)
+@instrumented
+def get_user_sensor_data(user_id, workout_id, output='records'):
+
+    '''Fetches a workout's sensor readings from BigQuery.
+
+    Args:
+        user_id: The ID of the user who did the workout.
+        workout_id: The ID of the workout.
+        output: 'records' for a list of SensorSample records, or
+            'dataframe'/'arrow' for a pandas DataFrame/pyarrow Table with a
+            TIMESTAMP column and numeric SensorValue column.
 
     Returns:
-        A list of rows, where each row is a dictionary, or None if an error occurs.
+        The rows in the requested format, or None if an error occurs.
+
+    Once fetched, a workout's readings are kept in the on-disk sensor store
+    (see sensor_store.py), so later visits, from any session or process,
+    read a memory-mapped file instead of querying BigQuery.
     '''
+    _check_output(output)
     try:
-        client = bigquery.Client(project="keishlyanysanabriatechx25")
-
-        query_string = f"""
-            SELECT
-            Workouts.UserId,
-            COALESCE(SensorTypes.SensorId, SensorData.SensorId) AS SensorId,
-            SensorTypes.Name,
-            SensorTypes.Units,
-            SensorData.Timestamp,
-            SensorData.SensorValue
-        FROM
-            `keishlyanysanabriatechx25.bytemeproject.Workouts` AS Workouts
-        INNER JOIN
-            `keishlyanysanabriatechx25.bytemeproject.SensorData` AS SensorData
-        ON Workouts.WorkoutId = SensorData.WorkoutID
-        LEFT JOIN
-            `keishlyanysanabriatechx25.bytemeproject.SensorTypes` AS SensorTypes
-        ON SensorData.SensorId = SensorTypes.SensorId
-        WHERE
-        Workouts.UserId = '{user_id}'
-        AND Workouts.WorkoutId = '{workout_id}';
-        """
-
-        query_job = client.query(query_string)
-        results = query_job.result()
-
-        data = [dict(row.items()) for row in results]
-        return data
+        store = get_sensor_store()
+        if store is not None:
+            return _from_arrow(_stored_sensor_data(store, user_id, workout_id), output)
+
+        if output != 'records':
+            return _to_columnar(get_backend().sensor_data(user_id, workout_id), output)
+
+        return [row for chunk in iter_user_sensor_data(user_id, workout_id) for row in chunk]
 
     except Exception as e:
+        record_error(e)
         print(f"Error fetching BigQuery data: {e}")
         return None
 
-def get_user_workouts(user_id):
-    client = bigquery.Client()
-    query = f"""
-        SELECT
-            WorkoutId,
-            StartTimestamp,
-            EndTimestamp,
-            StartLocationLat,
-            StartLocationLong,
-            EndLocationLat,
-            EndLocationLong,
-            TotalDistance,
-            TotalSteps,
-            CaloriesBurned
-        FROM
-            `keishlyanysanabriatechx25.bytemeproject.Workouts`
-        WHERE
-            UserId = '{user_id}'
+
+@cached(ttl=SENSOR_DATA_TTL)
+@instrumented
+def get_sensor_summary(user_id, workout_id):
+    """Returns aggregates of a workout's sensor readings, one row per sensor.
+
+    The aggregation runs inside the query, so only one row per sensor is
+    transferred instead of every reading. Percentiles are approximate in
+    BigQuery.
+
+    Args:
+        user_id: The ID of the user who did the workout.
+        workout_id: The ID of the workout.
+
+    Returns:
+        A list of dictionaries with keys SensorId, Name, Units, SampleCount,
+        MinValue, MaxValue, MeanValue, P25, Median, P75 and P95, or None if
+        an error occurs.
+    """
+    try:
+        return [dict(row.items()) for row in get_backend().sensor_summary(user_id, workout_id)]
+    except Exception as e:
+        record_error(e)
+        print(f"Error fetching BigQuery data: {e}")
+        return None
+
+@cached(ttl=WORKOUTS_TTL)
+@instrumented
+def get_user_workouts(user_id, output='records', limit=None, incremental=False):
+    """Returns a user's workouts.
+
+    Args:
+        user_id (str): The ID of the user whose workouts are being fetched.
+        output (str): 'records' for a list of Workout records, or
+            'dataframe'/'arrow' for a pandas DataFrame/pyarrow Table with one
+            column per selected field (named as in WORKOUT_COLUMNS) and
+            native timestamp and numeric types. DataFrames have the
+            locations as 'start_lat_lng'/'end_lat_lng' pairs like the
+            records; Tables keep the latitude and longitude columns.
+        limit (int, optional): Only fetch the `limit` most recent workouts,
+            newest first. The ordering and limit run in the query. None
+            fetches every workout.
+        incremental (bool): If True, only fetch the workouts added since the
+            last call and merge them into the copy kept by
+            sync_user_workouts. Workouts are then oldest first. Only
+            output='records' is supported.
+
+    Returns:
+        The workouts in the requested format.
+    """
+    _check_output(output)
+    if incremental:
+        if output != 'records':
+            raise ValueError("incremental=True only supports output='records'")
+        workouts = sync_user_workouts(user_id)
+        return workouts if limit is None else workouts[::-1][:limit]
+
+    results = get_backend().workouts(user_id) if limit is None else get_backend().workouts(user_id, limit=limit)
+    if output == 'dataframe':
+        return _with_locations(_to_columnar(results, output, WORKOUT_COLUMNS))
+    if output != 'records':
+        return _to_columnar(results, output, WORKOUT_COLUMNS)
+
+    return [Workout.from_row(row) for row in results]
+
+
+# How often (in seconds) a user's synced workouts are fetched in full
+# instead of as a delta, which picks up workouts that were edited, deleted
+# or added with an older StartTimestamp than the watermark
+WORKOUT_RECONCILE_INTERVAL = 60 * 60
+
+# How many users' synced workouts are kept (the least recently synced are
+# dropped first), and how long (in seconds) an unused copy is kept. A dropped
+# copy is fetched in full by the next sync.
+WORKOUT_SYNC_MAX_USERS = 1024
+WORKOUT_SYNC_TTL = 24 * 60 * 60
+
+# Each user's synced workouts, by ('sync_user_workouts', backend, user_id): a
+# dict with 'workouts' (WorkoutId -> (sort key, record)), 'watermark' and
+# 'reconciled_at'. _synced_workouts_lock makes reading and updating a copy
+# atomic.
+_synced_workouts = ResultCache(max_size=WORKOUT_SYNC_MAX_USERS)
+_synced_workouts_lock = threading.Lock()
+
+
+def sync_user_workouts(user_id, full=False):
+    """Brings the locally held copy of a user's workouts up to date.
+
+    Only the workouts after the newest (StartTimestamp, WorkoutId) seen so
+    far are fetched, unless this is the first sync, full is True, or the
+    last full fetch is older than WORKOUT_RECONCILE_INTERVAL seconds.
+
+    Workouts that weren't in the copy yet are added to the activity rollups
+    (the backend skips the ones that were added before), since workouts are
+    also written outside the app.
+
+    Args:
+        user_id (str): The ID of the user whose workouts are synced.
+        full (bool): If True, fetch every workout and replace the copy.
+
+    Returns:
+        list: The user's workouts, oldest first, in the format returned by
+            get_user_workouts.
+    """
+    backend = get_backend()
+    key = ('sync_user_workouts', backend, user_id)
+    now = time.monotonic()
+    with _synced_workouts_lock:
+        state = _synced_workouts.get(key)[1]
+
+    known = state['workouts'] if state is not None else {}
+    if full or state is None or state['watermark'] is None or now - state['reconciled_at'] >= WORKOUT_RECONCILE_INTERVAL:
+        workouts = {}
+        rows = backend.workouts(user_id)
+        reconciled_at = now
+    else:
+        workouts = dict(state['workouts'])
+        rows = backend.workouts(user_id, after=state['watermark'])
+        reconciled_at = state['reconciled_at']
+
+    for row in rows:
+        workouts[row.WorkoutId] = ((row.StartTimestamp is not None, row.StartTimestamp, row.WorkoutId), Workout.from_row(row))
+    sort_keys = [sort_key for sort_key, record in workouts.values() if sort_key[0]]
+    watermark = max(sort_keys)[1:] if sort_keys else None
+
+    with _synced_workouts_lock:
+        _synced_workouts.set(key, {'workouts': workouts, 'watermark': watermark, 'reconciled_at': reconciled_at},
+                             WORKOUT_SYNC_TTL, (user_id,))
+
+    new = [record for workout_id, (sort_key, record) in workouts.items() if workout_id not in known and sort_key[0]]
+    if new:
+        _add_to_activity_rollups(backend, user_id, new)
+    return [record for sort_key, record in sorted(workouts.values(), key=lambda item: item[0])]
+
+
+def _add_to_activity_rollups(backend, user_id, workouts):
+    # Add synced workouts to the rollups. A failure (for example another
+    # process adding the same workouts at the same time) only delays them
+    # until the next process syncs the user from scratch, so it isn't raised.
+    rows = [{
+        'WorkoutId': workout.workout_id,
+        'UserId': user_id,
+        'StartTimestamp': workout.start_timestamp,
+        'EndTimestamp': workout.end_timestamp,
+        'StartLocationLat': workout.start_lat_lng[0] if workout.start_lat_lng else None,
+        'StartLocationLong': workout.start_lat_lng[1] if workout.start_lat_lng else None,
+        'EndLocationLat': workout.end_lat_lng[0] if workout.end_lat_lng else None,
+        'EndLocationLong': workout.end_lat_lng[1] if workout.end_lat_lng else None,
+        'TotalDistance': workout.distance,
+        'TotalSteps': workout.steps,
+        'CaloriesBurned': workout.calories_burned,
+    } for workout in workouts]
+    try:
+        backend.add_to_activity_rollups(rows)
+    except Exception as e:
+        print(f"Could not update the activity rollups: {e}")
+        return
+    result_cache.invalidate(user_id)
+
+
+def _merge_synced_workouts(backend, workouts):
+    # Add just written Workouts rows to their users' synced copies. The
+    # watermark is left alone, so workouts written elsewhere since the last
+    # sync are still fetched by the next delta.
+    with _synced_workouts_lock:
+        for workout in workouts:
+            state = _synced_workouts.get(('sync_user_workouts', backend, workout['UserId']))[1]
+            if state is None:
+                continue
+            row = types.SimpleNamespace(**{column: workout.get(column) for column in WORKOUT_COLUMN_TYPES})
+            state['workouts'] = dict(state['workouts'])
+            state['workouts'][row.WorkoutId] = ((row.StartTimestamp is not None, row.StartTimestamp, row.WorkoutId), Workout.from_row(row))
+
+
+def reset_workout_sync(user_id=None):
+    """Forgets the synced workouts of one user (or everyone), so the next
+    sync fetches them in full."""
+    if user_id is None:
+        _synced_workouts.clear()
+    else:
+        _synced_workouts.invalidate(user_id)
+
+
+@cached(ttl=ACTIVITY_ROLLUP_TTL)
+@instrumented
+def get_activity_rollup(user_id, period='day', start_date=None, end_date=None):
+    """Returns a user's activity totals per day or week.
+
+    The user's workouts are synced first (see sync_user_workouts), which
+    adds any new ones to the totals, so this reads one row per period
+    however many workouts the user has.
+
+    Args:
+        user_id (str): The ID of the user.
+        period (str): 'day', or 'week' for weeks starting on Monday (UTC).
+        start_date (datetime.date, optional): The first period to include.
+        end_date (datetime.date, optional): The last period to include.
+
+    Returns:
+        list: Oldest first, a dictionary per period with keys period_start
+            (ISO date), workouts, distance, steps, calories_burned and
+            active_minutes. None if an error occurs.
     """
-    query_job = client.query(query)
-    results = query_job.result()
-    workouts = []
-    for row in results:
-        workouts.append({
-            'WorkoutId': row.WorkoutId,
-            'StartTimestamp': row.StartTimestamp.isoformat() if row.StartTimestamp else None,
-            'end_timestamp': row.EndTimestamp.isoformat() if row.EndTimestamp else None,
-            'start_lat_lng': (row.StartLocationLat, row.StartLocationLong) if row.StartLocationLat is not None and row.StartLocationLong is not None else None,
-            'end_lat_lng': (row.EndLocationLat, row.EndLocationLong) if row.EndLocationLat is not None and row.EndLocationLong is not None else None,
+    if period not in ROLLUP_PERIODS:
+        raise ValueError(f"period must be one of {ROLLUP_PERIODS}, got {period!r}")
+    try:
+        sync_user_workouts(user_id)
+        return [{
+            'period_start': row.PeriodStart.isoformat(),
+            'workouts': row.Workouts,
             'distance': row.TotalDistance,
             'steps': row.TotalSteps,
             'calories_burned': row.CaloriesBurned,
-        })
-    #print(f"Number of workouts returned: {len(workouts)}")
-    #print(workouts)
-    return workouts
+            'active_minutes': row.ActiveMinutes,
+        } for row in get_backend().activity_rollup(user_id, period, start_date, end_date)]
+    except Exception as e:
+        record_error(e)
+        print(f"Error fetching BigQuery data: {e}")
+        return None
 
 
+def add_workouts(workouts):
+    """Stores new workouts and updates their users' activity rollups.
+
+    Args:
+        workouts (list): Workouts rows: dictionaries with WorkoutId, UserId,
+            StartTimestamp and EndTimestamp (datetimes), the location
+            columns, TotalDistance, TotalSteps and CaloriesBurned.
+
+    Returns:
+        int: The number of workouts added.
+    """
+    workouts = list(workouts)
+    backend = get_backend()
+    backend.add_workouts(workouts)
+    # Keep the synced workouts (and their watermark) so the next sync is
+    # still a delta, and only drop the cached results
+    _merge_synced_workouts(backend, workouts)
+    for user_id in {workout['UserId'] for workout in workouts}:
+        result_cache.invalidate(user_id)
+    return len(workouts)
+
+
+def rebuild_activity_rollups(user_id=None):
+    """Recomputes the activity rollups from the Workouts table, for one user
+    or (the first time, or to repair them) for everyone."""
+    get_backend().rebuild_activity_rollups(user_id)
+    # The workouts didn't change, so the synced copies stay
+    if user_id is None:
+        result_cache.clear()
+    else:
+        result_cache.invalidate(user_id)
+
+
+@cached(ttl=PROFILE_TTL)
+@instrumented
 def get_user_profile(user_id):
     # function: get_user_profile
     # input: user_id (str) - the ID of the user whose profile is being fetched
-    # output: dict - contains full_name, username, date_of_birth, profile_image, and friends list
+    # output: UserProfile - full_name, username, date_of_birth, profile_image, and friends,
+    #         or None if the user doesn't exist
+    # Misses aren't cached (cached() never stores None), so a user who signs
+    # up after a lookup is found on the next call instead of after PROFILE_TTL.
     
-    client = bigquery.Client()
+    result = get_backend().profile(user_id)
     
-    query = """
-        SELECT full_name, username, date_of_birth, profile_image,
-               ARRAY(SELECT friend_id FROM `my_project.my_dataset.friends`
-                     WHERE user_id = @user_id) AS friends
-        FROM `my_project.my_dataset.users`
-        WHERE user_id = @user_id
-    """
-    
-    job_config = bigquery.QueryJobConfig(
-        query_parameters=[bigquery.ScalarQueryParameter("user_id", "STRING", user_id)]
-    )
-    
-    result = client.query(query, job_config=job_config).result()
-    
-    row = next(result, None)
-    if row:
-        return {
-            "full_name": row.full_name,
-            "username": row.username,
-            "date_of_birth": row.date_of_birth,
-            "profile_image": row.profile_image,
-            "friends": row.friends
-        }
-    else:
-        return {}
+    row = next(iter(result), None)
+    return UserProfile.from_row(row) if row else None
 
 '''
 Funcion partially created by ChatGPT and Claude: "fix the following Function: get_user_posts in data_fetcher.py 
@@ -177,71 +541,188 @@ Returns a list of a user's posts. Some data in a post may not be populated.
 Input: user_id
 Output: A list of posts. Each post is a dictionary with keys user_id, post_id, timestamp, content, and image." 
 '''
+@cached(ttl=POSTS_TTL)
+@instrumented
 def get_user_posts(user_id):
-    """Returns a list of a user's posts from the BigQuery database.
+    """Returns a list of a user's posts from the database.
 
     Args:
         user_id (str): The ID of the user whose posts are being fetched.
 
     Returns:
-        list: A list of dictionaries, each representing a post with keys:
-            'user_id', 'post_id', 'timestamp', 'content', 'image', 'username', and 'user_image'.
-    """
-    # Initialize a BigQuery client
-    client = bigquery.Client()
-
-    # Query to fetch posts for the given user_id and join with Users table
-    query = f"""
-        SELECT p.PostId, p.AuthorId, p.Timestamp, p.Content, p.ImageUrl as PostImageUrl,
-            u.Username, u.ImageUrl as UserImageUrl
-        FROM `keishlyanysanabriatechx25.bytemeproject.Posts` p
-        JOIN `keishlyanysanabriatechx25.bytemeproject.Users` u
-        ON p.AuthorId = u.UserId
-        WHERE p.AuthorId = '{user_id}'
+        list: A list of Post records, with fields 'post_id', 'user_id',
+            'timestamp' (a datetime), 'content', 'image', 'username' and
+            'user_image'.
     """
-    
-    # Set up query parameters
-    # job_config = bigquery.QueryJobConfig(
-    #     query_parameters=[bigquery.ScalarQueryParameter("user_id", "STRING", user_id)]
-    # )
-    
-    # Execute the query
-    results = client.query(query)
+    # Run the query (see backends.py) for the given user_id, joined with the Users table
+    results = get_backend().posts(user_id)
 
     # Process the results and return the list of posts
-    posts = []
-    for row in results:
-        post = {
-            'user_id': row['AuthorId'],
-            'post_id': row['PostId'],
-            'timestamp': row['Timestamp'].strftime('%Y-%m-%d %H:%M:%S'),
-            'content': row['Content'] if row['Content'] else '',  # Handle empty content
-            'image': row['PostImageUrl'] if row['PostImageUrl'] else '',  # Handle missing post image
-            'username': row['Username'],  # Add username from Users table
-            'user_image': row['UserImageUrl']  # Add user's profile image from Users table
-        }
-        posts.append(post)
-    
-    return posts
+    return [Post.from_row(row) for row in results]
+
+
+@cached(ttl=POSTS_TTL)
+@instrumented
+def get_posts_for_users(user_ids, limit=None, before_timestamp=None):
+    """Returns the posts of several users (e.g. a friends feed) in one query.
 
-def get_genai_advice(user_id):
+    All authors are fetched with a single parameterized query instead of one
+    get_user_posts call per user.
+
+    Args:
+        user_ids (list): The IDs of the users whose posts are being fetched.
+        limit (int, optional): The most posts to return. None returns all.
+        before_timestamp (datetime, optional): Only return posts made
+            strictly before this time, e.g. the oldest post already shown.
+
+    Returns:
+        list: Post records (as returned by get_user_posts) from all the
+            users merged together, newest first.
+    """
+    # Keep the first occurrence of each user and skip the query if none are left
+    user_ids = list(dict.fromkeys(user_ids))
+    if not user_ids:
+        return []
 
-    #had to do this global vertexai variable to handle mocks in tests correctly
-    global _vertexai_initialized
-    load_dotenv()
-    if not _vertexai_initialized:
-        import vertexai
-        vertexai.init(project=os.environ.get("dagutierrez17techx25"), location="us-central1")
-        _vertexai_initialized = True
+    results = get_backend().posts_for_users(user_ids, limit, before_timestamp)
 
-    workouts = get_user_workouts(user_id)
+    return [Post.from_row(row) for row in results]
+
+
+# Number of posts shown per page of a feed
+POSTS_PAGE_SIZE = 20
+
+
+@cached(ttl=POSTS_TTL)
+@instrumented
+def get_user_posts_page(user_id, page_size=POSTS_PAGE_SIZE, cursor=None):
+    """Returns one page of a user's posts, newest first.
+
+    Pages use keyset pagination: the cursor is the (timestamp, post_id) of
+    the last post already shown, so each page is a small indexed query no
+    matter how many posts the user has made.
+
+    Args:
+        user_id (str): The ID of the user whose posts are being fetched.
+        page_size (int): The most posts to return.
+        cursor (tuple, optional): The next_cursor of the previous page. None
+            fetches the first page.
+
+    Returns:
+        dict: 'posts', a list of Post records (as returned by
+            get_user_posts), and 'next_cursor', the cursor for the following
+            page or None if this is the last one.
+    """
+    before_timestamp, before_post_id = cursor if cursor is not None else (None, None)
+
+    # Ask for one extra post to find out whether there is another page
+    rows = list(get_backend().posts_for_users([user_id], page_size + 1, before_timestamp, before_post_id))
+    next_cursor = None
+    if len(rows) > page_size:
+        rows = rows[:page_size]
+        next_cursor = (rows[-1]['Timestamp'], rows[-1]['PostId'])
+
+    return {'posts': [Post.from_row(row) for row in rows], 'next_cursor': next_cursor}
+
+
+def _json_default(value):
+    # Serialize records by their fields and anything else (datetimes) as text
+    return value.to_dict() if isinstance(value, Record) else str(value)
+
+
+def _workouts_fingerprint(workouts):
+    # A hash that changes whenever the user's workout history does
+    serialized = json.dumps(workouts, sort_keys=True, default=_json_default)
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+
+GENAI_MODEL_NAME = "gemini-1.5-flash-002"
+
+# The Gemini model shared by every call, created on first use
+_genai_model = None
+_genai_model_lock = threading.Lock()
+
+
+def get_genai_model():
+    """Returns the shared Gemini model, initializing Vertex AI on first use.
+
+    If `GenerativeModel` has been swapped out (for example by a test patch)
+    a new model is created from it.
+    """
+    global _genai_model
+    factory = _lazy('GenerativeModel')
+    entry = _genai_model
+    if entry is not None and entry[0] is factory:
+        return entry[1]
+
+    with _genai_model_lock:
+        #had to do this global vertexai variable to handle mocks in tests correctly
+        global _vertexai_initialized
+        if not _vertexai_initialized:
+            load_dotenv()
+            _lazy('vertexai').init(project=os.environ.get("dagutierrez17techx25"), location="us-central1")
+            _vertexai_initialized = True
+
+        if _genai_model is None or _genai_model[0] is not factory:
+            _genai_model = (factory, factory(GENAI_MODEL_NAME))
+        return _genai_model[1]
+
+
+def _stream_advice_content(responses, advice, cache_key, user_id, started):
+    # Pass Gemini's partial responses through, then cache the whole advice.
+    # The call is timed from `started` until the stream is exhausted, and the
+    # time to the first piece of text is recorded separately.
+    parts = []
+    try:
+        for response in responses:
+            if not parts:
+                record_call('vertexai.generate_content.first_token', started)
+            parts.append(response.text)
+            yield response.text
+    except Exception as e:
+        record_call('vertexai.generate_content', started, error=e, stream=True)
+        raise
+    record_call('vertexai.generate_content', started, stream=True)
+    result_cache.set(cache_key, dict(advice, content=''.join(parts).strip()), GENAI_ADVICE_TTL, users=[user_id])
+
+
+def get_genai_advice(user_id, stream=False):
+    """Returns motivational advice for a user generated by Gemini.
+
+    Advice is cached per user and workout history, so Gemini is only called
+    again when the user has new workouts or the cached advice is older than
+    GENAI_ADVICE_TTL seconds.
+
+    Args:
+        user_id (str): The ID of the user the advice is for.
+        stream (bool): If True, 'content' is an iterator of text pieces that
+            are yielded as Gemini generates them (the whole text at once if
+            the advice was cached). It is cached once fully consumed.
+
+    Returns:
+        dict: 'advice_id', 'timestamp', 'content' and 'image'.
+    """
+
+    workouts = get_user_workouts(user_id, incremental=True)
+
+    cache_key = ('get_genai_advice', user_id, _workouts_fingerprint(workouts))
+    found, advice = result_cache.get(cache_key)
+    if found:
+        return dict(advice, content=iter([advice['content']])) if stream else advice
 
     #call Gemini and give it instructions on how to answer
-    model = GenerativeModel("gemini-1.5-flash-002")
+    model = get_genai_model()
 
     system_instruction = ("You are a the main motivational trainer for a fitness app. You are getting information about the user's past workouts in the 'workouts' list of dictionaries")
 
-    response = model.generate_content("Please give me a motivational message for the user of this fitness app based on the 'workouts' lis of dictionaries that is received by calling 'get_user_workouts'. Please just output 1 motivational message, and also please don't mention 'get_user_workouts', just say the message")
+    prompt = "Please give me a motivational message for the user of this fitness app based on the 'workouts' lis of dictionaries that is received by calling 'get_user_workouts'. Please just output 1 motivational message, and also please don't mention 'get_user_workouts', just say the message"
+    if stream:
+        # Only starts the generation; the stream times itself as it is read
+        started = time.perf_counter()
+        response = model.generate_content(prompt, stream=True)
+    else:
+        with measure('vertexai.generate_content'):
+            response = model.generate_content(prompt, stream=False)
     
     #added more possible images and randomly select 1
     image = random.choice([
@@ -257,7 +738,13 @@ def get_genai_advice(user_id):
     now_in_timezone = datetime.datetime.now(timezone)
     advice_timestamp = now_in_timezone.strftime("%Y-%m-%d %H:%M:%S ")
 
-    return {'advice_id': id, 'timestamp': advice_timestamp, 'content' : response.candidates[0].content.parts[0].text.strip(), 'image' : image}
+    if stream:
+        advice = {'advice_id': id, 'timestamp': advice_timestamp, 'image': image}
+        return dict(advice, content=_stream_advice_content(response, advice, cache_key, user_id, started))
+
+    advice = {'advice_id': id, 'timestamp': advice_timestamp, 'content' : response.candidates[0].content.parts[0].text.strip(), 'image' : image}
+    result_cache.set(cache_key, advice, GENAI_ADVICE_TTL, users=[user_id])
+    return advice
 
 
    
@@ -15,6 +15,7 @@ import sys
 from data_fetcher import get_user_sensor_data, get_genai_advice, load_dotenv, vertexai
 from vertexai.generative_models import GenerativeModel
 from data_fetcher import _vertexai_initialized
+from records import SensorSample, Workout
 
 class MockGenerativeModel: #mock the GenAI model
     def __init__(self, expected_message, *args, **kwargs):
@@ -40,8 +41,10 @@ class TestDataFetcher(unittest.TestCase):
 
         mock_query_job = MagicMock()
         mock_results = [
-            {'sensor_type': 'accelerometer', 'timestamp': '2024-01-01 00:00:00', 'data': 10.5},
-            {'sensor_type': 'gyroscope', 'timestamp': '2024-01-01 00:01:00', 'data': 20.2},
+            {'UserId': 'test_user', 'SensorId': 'sensor1', 'Name': 'Accelerometer', 'Units': 'g',
+             'Timestamp': datetime.datetime(2024, 1, 1, 0, 0), 'SensorValue': 10.5},
+            {'UserId': 'test_user', 'SensorId': 'sensor2', 'Name': 'Gyroscope', 'Units': 'deg/s',
+             'Timestamp': datetime.datetime(2024, 1, 1, 0, 1), 'SensorValue': 20.2},
         ]
         mock_query_job.result.return_value = mock_results
 
@@ -54,12 +57,19 @@ class TestDataFetcher(unittest.TestCase):
 
         result = get_user_sensor_data(user_id, workout_id)
 
-        self.assertEqual(result, mock_results)
+        self.assertEqual(result, [
+            SensorSample('test_user', 'sensor1', 'Accelerometer', 'g', datetime.datetime(2024, 1, 1, 0, 0), 10.5),
+            SensorSample('test_user', 'sensor2', 'Gyroscope', 'deg/s', datetime.datetime(2024, 1, 1, 0, 1), 20.2),
+        ])
+        self.assertEqual(result[0]['value'], 10.5)
         mock_bigquery_client.assert_called_once()
         mock_client.query.assert_called_once()
         query = mock_client.query.call_args[0][0]
-        self.assertIn(user_id, query)
-        self.assertIn(workout_id, query)
+        self.assertNotIn(user_id, query)
+        self.assertIn("Workouts.UserId = @user_id", query)
+        parameters = mock_client.query.call_args[1]['job_config'].query_parameters
+        self.assertEqual({parameter.name: parameter.value for parameter in parameters},
+                         {'user_id': user_id, 'workout_id': workout_id})
 
     @patch('google.cloud.bigquery.Client')
     @patch('builtins.print')
@@ -101,9 +111,9 @@ class TestDataFetcher(unittest.TestCase):
 
         mock_query_job = MagicMock()
         mock_results = [
-            {'sensor_type': 'temperature', 'timestamp': '2024-01-01 00:00:00', 'data': 36.5},
-            {'sensor_type': 'heart_rate', 'timestamp': '2024-01-01 00:01:00', 'data': 80},
-            {'sensor_type': 'pressure', 'timestamp': '2024-01-01 00:02:00', 'data': "1013.25"},
+            {'SensorId': 'temperature', 'Timestamp': datetime.datetime(2024, 1, 1, 0, 0), 'SensorValue': 36.5},
+            {'SensorId': 'heart_rate', 'Timestamp': datetime.datetime(2024, 1, 1, 0, 1), 'SensorValue': 80},
+            {'SensorId': 'pressure', 'Timestamp': datetime.datetime(2024, 1, 1, 0, 2), 'SensorValue': "1013.25"},
         ]
         mock_query_job.result.return_value = mock_results
 
@@ -116,7 +126,9 @@ class TestDataFetcher(unittest.TestCase):
 
         result = get_user_sensor_data(user_id, workout_id)
 
-        self.assertEqual(result, mock_results)
+        # Values are passed through with the types BigQuery returned
+        self.assertEqual([sample.value for sample in result], [36.5, 80, "1013.25"])
+        self.assertEqual(result[1].timestamp, datetime.datetime(2024, 1, 1, 0, 1))
 
     @patch('google.cloud.bigquery.Client')
     def test_partial_data(self, mock_bigquery_client):
@@ -124,8 +136,8 @@ class TestDataFetcher(unittest.TestCase):
 
         mock_query_job = MagicMock()
         mock_results = [
-            {'sensor_type': 'accelerometer', 'timestamp': '2024-01-01 00:00:00'},
-            {'sensor_type': 'gyroscope', 'data': 20.2},
+            {'SensorId': 'accelerometer', 'Timestamp': datetime.datetime(2024, 1, 1, 0, 0)},
+            {'SensorId': 'gyroscope', 'SensorValue': 20.2},
         ]
         mock_query_job.result.return_value = mock_results
 
@@ -138,13 +150,17 @@ class TestDataFetcher(unittest.TestCase):
 
         result = get_user_sensor_data(user_id, workout_id)
 
-        self.assertEqual(result, mock_results)
+        # Missing columns become None
+        self.assertEqual(result, [
+            SensorSample(None, 'accelerometer', None, None, datetime.datetime(2024, 1, 1, 0, 0), None),
+            SensorSample(None, 'gyroscope', None, None, None, 20.2),
+        ])
     
     @patch('google.cloud.bigquery.Client')
     def test_large_dataset_handling(self, mock_bigquery_client):
         """Tests handling of a large dataset from BigQuery."""
 
-        large_dataset = [{'sensor_type': 'test', 'timestamp': '2024-01-01 00:00:00', 'data': 1.0} for _ in range(1000)]
+        large_dataset = [{'SensorId': 'test', 'Timestamp': datetime.datetime(2024, 1, 1), 'SensorValue': 1.0} for _ in range(1000)]
 
         mock_query_job = MagicMock()
         mock_query_job.result.return_value = large_dataset
@@ -158,7 +174,8 @@ class TestDataFetcher(unittest.TestCase):
 
         result = get_user_sensor_data(user_id, workout_id)
 
-        self.assertEqual(result, large_dataset)
+        self.assertEqual(len(result), 1000)
+        self.assertTrue(all(sample.sensor_id == 'test' and sample.value == 1.0 for sample in result))
     
     """Tests for get_genai_advice, these tests were created with help from Gemini"""
     
@@ -204,7 +221,7 @@ class TestDataFetcher(unittest.TestCase):
         self.assertEqual(result['timestamp'], "2024-01-01 12:00:00 ")
         #mock_vertexai_init.assert_called_once_with(project="test_project", location="us-central1")
         mock_datetime_class.now.assert_called_once()
-        mock_get_user_workouts.assert_called_once_with("test_user") 
+        mock_get_user_workouts.assert_called_once_with("test_user", incremental=True) 
 
     @patch('data_fetcher.vertexai.init')
     @patch('random.choice')
@@ -233,6 +250,304 @@ class TestDataFetcher(unittest.TestCase):
         mock_datetime_class.now.assert_called_once()
         mock_vertexai_init.assert_called_once_with(project=None, location="us-central1")
 
+class TestIterUserSensorData(unittest.TestCase):
+    """Tests for streaming sensor data in chunks."""
+
+    @patch('google.cloud.bigquery.Client')
+    def test_yields_fixed_size_chunks(self, mock_bigquery_client):
+        """Tests that rows come back in chunks of the requested size."""
+        from data_fetcher import iter_user_sensor_data
+        rows = [{'SensorId': 'sensor1', 'SensorValue': float(i)} for i in range(7)]
+        mock_query_job = mock_bigquery_client.return_value.query.return_value
+        mock_query_job.result.return_value = iter(rows)
+
+        chunks = list(iter_user_sensor_data("test_user", "test_workout", chunk_size=3))
+
+        self.assertEqual([len(chunk) for chunk in chunks], [3, 3, 1])
+        self.assertEqual([sample.value for chunk in chunks for sample in chunk], [row['SensorValue'] for row in rows])
+        mock_query_job.result.assert_called_once_with(page_size=3)
+
+    @patch('google.cloud.bigquery.Client')
+    def test_is_lazy(self, mock_bigquery_client):
+        """Tests that rows are only pulled from BigQuery as chunks are consumed."""
+        from data_fetcher import iter_user_sensor_data
+        pulled = []
+
+        def rows():
+            for i in range(10):
+                pulled.append(i)
+                yield {'SensorValue': i}
+
+        mock_bigquery_client.return_value.query.return_value.result.return_value = rows()
+
+        chunks = iter_user_sensor_data("test_user", "test_workout", chunk_size=4)
+        next(chunks)
+
+        self.assertEqual(len(pulled), 4)
+
+    @patch('google.cloud.bigquery.Client')
+    def test_list_version_matches_stream(self, mock_bigquery_client):
+        """Tests that get_user_sensor_data returns the concatenated chunks."""
+        from data_fetcher import get_user_sensor_data
+        rows = [{'SensorValue': i} for i in range(25)]
+        mock_bigquery_client.return_value.query.return_value.result.return_value = rows
+
+        self.assertEqual([sample.value for sample in get_user_sensor_data("test_user", "test_workout")], list(range(25)))
+
+class TestColumnarOutput(unittest.TestCase):
+    """Tests for the dataframe/arrow output modes."""
+
+    @patch('google.cloud.bigquery.Client')
+    def test_sensor_data_as_dataframe(self, mock_bigquery_client):
+        """Tests that the DataFrame comes straight from the BigQuery result."""
+        import pandas as pd
+        from data_fetcher import get_user_sensor_data
+        frame = pd.DataFrame({'SensorId': ['sensor1'], 'SensorValue': [1.5]})
+        mock_results = mock_bigquery_client.return_value.query.return_value.result.return_value
+        mock_results.to_dataframe.return_value = frame
+
+        result = get_user_sensor_data("test_user", "test_workout", output='dataframe')
+
+        self.assertIs(result, frame)
+        mock_results.to_dataframe.assert_called_once_with(create_bqstorage_client=True)
+
+    @patch('google.cloud.bigquery.Client')
+    def test_workouts_as_dataframe_renames_columns(self, mock_bigquery_client):
+        """Tests that workout columns use the same names as the Workout fields."""
+        import pandas as pd
+        from data_fetcher import get_user_workouts
+        mock_results = mock_bigquery_client.return_value.query.return_value.result.return_value
+        mock_results.to_dataframe.return_value = pd.DataFrame({
+            'WorkoutId': ['workout1'],
+            'StartTimestamp': pd.to_datetime(['2024-07-29T07:00:00Z']),
+            'EndTimestamp': pd.to_datetime(['2024-07-29T08:00:00Z']),
+            'TotalDistance': [5.0],
+            'TotalSteps': [8000],
+            'CaloriesBurned': [400],
+        })
+
+        result = get_user_workouts("user1", output='dataframe')
+
+        self.assertEqual(list(result.columns), ['workout_id', 'start_timestamp', 'end_timestamp', 'distance', 'steps', 'calories_burned'])
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(result['start_timestamp']))
+
+    @patch('google.cloud.bigquery.Client')
+    def test_workouts_as_dataframe_pairs_locations(self, mock_bigquery_client):
+        """Tests that latitude/longitude columns become start_lat_lng/end_lat_lng pairs like the records."""
+        import pandas as pd
+        from data_fetcher import get_user_workouts
+        mock_results = mock_bigquery_client.return_value.query.return_value.result.return_value
+        mock_results.to_dataframe.return_value = pd.DataFrame({
+            'WorkoutId': ['workout1', 'workout2'],
+            'StartTimestamp': pd.to_datetime(['2024-07-29T07:00:00Z', '2024-07-30T09:00:00Z']),
+            'EndTimestamp': pd.to_datetime(['2024-07-29T08:00:00Z', '2024-07-30T10:00:00Z']),
+            'StartLocationLat': [37.7749, None],
+            'StartLocationLong': [-122.4194, None],
+            'EndLocationLat': [37.8049, 40.7308],
+            'EndLocationLong': [-122.4210, None],
+            'TotalDistance': [5.0, 6.5],
+            'TotalSteps': [8000, 10000],
+            'CaloriesBurned': [400, 500],
+        })
+
+        result = get_user_workouts("user1", output='dataframe')
+
+        self.assertEqual(list(result.columns), list(Workout.COLUMNS))
+        self.assertEqual(list(result['start_lat_lng']), [(37.7749, -122.4194), None])
+        self.assertEqual(list(result['end_lat_lng']), [(37.8049, -122.4210), None])
+
+    @patch('google.cloud.bigquery.Client')
+    def test_workouts_as_arrow(self, mock_bigquery_client):
+        """Tests that arrow mode returns a renamed pyarrow Table."""
+        import pyarrow as pa
+        from data_fetcher import get_user_workouts
+        mock_results = mock_bigquery_client.return_value.query.return_value.result.return_value
+        mock_results.to_arrow.return_value = pa.table({'WorkoutId': ['workout1'], 'TotalDistance': [5.0]})
+
+        result = get_user_workouts("user1", output='arrow')
+
+        self.assertEqual(result.column_names, ['workout_id', 'distance'])
+
+    def test_unknown_output(self):
+        """Tests that an unknown output format is rejected."""
+        from data_fetcher import get_user_workouts
+        with self.assertRaises(ValueError):
+            get_user_workouts("user1", output='csv')
+
+class TestBigQueryClientPool(unittest.TestCase):
+    """Tests for the shared BigQuery client used by all fetchers."""
+
+    def setUp(self):
+        from data_fetcher import reset_bigquery_clients
+        reset_bigquery_clients()
+
+    @patch('google.cloud.bigquery.Client')
+    def test_client_is_reused(self, mock_bigquery_client):
+        """Tests that repeated lookups return the same client."""
+        from data_fetcher import get_bigquery_client
+
+        first = get_bigquery_client()
+        second = get_bigquery_client()
+
+        self.assertIs(first, second)
+        mock_bigquery_client.assert_called_once_with()
+
+    @patch('google.cloud.bigquery.Client')
+    def test_one_client_per_project(self, mock_bigquery_client):
+        """Tests that each project gets its own client."""
+        from data_fetcher import get_bigquery_client
+        mock_bigquery_client.side_effect = lambda **kwargs: MagicMock(**kwargs)
+
+        default_client = get_bigquery_client()
+        project_client = get_bigquery_client("my-project")
+
+        self.assertIsNot(default_client, project_client)
+        self.assertIs(get_bigquery_client("my-project"), project_client)
+        mock_bigquery_client.assert_called_with(project="my-project")
+
+    @patch('google.cloud.bigquery.Client')
+    def test_fetchers_share_client(self, mock_bigquery_client):
+        """Tests that several fetcher calls only create one client."""
+        mock_client = mock_bigquery_client.return_value
+        mock_client.query.return_value.result.return_value = []
+
+        from data_fetcher import get_user_workouts
+        get_user_workouts("user1")
+        get_user_workouts("user2")
+
+        mock_bigquery_client.assert_called_once()
+        self.assertEqual(mock_client.query.call_count, 2)
+
+    @patch('google.cloud.bigquery.Client')
+    def test_concurrent_first_use_creates_one_client(self, mock_bigquery_client):
+        """Tests that racing threads still only create a single client."""
+        import threading
+        from data_fetcher import get_bigquery_client
+
+        clients = []
+        threads = [threading.Thread(target=lambda: clients.append(get_bigquery_client())) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        mock_bigquery_client.assert_called_once()
+        self.assertTrue(all(client is clients[0] for client in clients))
+
+class TestGenAiAdviceCache(unittest.TestCase):
+    """Tests that Gemini is only called again when the workouts change."""
+
+    def setUp(self):
+        self.workouts = [{'WorkoutId': 'workout1', 'distance': 5.0}]
+        self.model = MagicMock()
+        self.model.generate_content.side_effect = MockGenerativeModel("Keep going!").generate_content
+        self.patchers = [
+            patch('data_fetcher.vertexai.init'),
+            patch('data_fetcher.get_user_workouts', side_effect=lambda user_id, **kwargs: list(self.workouts)),
+            patch('data_fetcher.GenerativeModel', return_value=self.model),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+
+    def test_same_workouts_reuse_advice(self):
+        """Tests that a second call with unchanged workouts does not call Gemini."""
+        first = get_genai_advice("user1")
+        second = get_genai_advice("user1")
+
+        self.assertEqual(first, second)
+        self.model.generate_content.assert_called_once()
+
+    def test_new_workout_regenerates_advice(self):
+        """Tests that a new workout changes the fingerprint and calls Gemini again."""
+        get_genai_advice("user1")
+        self.workouts.append({'WorkoutId': 'workout2', 'distance': 3.0})
+        get_genai_advice("user1")
+
+        self.assertEqual(self.model.generate_content.call_count, 2)
+
+    def test_advice_expires(self):
+        """Tests that advice older than GENAI_ADVICE_TTL is regenerated."""
+        from cache import result_cache
+        from data_fetcher import GENAI_ADVICE_TTL
+        with patch.object(result_cache, '_clock', return_value=1000.0):
+            get_genai_advice("user1")
+        with patch.object(result_cache, '_clock', return_value=1000.0 + GENAI_ADVICE_TTL):
+            get_genai_advice("user1")
+
+        self.assertEqual(self.model.generate_content.call_count, 2)
+
+class TestGenAiModelAndStreaming(unittest.TestCase):
+    """Tests for the shared Gemini model and streamed advice."""
+
+    def setUp(self):
+        self.model = MagicMock()
+        self.patchers = [
+            patch('data_fetcher.vertexai.init'),
+            patch('data_fetcher.get_user_workouts', return_value=[]),
+            patch('data_fetcher.GenerativeModel', return_value=self.model),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+
+    def test_model_is_created_once(self):
+        """Tests that the model handle is reused between calls."""
+        import data_fetcher
+        first = data_fetcher.get_genai_model()
+        second = data_fetcher.get_genai_model()
+
+        self.assertIs(first, self.model)
+        self.assertIs(second, self.model)
+        data_fetcher.GenerativeModel.assert_called_once_with(data_fetcher.GENAI_MODEL_NAME)
+
+    def test_stream_yields_partial_text_then_caches(self):
+        """Tests that streamed advice yields Gemini's chunks and is cached once read."""
+        self.model.generate_content.return_value = iter([MagicMock(text="Keep "), MagicMock(text="going! ")])
+
+        advice = get_genai_advice("user1", stream=True)
+
+        self.model.generate_content.assert_called_once()
+        self.assertTrue(self.model.generate_content.call_args[1]['stream'])
+        self.assertEqual(list(advice['content']), ["Keep ", "going! "])
+
+        cached = get_genai_advice("user1")
+        self.assertEqual(cached['content'], "Keep going!")
+        self.assertEqual(cached['advice_id'], advice['advice_id'])
+        self.model.generate_content.assert_called_once()
+
+        streamed_again = get_genai_advice("user1", stream=True)
+        self.assertEqual(list(streamed_again['content']), ["Keep going!"])
+
+    def test_stream_is_timed_until_exhausted(self):
+        """Tests that a streamed call is timed while it is read, not just while it starts."""
+        from instrumentation import recorder
+        clock = iter(range(0, 100, 10))
+
+        def chunks():
+            yield MagicMock(text="Keep ")
+            yield MagicMock(text="going!")
+
+        self.model.generate_content.return_value = chunks()
+        recorder.clear()
+        with patch('time.perf_counter', side_effect=lambda: next(clock)):
+            advice = get_genai_advice("user1", stream=True)
+            self.assertEqual(recorder.records('vertexai.generate_content'), [])
+            list(advice['content'])
+
+        [first_token] = recorder.records('vertexai.generate_content.first_token')
+        [call] = recorder.records('vertexai.generate_content')
+        recorder.clear()
+        self.assertEqual(first_token['seconds'], 10)
+        self.assertEqual(call['seconds'], 20)
+        self.assertTrue(call['stream'])
+
 # Imports for get_user_posts testing
 import unittest
 from unittest.mock import Mock, patch, MagicMock
@@ -308,7 +623,7 @@ class TestGetUserPosts(unittest.TestCase):
         self.assertEqual(len(result), 2)
         self.assertEqual(result[0]['post_id'], 'post1')
         self.assertEqual(result[0]['user_id'], self.test_user_id)
-        self.assertEqual(result[0]['timestamp'], self.test_timestamp.strftime('%Y-%m-%d %H:%M:%S'))
+        self.assertEqual(result[0]['timestamp'], self.test_timestamp)
         self.assertEqual(result[0]['content'], 'Test post content')
         self.assertEqual(result[0]['image'], 'https://example.com/image.jpg')
         self.assertEqual(result[0]['username'], 'testuser')
@@ -317,7 +632,9 @@ class TestGetUserPosts(unittest.TestCase):
         # Verify the SQL query contains the correct user_id
         self.mock_client.query.assert_called_once()
         query_arg = self.mock_client.query.call_args[0][0]
-        self.assertIn(f"WHERE p.AuthorId = '{self.test_user_id}'", query_arg)
+        self.assertIn("WHERE p.AuthorId = @user_id", query_arg)
+        job_config = self.mock_client.query.call_args[1]['job_config']
+        self.assertEqual(job_config.query_parameters[0].value, self.test_user_id)
 
     def test_get_user_posts_with_missing_fields(self):
         """Test retrieving posts with some fields missing."""
@@ -367,13 +684,13 @@ class TestGetUserPosts(unittest.TestCase):
         # Call the function
         get_user_posts(malicious_user_id)
         
-        # Verify the SQL query contains the user_id as is, which is potentially vulnerable
-        # Note: This test is actually detecting a vulnerability in the code
+        # Verify the user_id is passed as a query parameter, not put in the SQL
         self.mock_client.query.assert_called_once()
         query_arg = self.mock_client.query.call_args[0][0]
-        self.assertIn(f"WHERE p.AuthorId = '{malicious_user_id}'", query_arg)
-        
-        # Note: This is where we would recommend fixing the code to use parameterized queries
+        self.assertNotIn(malicious_user_id, query_arg)
+        self.assertIn("WHERE p.AuthorId = @user_id", query_arg)
+        job_config = self.mock_client.query.call_args[1]['job_config']
+        self.assertEqual(job_config.query_parameters[0].value, malicious_user_id)
 
     def test_suggested_fix_for_sql_injection(self):
         """Test a suggested fix for SQL injection using query parameters."""
@@ -444,6 +761,226 @@ class TestGetUserPosts(unittest.TestCase):
             self.mock_client.query.assert_called_once()
             # In a real fix, we would verify query parameters were used correctly
 
+class TestGetPostsForUsers(unittest.TestCase):
+    """Tests for the batched friends feed fetch."""
+
+    def setUp(self):
+        self.mock_client = MagicMock()
+        self.client_patcher = patch('data_fetcher.bigquery.Client', return_value=self.mock_client)
+        self.client_patcher.start()
+
+    def tearDown(self):
+        self.client_patcher.stop()
+
+    def _row(self, post_id, author_id, timestamp):
+        return {
+            'PostId': post_id,
+            'AuthorId': author_id,
+            'Timestamp': timestamp,
+            'Content': f'Post {post_id}',
+            'PostImageUrl': None,
+            'Username': author_id,
+            'UserImageUrl': 'https://example.com/user.jpg',
+        }
+
+    def test_one_query_for_all_users(self):
+        """Tests that all authors are fetched with a single array-parameter query."""
+        from data_fetcher import get_posts_for_users
+        self.mock_client.query.return_value.result.return_value = [
+            self._row('post2', 'user3', datetime.datetime(2024, 1, 2)),
+            self._row('post1', 'user2', datetime.datetime(2024, 1, 1)),
+        ]
+
+        result = get_posts_for_users(['user2', 'user3', 'user2'])
+
+        self.mock_client.query.assert_called_once()
+        query = self.mock_client.query.call_args[0][0]
+        self.assertIn("IN UNNEST(@user_ids)", query)
+        self.assertIn("ORDER BY p.Timestamp DESC", query)
+        self.assertNotIn("LIMIT", query)
+        job_config = self.mock_client.query.call_args[1]['job_config']
+        user_ids_param = job_config.query_parameters[0]
+        self.assertEqual(user_ids_param.name, "user_ids")
+        self.assertEqual(user_ids_param.values, ['user2', 'user3'])
+        self.assertEqual([post['post_id'] for post in result], ['post2', 'post1'])
+        self.assertEqual(result[1]['image'], '')
+
+    def test_limit_and_before_timestamp(self):
+        """Tests that the page size and cursor are pushed into the query."""
+        from data_fetcher import get_posts_for_users
+        self.mock_client.query.return_value.result.return_value = []
+        before = datetime.datetime(2024, 1, 1, 12, 0, 0, tzinfo=datetime.timezone.utc)
+
+        get_posts_for_users(['user2'], limit=20, before_timestamp=before)
+
+        query = self.mock_client.query.call_args[0][0]
+        self.assertIn("p.Timestamp < @before_timestamp", query)
+        self.assertIn("LIMIT 20", query)
+        job_config = self.mock_client.query.call_args[1]['job_config']
+        self.assertEqual(job_config.query_parameters[1].value, before)
+
+    def test_no_users(self):
+        """Tests that an empty friends list does not run a query."""
+        from data_fetcher import get_posts_for_users
+        self.assertEqual(get_posts_for_users([]), [])
+        self.mock_client.query.assert_not_called()
+
+class TestGetSensorSummary(unittest.TestCase):
+    """Tests for the per-sensor aggregates fetch."""
+
+    @patch('data_fetcher.bigquery.Client')
+    def test_aggregates_in_query(self, mock_client_class):
+        """Tests that the aggregation runs in BigQuery and one row per sensor comes back."""
+        from data_fetcher import get_sensor_summary
+        mock_client = mock_client_class.return_value
+        mock_client.query.return_value.result.return_value = [{
+            'SensorId': 'sensor1', 'Name': 'Heart Rate', 'Units': 'bpm', 'SampleCount': 3600,
+            'MinValue': 60.0, 'MaxValue': 180.0, 'MeanValue': 120.0,
+            'P25': 90.0, 'Median': 120.0, 'P75': 150.0, 'P95': 174.0,
+        }]
+
+        result = get_sensor_summary('user1', 'workout1')
+
+        query = mock_client.query.call_args[0][0]
+        self.assertIn("GROUP BY SensorData.SensorId", query)
+        self.assertIn("APPROX_QUANTILES(SensorData.SensorValue, 100)", query)
+        job_config = mock_client.query.call_args[1]['job_config']
+        self.assertEqual([param.value for param in job_config.query_parameters], ['user1', 'workout1'])
+        self.assertEqual(len(result), 1)
+        self.assertEqual(result[0]['Median'], 120.0)
+
+    @patch('data_fetcher.bigquery.Client')
+    def test_error_returns_none(self, mock_client_class):
+        """Tests that query errors are reported as None."""
+        from data_fetcher import get_sensor_summary
+        mock_client_class.return_value.query.side_effect = Exception("BigQuery error")
+        self.assertIsNone(get_sensor_summary('user1', 'workout1'))
+
+
+class TestSensorStore(unittest.TestCase):
+    """Tests that get_user_sensor_data reads through the on-disk sensor store."""
+
+    def setUp(self):
+        import tempfile
+        from sensor_store import SensorDataStore, set_sensor_store
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = SensorDataStore(self.directory.name)
+        set_sensor_store(self.store)
+
+    def tearDown(self):
+        from sensor_store import set_sensor_store
+        set_sensor_store(None)
+        self.directory.cleanup()
+
+    @patch('google.cloud.bigquery.Client')
+    def test_revisit_reads_file(self, mock_bigquery_client):
+        """Tests that a workout is queried once and then read from its file."""
+        import pyarrow as pa
+        from cache import result_cache
+        from data_fetcher import get_user_sensor_data
+        mock_results = mock_bigquery_client.return_value.query.return_value.result.return_value
+        mock_results.to_arrow.return_value = pa.table({
+            'UserId': ['user1', 'user1'], 'SensorId': ['sensor1', 'sensor1'], 'Name': ['Heart Rate', 'Heart Rate'],
+            'Units': ['bpm', 'bpm'], 'Timestamp': pa.array([0, 1], pa.timestamp('us', tz='UTC')), 'SensorValue': [1.5, 2.5],
+        })
+
+        first = get_user_sensor_data('user1', 'workout1')
+        result_cache.clear()
+        frame = get_user_sensor_data('user1', 'workout1', output='dataframe')
+        table = get_user_sensor_data('user1', 'workout1', output='arrow')
+
+        self.assertEqual([(sample.sensor_id, sample.value) for sample in first], [('sensor1', 1.5), ('sensor1', 2.5)])
+        self.assertEqual(first[1].timestamp, datetime.datetime(1970, 1, 1, 0, 0, 0, 1, tzinfo=datetime.timezone.utc))
+        self.assertEqual(list(frame['SensorValue']), [1.5, 2.5])
+        self.assertEqual(table.column('SensorValue').to_pylist(), [1.5, 2.5])
+        self.assertEqual(mock_bigquery_client.return_value.query.call_count, 1)
+        self.assertEqual(len(os.listdir(self.directory.name)), 1)
+        from backends import get_backend
+        self.assertIsNotNone(self.store.get(get_backend().source, 'user1', 'workout1'))
+
+    @patch('google.cloud.bigquery.Client')
+    def test_empty_workout_not_stored(self, mock_bigquery_client):
+        """Tests that a workout without readings is queried again next time."""
+        import pyarrow as pa
+        from data_fetcher import get_user_sensor_data
+        mock_results = mock_bigquery_client.return_value.query.return_value.result.return_value
+        mock_results.to_arrow.return_value = pa.table({'SensorId': pa.array([], pa.string())})
+
+        self.assertEqual(get_user_sensor_data('user1', 'workout1'), [])
+        from backends import get_backend
+        self.assertIsNone(self.store.get(get_backend().source, 'user1', 'workout1'))
+
+
+class TestActivityRollupBigQuery(unittest.TestCase):
+    """Tests the BigQuery queries behind the activity rollups."""
+
+    @patch('data_fetcher.bigquery.Client')
+    def test_add_workouts_merges_deltas(self, mock_client_class):
+        """Tests that new workouts are inserted and merged into the rollups in one transaction."""
+        from data_fetcher import add_workouts
+        mock_client = mock_client_class.return_value
+        start = datetime.datetime(2024, 7, 29, 7, 0, tzinfo=datetime.timezone.utc)
+
+        add_workouts([{'WorkoutId': 'workout1', 'UserId': 'user1', 'StartTimestamp': start,
+                       'EndTimestamp': start + datetime.timedelta(minutes=45),
+                       'TotalDistance': 5.0, 'TotalSteps': 8000, 'CaloriesBurned': 400.0}])
+
+        mock_client.insert_rows_json.assert_not_called()
+        mock_client.query.assert_called_once()
+        query = mock_client.query.call_args[0][0]
+        self.assertLess(query.index("BEGIN TRANSACTION"), query.index(".Workouts`"))
+        self.assertLess(query.index("MERGE"), query.index(".RolledUpWorkouts` (UserId, WorkoutId)"))
+        self.assertLess(query.index(".RolledUpWorkouts` (UserId, WorkoutId)"), query.index("COMMIT TRANSACTION"))
+        self.assertIn("Workouts = Rollups.Workouts + New.Workouts", query)
+        [workouts] = [parameter.values for parameter in mock_client.query.call_args[1]['job_config'].query_parameters]
+        self.assertEqual(workouts[0].struct_values['StartTimestamp'], start)
+        self.assertIsNone(workouts[0].struct_values['StartLocationLat'])
+
+    @patch('data_fetcher.bigquery.Client')
+    def test_rebuild_for_one_user_is_a_transaction(self, mock_client_class):
+        """Tests that a user's rollups are deleted and recomputed in one transaction."""
+        from data_fetcher import rebuild_activity_rollups
+        mock_client = mock_client_class.return_value
+
+        rebuild_activity_rollups('user1')
+
+        query = mock_client.query.call_args[0][0]
+        begin, commit = query.index("BEGIN TRANSACTION"), query.index("COMMIT TRANSACTION")
+        self.assertLess(begin, query.index("DELETE FROM"))
+        self.assertLess(query.index("INSERT INTO"), commit)
+        self.assertIn("ROLLBACK TRANSACTION", query)
+        self.assertEqual(mock_client.query.call_args[1]['job_config'].query_parameters[0].value, 'user1')
+
+    @patch('data_fetcher.bigquery.Client')
+    def test_add_no_workouts(self, mock_client_class):
+        """Tests that adding no workouts doesn't run a query."""
+        from data_fetcher import add_workouts
+
+        self.assertEqual(add_workouts([]), 0)
+
+        mock_client_class.return_value.query.assert_not_called()
+
+    @patch('data_fetcher.bigquery.Client')
+    def test_rollup_range(self, mock_client_class):
+        """Tests that the date range is pushed into the query."""
+        from data_fetcher import get_activity_rollup
+        mock_client = mock_client_class.return_value
+        mock_client.query.return_value.result.return_value = [MagicMock(
+            PeriodStart=datetime.date(2024, 7, 29), Workouts=2, TotalDistance=7.5, TotalSteps=9000,
+            CaloriesBurned=500.0, ActiveMinutes=90.0)]
+
+        with patch('data_fetcher.sync_user_workouts') as mock_sync:
+            result = get_activity_rollup('user1', 'week', start_date=datetime.date(2024, 1, 1))
+
+        mock_sync.assert_called_once_with('user1')
+
+        query = mock_client.query.call_args[0][0]
+        self.assertIn("PeriodStart >= @start_date", query)
+        self.assertNotIn("@end_date", query)
+        self.assertEqual(result[0]['period_start'], '2024-07-29')
+        self.assertEqual(result[0]['workouts'], 2)
+
+
 import unittest
 from unittest.mock import MagicMock, patch
 from modules import get_user_workouts  # Adjust to the correct import path
@@ -472,16 +1009,16 @@ class TestGetUserWorkout(unittest.TestCase):
             )
         ]
 
-        expected_result = [{
-            'WorkoutId': "workout1",
-            'StartTimestamp': "2024-07-29T07:00:00",
-            'end_timestamp': "2024-07-29T08:00:00",
-            'start_lat_lng': (37.7749, -122.4194),
-            'end_lat_lng': (37.8049, -122.4210),
-            'distance': 5.0,
-            'steps': 8000,
-            'calories_burned': 400,
-        }]
+        expected_result = [Workout(
+            workout_id="workout1",
+            start_timestamp=datetime.datetime(2024, 7, 29, 7, 0, 0),
+            end_timestamp=datetime.datetime(2024, 7, 29, 8, 0, 0),
+            start_lat_lng=(37.7749, -122.4194),
+            end_lat_lng=(37.8049, -122.4210),
+            distance=5.0,
+            steps=8000,
+            calories_burned=400,
+        )]
 
         self.assertEqual(get_user_workouts("user1"), expected_result)
 
@@ -519,59 +1056,86 @@ class TestGetUserWorkout(unittest.TestCase):
 
         self.assertEqual(len(get_user_workouts("user1")), 2)
 
+    @patch("google.cloud.bigquery.Client")
+    def test_get_user_workouts_incremental(self, mock_bigquery_client):
+        """Tests that the second incremental fetch is a delta query after the watermark."""
+        from data_fetcher import sync_user_workouts
+        mock_client_instance = mock_bigquery_client.return_value
+        start = datetime.datetime(2024, 7, 29, 7, 0, 0, tzinfo=datetime.timezone.utc)
+        workout = lambda workout_id, start: MagicMock(
+            WorkoutId=workout_id, StartTimestamp=start, EndTimestamp=None, StartLocationLat=None,
+            StartLocationLong=None, EndLocationLat=None, EndLocationLong=None,
+            TotalDistance=5.0, TotalSteps=8000, CaloriesBurned=400)
+        mock_client_instance.query.return_value.result.return_value = [workout("workout1", start)]
+        sync_user_workouts("user1")
+
+        mock_client_instance.query.return_value.result.return_value = [workout("workout2", start + datetime.timedelta(days=1))]
+        mock_client_instance.query.reset_mock()
+        synced = sync_user_workouts("user1")
+
+        (delta_query, delta_config), (rollup_query, rollup_config) = [
+            (call[0][0], call[1]['job_config']) for call in mock_client_instance.query.call_args_list]
+        self.assertIn("StartTimestamp > @after_timestamp", delta_query)
+        self.assertEqual([param.value for param in delta_config.query_parameters], ["user1", start, "workout1"])
+        self.assertEqual([w.workout_id for w in synced], ["workout1", "workout2"])
+        # Only the new workout is added to the rollups
+        self.assertIn("MERGE", rollup_query)
+        [new_workouts] = rollup_config.query_parameters
+        self.assertEqual([row.struct_values['WorkoutId'] for row in new_workouts.values], ["workout2"])
+
+    @patch("google.cloud.bigquery.Client")
+    def test_get_user_workouts_limit(self, mock_bigquery_client):
+        """Tests that the most recent workouts are picked in the query."""
+        mock_client_instance = mock_bigquery_client.return_value
+        mock_client_instance.query.return_value.result.return_value = []
+
+        get_user_workouts("user1")
+        self.assertNotIn("LIMIT", mock_client_instance.query.call_args[0][0])
+
+        get_user_workouts("user1", limit=10)
+        query = mock_client_instance.query.call_args[0][0]
+        self.assertIn("ORDER BY StartTimestamp DESC, WorkoutId DESC", query)
+        self.assertIn("LIMIT 10", query)
+
 class TestGetUserProfile(unittest.TestCase):
 
     @patch("google.cloud.bigquery.Client")
     def test_get_user_profile_success(self, mock_bigquery_client):
         """Tests successful retrieval of user profile data with friends."""
 
-        mock_user_result = MagicMock()
-        mock_user_result.__iter__.return_value = iter([
-            {
-                'UserId': 'user1',
-                'Name': 'Remi',
-                'Username': 'remi_the_rems',
-                'DateOfBirth': datetime.date(1990, 1, 1),
-                'ImageUrl': 'https://upload.wikimedia.org/wikipedia/commons/c/c8/Puma_shoes.jpg'
-            }
-        ])
-
-        mock_friends_result = MagicMock()
-        mock_friends_result.__iter__.return_value = iter([
-            {'FriendId': 'user2'},
-            {'FriendId': 'user3'},
-            {'FriendId': 'user4'}
-        ])
-
-        mock_client = MagicMock()
-        mock_client.query.side_effect = [mock_user_result, mock_friends_result]
-        mock_bigquery_client.return_value = mock_client
+        mock_client = mock_bigquery_client.return_value
+        mock_client.query.return_value.result.return_value = [MagicMock(
+            full_name='Remi',
+            username='remi_the_rems',
+            date_of_birth=datetime.date(1990, 1, 1),
+            profile_image='https://upload.wikimedia.org/wikipedia/commons/c/c8/Puma_shoes.jpg',
+            friends=['user2', 'user3', 'user4'],
+        )]
 
         from data_fetcher import get_user_profile
+        from records import UserProfile
         result = get_user_profile("user1")
 
-        self.assertEqual(result["full_name"], "Remi")
+        self.assertIsInstance(result, UserProfile)
+        self.assertEqual(result.full_name, "Remi")
         self.assertEqual(result["username"], "remi_the_rems")
-        self.assertEqual(result["date_of_birth"], "1990-01-01")
-        self.assertEqual(result["profile_image"], "https://upload.wikimedia.org/wikipedia/commons/c/c8/Puma_shoes.jpg")
-        self.assertEqual(result["friends"], ["user2", "user3", "user4"])
+        self.assertEqual(result.date_of_birth, datetime.date(1990, 1, 1))
+        self.assertEqual(result.profile_image, "https://upload.wikimedia.org/wikipedia/commons/c/c8/Puma_shoes.jpg")
+        self.assertEqual(result.friends, ("user2", "user3", "user4"))
+        query = mock_client.query.call_args[0][0]
+        self.assertIn("FROM `keishlyanysanabriatechx25.bytemeproject.Users`", query)
+        self.assertIn("`keishlyanysanabriatechx25.bytemeproject.Friends`", query)
+        parameters = mock_client.query.call_args[1]['job_config'].query_parameters
+        self.assertEqual(parameters[0].value, "user1")
 
     @patch("google.cloud.bigquery.Client")
     def test_get_user_profile_not_found(self, mock_bigquery_client):
-        """Tests error handling when user is not found in database."""
+        """Tests that a user who isn't in the database has no profile."""
 
-        mock_user_result = MagicMock()
-        mock_user_result.__iter__.return_value = iter([])  # No user found
-
-        mock_client = MagicMock()
-        mock_client.query.side_effect = [mock_user_result]
-        mock_bigquery_client.return_value = mock_client
+        mock_bigquery_client.return_value.query.return_value.result.return_value = []  # No user found
 
         from data_fetcher import get_user_profile
-        with self.assertRaises(ValueError) as context:
-            get_user_profile("nonexistent_user")
-
-        self.assertIn("User nonexistent_user not found", str(context.exception))
+        self.assertIsNone(get_user_profile("nonexistent_user"))
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,128 @@
+#############################################################################
+# downsampling.py
+#
+# This file contains the functions that shrink long sensor time series to a
+# fixed number of points before they are plotted.
+#
+# A workout can have hundreds of thousands of readings, but a chart is only
+# a few hundred pixels wide. Both methods keep the peaks of the series so the
+# reduced plot looks like the full one:
+#   - lttb: Largest-Triangle-Three-Buckets, which keeps the point in each
+#     bucket that best preserves the shape of the line.
+#   - min_max: the lowest and highest reading in each bucket.
+#############################################################################
+
+import numpy as np
+
+METHODS = ('lttb', 'min_max')
+
+
+def lttb(x, y, max_points):
+    """Picks the points of a series to keep with Largest-Triangle-Three-Buckets.
+
+    Args:
+        x (array-like): The x values, sorted in increasing order.
+        y (array-like): The y values.
+        max_points (int): How many points to keep.
+
+    Returns:
+        numpy.ndarray: The sorted indices of the kept points. The first and
+            last points are always kept.
+    """
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    n = len(x)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+
+    # Split every point except the first and last into max_points - 2 buckets
+    edges = np.linspace(1, n - 1, max_points - 1).astype(np.intp)
+    counts = np.diff(edges)
+    average_x = np.add.reduceat(x[:n - 1], edges[:-1]) / counts
+    average_y = np.add.reduceat(y[:n - 1], edges[:-1]) / counts
+    # Each bucket is compared against the average of the bucket after it
+    next_x = np.append(average_x[1:], x[-1])
+    next_y = np.append(average_y[1:], y[-1])
+
+    kept = np.empty(max_points, dtype=np.intp)
+    kept[0], kept[-1] = 0, n - 1
+    previous = 0
+    for bucket in range(max_points - 2):
+        start, end = edges[bucket], edges[bucket + 1]
+        areas = np.abs(
+            (x[previous] - next_x[bucket]) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y[bucket] - y[previous])
+        )
+        previous = start + int(np.argmax(areas))
+        kept[bucket + 1] = previous
+    return kept
+
+
+def min_max(y, max_points):
+    """Picks the lowest and highest point of each bucket of a series.
+
+    Args:
+        y (array-like): The y values, in x order.
+        max_points (int): The most points to keep.
+
+    Returns:
+        numpy.ndarray: The sorted indices of the kept points. The first and
+            last points are always kept.
+    """
+    y = np.asarray(y, dtype=float)
+    n = len(y)
+    buckets = (max_points - 2) // 2
+    if max_points >= n or buckets < 1:
+        return np.arange(n)
+
+    bucket_of = np.arange(n) * buckets // n
+    # Sort by bucket, then by value, so each bucket's min comes first and its
+    # max comes last
+    order = np.lexsort((y, bucket_of))
+    starts = np.flatnonzero(np.r_[True, bucket_of[1:] != bucket_of[:-1]])
+    ends = np.r_[starts[1:], n] - 1
+    return np.unique(np.concatenate(([0, n - 1], order[starts], order[ends])))
+
+
+def _as_float(values):
+    # Turn a numeric or datetime column into floats for the area calculations
+    if values.dtype.kind == 'M':
+        values = values.astype('int64')
+    return values.to_numpy(dtype=float)
+
+
+def downsample(frame, max_points=1000, method='lttb', x='Timestamp', y='SensorValue', by='SensorId'):
+    """Reduces each series in a DataFrame to at most max_points rows.
+
+    Args:
+        frame (pandas.DataFrame): The readings.
+        max_points (int): The most rows kept for each series.
+        method (str): 'lttb' or 'min_max'.
+        x (str): The column the series is ordered by.
+        y (str): The column holding the values.
+        by (str, optional): The column identifying each series, such as the
+            sensor. The whole frame is one series when None.
+
+    Returns:
+        pandas.DataFrame: The kept rows of every series, sorted by x within
+            each series. Rows with a missing x or y are dropped.
+    """
+    import pandas as pd
+
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {METHODS}, got {method!r}")
+
+    frame = frame.dropna(subset=[x, y])
+    groups = [frame] if by is None else [group for _, group in frame.groupby(by, sort=False)]
+    pieces = []
+    for group in groups:
+        group = group.sort_values(x, kind='stable')
+        values = _as_float(group[y])
+        if method == 'lttb':
+            kept = lttb(_as_float(group[x]), values, max_points)
+        else:
+            kept = min_max(values, max_points)
+        pieces.append(group.iloc[kept])
+    if not pieces:
+        return frame
+    return pd.concat(pieces, ignore_index=True)
@@ -0,0 +1,85 @@
+#############################################################################
+# downsampling_test.py
+#
+# This file contains tests for downsampling.py.
+#
+# You will write these tests in Unit 3.
+#############################################################################
+import unittest
+
+import numpy as np
+import pandas as pd
+
+from downsampling import downsample, lttb, min_max
+
+
+class TestLttb(unittest.TestCase):
+    """Tests the lttb function."""
+
+    def test_keeps_ends_and_peak(self):
+        """Tests that the first, last and highest points survive."""
+        x = np.arange(10000)
+        y = np.sin(x / 500)
+        y[4321] = 50
+        kept = lttb(x, y, 100)
+
+        self.assertEqual(len(kept), 100)
+        self.assertEqual(kept[0], 0)
+        self.assertEqual(kept[-1], 9999)
+        self.assertIn(4321, kept)
+        self.assertTrue(np.all(np.diff(kept) > 0))
+
+    def test_short_series_is_unchanged(self):
+        """Tests that series with fewer points than asked for are kept whole."""
+        np.testing.assert_array_equal(lttb([1, 2, 3], [4, 5, 6], 10), [0, 1, 2])
+
+
+class TestMinMax(unittest.TestCase):
+    """Tests the min_max function."""
+
+    def test_keeps_extremes(self):
+        """Tests that the lowest and highest points survive and the size is bounded."""
+        y = np.random.default_rng(0).normal(size=50000)
+        y[123] = 100
+        y[45678] = -100
+        kept = min_max(y, 200)
+
+        self.assertLessEqual(len(kept), 200)
+        self.assertIn(123, kept)
+        self.assertIn(45678, kept)
+        self.assertEqual(kept[0], 0)
+        self.assertEqual(kept[-1], 49999)
+
+
+class TestDownsample(unittest.TestCase):
+    """Tests the downsample function."""
+
+    def setUp(self):
+        timestamps = pd.date_range('2025-03-01 08:00', periods=5000, freq='s', tz='UTC')
+        self.frame = pd.concat([
+            pd.DataFrame({'SensorId': 'heart_rate', 'Timestamp': timestamps, 'SensorValue': np.linspace(60, 180, 5000)}),
+            pd.DataFrame({'SensorId': 'steps', 'Timestamp': timestamps, 'SensorValue': np.arange(5000.0)}),
+        ]).sample(frac=1, random_state=0)
+
+    def test_each_sensor_is_bounded(self):
+        """Tests that every sensor is reduced on its own and sorted by time."""
+        for method in ('lttb', 'min_max'):
+            reduced = downsample(self.frame, max_points=100, method=method)
+            for _, sensor in reduced.groupby('SensorId'):
+                self.assertLessEqual(len(sensor), 100)
+                self.assertTrue(sensor['Timestamp'].is_monotonic_increasing)
+            self.assertEqual(set(reduced['SensorId']), {'heart_rate', 'steps'})
+
+    def test_missing_values_are_dropped(self):
+        """Tests that rows without a value are not plotted."""
+        frame = pd.DataFrame({'SensorId': ['a', 'a', 'a'], 'Timestamp': [1, 2, 3], 'SensorValue': [1.0, None, 3.0]})
+        self.assertEqual(downsample(frame)['SensorValue'].tolist(), [1.0, 3.0])
+
+    def test_unknown_method(self):
+        """Tests that an unknown method is rejected."""
+        with self.assertRaises(ValueError):
+            downsample(self.frame, method='mean')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+#############################################################################
+# image_validation.py
+#
+# This file contains the shared service that checks whether post image URLs
+# point to real images before they are displayed.
+#
+# All checks go through one pooled requests.Session, results are cached per
+# URL, and validate_images checks a whole feed's images concurrently.
+#############################################################################
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from cache import ResultCache
+
+# How long (in seconds) a URL's result is reused. Broken images are checked
+# again sooner in case the host was only briefly down.
+VALID_IMAGE_TTL = 60 * 60
+INVALID_IMAGE_TTL = 5 * 60
+
+# Seconds to wait for an image host to respond
+REQUEST_TIMEOUT = 5
+
+# The most URLs checked at the same time by validate_images
+MAX_WORKERS = 16
+
+image_cache = ResultCache(max_size=1024)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session():
+    """Returns the requests.Session shared by all image checks, whose
+    connection pool is big enough for MAX_WORKERS concurrent requests."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=MAX_WORKERS, pool_maxsize=MAX_WORKERS)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            _session = session
+        return _session
+
+
+def _check_image(url):
+    # Ask for the headers only. Some hosts don't allow HEAD, so fall back to
+    # a streamed GET whose body is never downloaded.
+    session = get_session()
+    response = session.head(url, timeout=REQUEST_TIMEOUT, allow_redirects=True)
+    if response.status_code in (403, 405, 501):
+        with session.get(url, stream=True, timeout=REQUEST_TIMEOUT) as response:
+            return response.status_code == 200 and 'image' in response.headers.get('Content-Type', '')
+    return response.status_code == 200 and 'image' in response.headers.get('Content-Type', '')
+
+
+def is_valid_image(url):
+    """Checks if a given URL is a valid image.
+
+    Args:
+        url (str): The image URL.
+
+    Returns:
+        bool: True if the URL answers with status 200 and an image content
+            type. Results are cached for VALID_IMAGE_TTL/INVALID_IMAGE_TTL.
+    """
+    if not url:
+        return False
+    key = ('is_valid_image', url)
+    found, valid = image_cache.get(key)
+    if found:
+        return valid
+    try:
+        valid = _check_image(url)
+    except requests.RequestException:
+        valid = False
+    image_cache.set(key, valid, VALID_IMAGE_TTL if valid else INVALID_IMAGE_TTL)
+    return valid
+
+
+def validate_images(urls):
+    """Checks many image URLs at once, for example every image in a feed.
+
+    Args:
+        urls (iterable): Image URLs. Empty values and repeats are skipped.
+
+    Returns:
+        dict: Each distinct URL mapped to is_valid_image(url).
+    """
+    urls = [url for url in dict.fromkeys(urls) if url]
+    if not urls:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(urls))) as pool:
+        return dict(zip(urls, pool.map(is_valid_image, urls)))
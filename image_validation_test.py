@@ -0,0 +1,99 @@
+#############################################################################
+# image_validation_test.py
+#
+# This file contains tests for image_validation.py.
+#############################################################################
+
+import threading
+import time
+import unittest
+from unittest.mock import MagicMock, patch
+
+import requests
+
+from image_validation import is_valid_image, validate_images
+
+
+def response(status_code=200, content_type='image/png'):
+    mock_response = MagicMock()
+    mock_response.status_code = status_code
+    mock_response.headers = {'Content-Type': content_type}
+    mock_response.__enter__.return_value = mock_response
+    return mock_response
+
+
+class TestIsValidImage(unittest.TestCase):
+
+    def setUp(self):
+        self.session = MagicMock()
+        self.patcher = patch('image_validation.get_session', return_value=self.session)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+
+    def test_valid_image_uses_head(self):
+        """Tests that a HEAD request with an image content type is valid."""
+        self.session.head.return_value = response()
+        self.assertTrue(is_valid_image("https://example.com/post.png"))
+        self.session.head.assert_called_once_with("https://example.com/post.png", timeout=5, allow_redirects=True)
+        self.session.get.assert_not_called()
+
+    def test_not_an_image(self):
+        """Tests that a page that isn't an image is invalid."""
+        self.session.head.return_value = response(content_type='text/html')
+        self.assertFalse(is_valid_image("https://example.com/page"))
+
+    def test_falls_back_to_get(self):
+        """Tests hosts that reject HEAD requests."""
+        self.session.head.return_value = response(status_code=405)
+        self.session.get.return_value = response()
+        self.assertTrue(is_valid_image("https://example.com/post.png"))
+        self.session.get.assert_called_once_with("https://example.com/post.png", stream=True, timeout=5)
+
+    def test_request_error(self):
+        """Tests that unreachable hosts are invalid."""
+        self.session.head.side_effect = requests.RequestException("Error")
+        self.assertFalse(is_valid_image("https://example.com/post.png"))
+
+    def test_results_are_cached(self):
+        """Tests that valid and invalid results are both reused."""
+        self.session.head.side_effect = [response(), requests.RequestException("Error")]
+        self.assertTrue(is_valid_image("https://example.com/good.png"))
+        self.assertFalse(is_valid_image("https://example.com/bad.png"))
+        self.assertTrue(is_valid_image("https://example.com/good.png"))
+        self.assertFalse(is_valid_image("https://example.com/bad.png"))
+        self.assertEqual(self.session.head.call_count, 2)
+
+    def test_empty_url(self):
+        """Tests that no URL means no request."""
+        self.assertFalse(is_valid_image(None))
+        self.session.head.assert_not_called()
+
+    def test_validate_images_runs_concurrently(self):
+        """Tests that a feed's images are checked in parallel."""
+        active = []
+        peak = []
+        lock = threading.Lock()
+
+        def slow_head(url, **kwargs):
+            with lock:
+                active.append(url)
+                peak.append(len(active))
+            time.sleep(0.05)
+            with lock:
+                active.remove(url)
+            return response()
+
+        self.session.head.side_effect = slow_head
+        urls = [f"https://example.com/{i}.png" for i in range(8)]
+
+        result = validate_images(urls + [urls[0], '', None])
+
+        self.assertEqual(result, {url: True for url in urls})
+        self.assertEqual(self.session.head.call_count, 8)
+        self.assertGreater(max(peak), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,249 @@
+#############################################################################
+# instrumentation.py
+#
+# This file contains the instrumentation that records how long each data
+# fetch and Vertex AI call takes.
+#
+# Every call of an @instrumented function (and every `measure` block) adds a
+# record with its wall time, the rows it returned and, for BigQuery, the
+# bytes processed, whether BigQuery answered from its own query cache and
+# the slot-milliseconds used. The last WINDOW records of each operation are
+# kept, and summary() turns them into rolling percentiles that can be
+# exported as JSON or in the Prometheus text format.
+#############################################################################
+
+import contextlib
+import functools
+import json
+import math
+import threading
+import time
+from collections import deque
+
+# How many of the most recent calls of each operation are kept
+WINDOW = 500
+
+# The percentiles reported by summary()
+QUANTILES = (0.5, 0.9, 0.99)
+
+# The prefix of the exported Prometheus metric names
+METRIC_PREFIX = 'fitness_app'
+
+
+class Recorder:
+    """Keeps the most recent call records of each operation."""
+
+    def __init__(self, window=WINDOW):
+        self.window = window
+        self._records = {}  # operation -> deque of records
+        self._lock = threading.Lock()
+
+    def add(self, record):
+        """Stores a record (a dict with at least 'operation' and 'seconds')."""
+        with self._lock:
+            records = self._records.get(record['operation'])
+            if records is None:
+                records = self._records[record['operation']] = deque(maxlen=self.window)
+            records.append(record)
+
+    def records(self, operation=None):
+        """Returns the kept records, oldest first, of one operation or all."""
+        with self._lock:
+            if operation is not None:
+                return list(self._records.get(operation, ()))
+            return [record for records in self._records.values() for record in records]
+
+    def clear(self):
+        with self._lock:
+            self._records.clear()
+
+    def summary(self):
+        """Summarizes the kept records of each operation.
+
+        Returns:
+            dict: For each operation, 'count', 'errors', the wall time
+                percentiles 'p50', 'p90', 'p99' and 'max' (in seconds),
+                'rows' (total), and for BigQuery queries 'bytes_processed' and
+                'slot_ms' (totals) and 'cache_hits' (queries BigQuery answered
+                from its cache).
+        """
+        with self._lock:
+            groups = {operation: list(records) for operation, records in self._records.items()}
+        summary = {}
+        for operation, records in sorted(groups.items()):
+            seconds = sorted(record['seconds'] for record in records)
+            entry = {
+                'count': len(records),
+                'errors': sum(1 for record in records if record.get('error')),
+            }
+            for quantile in QUANTILES:
+                entry[f'p{round(quantile * 100)}'] = _percentile(seconds, quantile)
+            entry['max'] = seconds[-1]
+            entry['rows'] = sum(record.get('rows') or 0 for record in records)
+            entry['bytes_processed'] = sum(record.get('bytes_processed') or 0 for record in records)
+            entry['slot_ms'] = sum(record.get('slot_ms') or 0 for record in records)
+            entry['cache_hits'] = sum(1 for record in records if record.get('cache_hit'))
+            summary[operation] = entry
+        return summary
+
+
+def _percentile(sorted_values, quantile):
+    # The nearest-rank percentile of an already sorted list
+    index = max(0, math.ceil(quantile * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+# The recorder shared by every session
+recorder = Recorder()
+
+# The records of the calls running on the current thread, innermost last
+_active = threading.local()
+
+
+def _stack():
+    stack = getattr(_active, 'stack', None)
+    if stack is None:
+        stack = _active.stack = []
+    return stack
+
+
+def _count_rows(result):
+    # How many rows a fetcher returned: the posts of a posts page, one for a
+    # profile or advice dict, and len() for lists, DataFrames and Tables
+    if result is None:
+        return 0
+    if isinstance(result, dict):
+        return len(result['posts']) if 'posts' in result else int(bool(result))
+    try:
+        return len(result)
+    except TypeError:
+        return None
+
+
+def _job_statistics(job):
+    # Read the statistics of a finished BigQuery query job. Anything that
+    # isn't a number (for example on a fake job in tests) is left out.
+    statistics = {}
+    for key, attribute, types in (('bytes_processed', 'total_bytes_processed', int),
+                                  ('slot_ms', 'slot_millis', int),
+                                  ('cache_hit', 'cache_hit', bool)):
+        value = getattr(job, attribute, None)
+        if isinstance(value, types):
+            statistics[key] = value
+    return statistics
+
+
+@contextlib.contextmanager
+def measure(operation):
+    """Records the wall time of the block as a call of `operation`.
+
+    Yields:
+        dict: The record, which the block can add to (for example 'rows').
+    """
+    record = {'operation': operation, 'started': time.time(), 'jobs': []}
+    stack = _stack()
+    stack.append(record)
+    start = time.perf_counter()
+    try:
+        yield record
+    except Exception as e:
+        record['error'] = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        record['seconds'] = time.perf_counter() - start
+        stack.pop()
+        statistics = [_job_statistics(job) for job in record.pop('jobs')]
+        for key in ('bytes_processed', 'slot_ms'):
+            values = [job[key] for job in statistics if key in job]
+            if values:
+                record[key] = sum(values)
+        hits = [job['cache_hit'] for job in statistics if 'cache_hit' in job]
+        if hits:
+            record['cache_hit'] = all(hits)
+        recorder.add(record)
+
+
+def instrumented(func):
+    """Records every call of a function with `measure`, under its name, along
+    with how many rows it returned."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with measure(func.__name__) as record:
+            result = func(*args, **kwargs)
+            record['rows'] = _count_rows(result)
+            return result
+    return wrapper
+
+
+def record_query(job):
+    """Attaches a BigQuery query job to the call running on this thread. Its
+    statistics are read when the call finishes, once the job is done."""
+    stack = _stack()
+    if stack:
+        stack[-1]['jobs'].append(job)
+
+
+def record_error(error):
+    """Marks the call running on this thread as failed, for fetchers that
+    catch their errors and return None."""
+    stack = _stack()
+    if stack:
+        stack[-1]['error'] = f"{type(error).__name__}: {error}"
+
+
+def record_call(operation, started, error=None, **fields):
+    """Records a call of `operation` that started at perf_counter() time
+    `started` and ends now, for calls that can't be timed with a `measure`
+    block, such as a stream that is consumed after its function returned.
+
+    Args:
+        operation (str): The operation's name.
+        started (float): time.perf_counter() when the call started.
+        error (Exception, optional): The error the call failed with.
+        **fields: Anything else to add to the record.
+    """
+    seconds = time.perf_counter() - started
+    record = dict(fields, operation=operation, started=time.time() - seconds, seconds=seconds)
+    if error is not None:
+        record['error'] = f"{type(error).__name__}: {error}"
+    recorder.add(record)
+
+
+def summary():
+    """Returns recorder.summary()."""
+    return recorder.summary()
+
+
+def to_json():
+    """Returns the summary as a JSON string."""
+    return json.dumps(summary(), indent=2, sort_keys=True)
+
+
+def to_prometheus():
+    """Returns the summary in the Prometheus text exposition format.
+
+    Wall times are a summary metric with a quantile label. The other numbers
+    are gauges over the same rolling window.
+    """
+    name = f'{METRIC_PREFIX}_call_seconds'
+    lines = [
+        f'# HELP {name} Wall time of the last {recorder.window} calls of each operation.',
+        f'# TYPE {name} summary',
+    ]
+    data = summary()
+    for operation, entry in data.items():
+        label = f'operation="{operation}"'
+        for quantile in QUANTILES:
+            lines.append(f'{name}{{{label},quantile="{quantile}"}} {entry[f"p{round(quantile * 100)}"]}')
+        lines.append(f'{name}_count{{{label}}} {entry["count"]}')
+    for key, help_text in (('errors', 'Failed calls'),
+                           ('rows', 'Rows returned'),
+                           ('bytes_processed', 'BigQuery bytes processed'),
+                           ('slot_ms', 'BigQuery slot milliseconds'),
+                           ('cache_hits', 'Queries answered from the BigQuery cache')):
+        metric = f'{METRIC_PREFIX}_{key}'
+        lines.append(f'# HELP {metric} {help_text} in the last {recorder.window} calls of each operation.')
+        lines.append(f'# TYPE {metric} gauge')
+        for operation, entry in data.items():
+            lines.append(f'{metric}{{operation="{operation}"}} {entry[key]}')
+    return '\n'.join(lines) + '\n'
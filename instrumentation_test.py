@@ -0,0 +1,117 @@
+#############################################################################
+# instrumentation_test.py
+#
+# This file contains tests for instrumentation.py.
+#############################################################################
+
+import unittest
+from unittest.mock import MagicMock, patch
+
+import instrumentation
+from instrumentation import Recorder, instrumented, measure, record_error, record_query, recorder
+
+
+class TestRecorder(unittest.TestCase):
+
+    def test_percentiles_over_window(self):
+        """Tests that only the last `window` calls are summarized."""
+        rolling = Recorder(window=100)
+        for millisecond in range(1, 201):
+            rolling.add({'operation': 'fetch', 'seconds': millisecond / 1000, 'rows': 1})
+        entry = rolling.summary()['fetch']
+        self.assertEqual(entry['count'], 100)
+        self.assertEqual(entry['p50'], 0.150)
+        self.assertEqual(entry['p90'], 0.190)
+        self.assertEqual(entry['p99'], 0.199)
+        self.assertEqual(entry['max'], 0.200)
+        self.assertEqual(entry['rows'], 100)
+
+
+class TestMeasure(unittest.TestCase):
+
+    def setUp(self):
+        recorder.clear()
+
+    def tearDown(self):
+        recorder.clear()
+
+    def test_job_statistics(self):
+        """Tests that BigQuery job statistics are added to the innermost call."""
+        job = MagicMock(total_bytes_processed=2048, slot_millis=30, cache_hit=False)
+
+        @instrumented
+        def fetch():
+            record_query(job)
+            return [1, 2, 3]
+
+        with measure('page'):
+            fetch()
+
+        record = recorder.records('fetch')[0]
+        self.assertEqual(record['rows'], 3)
+        self.assertEqual(record['bytes_processed'], 2048)
+        self.assertEqual(record['slot_ms'], 30)
+        self.assertFalse(record['cache_hit'])
+        self.assertNotIn('bytes_processed', recorder.records('page')[0])
+        self.assertGreaterEqual(recorder.records('page')[0]['seconds'], record['seconds'])
+
+    def test_errors(self):
+        """Tests that raised and caught errors are both recorded."""
+        @instrumented
+        def failing():
+            raise ValueError("bad query")
+
+        @instrumented
+        def caught():
+            record_error(ValueError("timeout"))
+            return None
+
+        with self.assertRaises(ValueError):
+            failing()
+        caught()
+
+        self.assertEqual(recorder.records('failing')[0]['error'], 'ValueError: bad query')
+        self.assertEqual(recorder.records('caught')[0]['rows'], 0)
+        self.assertEqual(recorder.summary()['caught']['errors'], 1)
+
+    @patch('data_fetcher.bigquery.Client')
+    def test_fetchers_are_instrumented(self, mock_client_class):
+        """Tests that a data fetcher records its BigQuery job statistics."""
+        from data_fetcher import get_user_posts
+        job = mock_client_class.return_value.query.return_value
+        job.__iter__.return_value = iter([])
+        job.total_bytes_processed = 10_000_000
+        job.slot_millis = 12
+        job.cache_hit = True
+
+        get_user_posts('user1')
+
+        entry = instrumentation.summary()['get_user_posts']
+        self.assertEqual(entry['count'], 1)
+        self.assertEqual(entry['bytes_processed'], 10_000_000)
+        self.assertEqual(entry['cache_hits'], 1)
+
+
+class TestExport(unittest.TestCase):
+
+    def setUp(self):
+        recorder.clear()
+        recorder.add({'operation': 'get_user_workouts', 'seconds': 0.25, 'rows': 10, 'bytes_processed': 500})
+
+    def tearDown(self):
+        recorder.clear()
+
+    def test_json(self):
+        import json
+        self.assertEqual(json.loads(instrumentation.to_json())['get_user_workouts']['p50'], 0.25)
+
+    def test_prometheus(self):
+        text = instrumentation.to_prometheus()
+        self.assertIn('# TYPE fitness_app_call_seconds summary', text)
+        self.assertIn('fitness_app_call_seconds{operation="get_user_workouts",quantile="0.99"} 0.25', text)
+        self.assertIn('fitness_app_call_seconds_count{operation="get_user_workouts"} 1', text)
+        self.assertIn('fitness_app_bytes_processed{operation="get_user_workouts"} 500', text)
+
+
+if __name__ == "__main__":
+    unittest.main()
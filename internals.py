@@ -6,8 +6,22 @@
 #
 #############################################################################
 
+import os
+import re
+import threading
+
 import streamlit.components.v1 as components
 
+# Matches a template placeholder such as {{NAME}}
+_PLACEHOLDER = re.compile(r'\{\{(.*?)\}\}')
+
+# Characters escaped by safe_string, and what they are replaced with
+_ESCAPES = str.maketrans({"'": "\\'", '"': '\\"', '\\': '\\\\'})
+
+# Compiled templates by file path: (modification time, template)
+_templates = {}
+_templates_lock = threading.Lock()
+
 
 def load_html_file(file_path):
     # Read an html file
@@ -17,18 +31,48 @@ def load_html_file(file_path):
 
 def safe_string(string):
     # Make the string "safe" by escaping quotes and a backslash character
-    return ''.join(['\\' + c if c in ["'", '"', '\\'] else c for c in string])
+    return string.translate(_ESCAPES)
+
+
+def compile_template(html):
+    # Split the html into its literal chunks and the placeholder names between
+    # them, so rendering is a single join. There is always one more literal
+    # than there are names.
+    pieces = _PLACEHOLDER.split(html)
+    return pieces[0::2], pieces[1::2]
+
+
+def load_template(file_path):
+    # Return the compiled template for a file, only reading the file again
+    # when it has been modified since it was last compiled
+    modified = os.stat(file_path).st_mtime_ns
+    entry = _templates.get(file_path)
+    if entry is not None and entry[0] == modified:
+        return entry[1]
+    template = compile_template(load_html_file(file_path))
+    with _templates_lock:
+        _templates[file_path] = (modified, template)
+    return template
+
+
+def render_template(template, data):
+    # Fill in the placeholders in one pass. Placeholders without data are
+    # left as they are.
+    literals, names = template
+    values = {str(key): safe_string(str(value)) for key, value in data.items()}
+    parts = [literals[0]]
+    for name, literal in zip(names, literals[1:]):
+        parts.append(values.get(name, '{{' + name + '}}'))
+        parts.append(literal)
+    return ''.join(parts)
 
 
 def create_component(data, component_name, height=None, width=None, scrolling=False):
-    # Read the HTML content from the file
-    component_html = load_html_file(f'custom_components/{component_name}.html')
+    # Get the compiled HTML template for the component
+    template = load_template(f'custom_components/{component_name}.html')
 
     # Replace the templates with the specified data
-    for key in data:
-        data_placeholder = "{{" + str(key) + "}}"
-        component_html = component_html.replace(
-            data_placeholder, safe_string(str(data[key])))
+    component_html = render_template(template, data)
 
     # Have streamlit render the component
     components.html(component_html, width, height, scrolling)
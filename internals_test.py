@@ -0,0 +1,76 @@
+#############################################################################
+# internals_test.py
+#
+# This file contains tests for internals.py.
+#############################################################################
+
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import internals
+from internals import compile_template, create_component, load_template, render_template, safe_string
+
+
+class TestSafeString(unittest.TestCase):
+
+    def test_escapes_quotes_and_backslashes(self):
+        """Tests that quotes and backslashes get a backslash in front."""
+        self.assertEqual(safe_string('He said "it\'s" C:\\run'), 'He said \\"it\\\'s\\" C:\\\\run')
+
+    def test_leaves_other_text(self):
+        """Tests that other characters are untouched."""
+        self.assertEqual(safe_string('<b>Remi</b> ran 5km'), '<b>Remi</b> ran 5km')
+
+
+class TestTemplates(unittest.TestCase):
+
+    def test_render_fills_placeholders(self):
+        """Tests that every placeholder is replaced by its escaped value."""
+        template = compile_template('<p>{{NAME}} ran {{DISTANCE}}km, go {{NAME}}!</p>')
+        self.assertEqual(render_template(template, {'NAME': 'Remi "R"', 'DISTANCE': 5}),
+                         '<p>Remi \\"R\\" ran 5km, go Remi \\"R\\"!</p>')
+
+    def test_render_is_single_pass(self):
+        """Tests that values containing placeholders are not expanded again."""
+        template = compile_template('{{A}} {{B}}')
+        self.assertEqual(render_template(template, {'A': '{{B}}', 'B': 'b'}), '{{B}} b')
+
+    def test_missing_data_keeps_placeholder(self):
+        """Tests that placeholders without data are left as they were."""
+        template = compile_template('Hi {{NAME}}, {{OTHER}}')
+        self.assertEqual(render_template(template, {'NAME': 'Remi'}), 'Hi Remi, {{OTHER}}')
+
+    def test_template_is_cached_until_modified(self):
+        """Tests that the file is read once and again only after it changes."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'component.html')
+            with open(path, 'w') as file:
+                file.write('<p>{{NAME}}</p>')
+
+            with patch('internals.load_html_file', wraps=internals.load_html_file) as mock_load:
+                first = load_template(path)
+                second = load_template(path)
+                self.assertIs(first, second)
+                self.assertEqual(mock_load.call_count, 1)
+
+                with open(path, 'w') as file:
+                    file.write('<h1>{{NAME}}</h1>')
+                stat = os.stat(path)
+                os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+                self.assertEqual(render_template(load_template(path), {'NAME': 'Remi'}), '<h1>Remi</h1>')
+                self.assertEqual(mock_load.call_count, 2)
+
+    @patch('internals.components.html')
+    def test_create_component(self, mock_html):
+        """Tests that the example component is rendered with its data."""
+        create_component({'NAME': 'Remi'}, 'my_custom_component')
+
+        rendered = mock_html.call_args[0][0]
+        self.assertIn('<p>Your name is: Remi</p>', rendered)
+
+
+if __name__ == "__main__":
+    unittest.main()
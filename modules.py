@@ -9,14 +9,27 @@
 
 import streamlit as st
 from internals import create_component
-import streamlit as st
-import pandas as pd
-import matplotlib.pyplot as plt
+
+# pandas and matplotlib are slow to import, so the display functions that
+# need them import them when they are first called
 
 # Import for display_post
 import requests
 import base64
+import collections
+import datetime
+import functools
+import hashlib
+import html
+import json
+import threading
+from image_validation import is_valid_image, validate_images
 from data_fetcher import get_user_posts, get_genai_advice, get_user_profile, get_user_sensor_data, get_user_workouts
+from data_fetcher import get_user_posts_page
+from data_fetcher import cache_stats, WORKOUT_COLUMNS
+from downsampling import downsample
+from records import Record, Workout, SensorSample
+import instrumentation
 
 # This one has been written for you as an example. You may change it as wanted.
 def display_my_custom_component(value):
@@ -56,143 +69,356 @@ def display_post(username, user_image, timestamp, content, post_image=None):
         "user_image": user_image
     }
 
-    def is_valid_image(url):
-        """Checks if a given URL is a valid image."""
-        try:
-            print(f"Attempting to fetch: {url}") #added print statement
-            response = requests.get(url, stream=True, timeout=5)
-            print(f"Response status: {response.status_code}") #added print statement
-            content_type = response.headers.get('Content-Type', '')
-            print(f"Content type: {content_type}") #added print statement
-            return response.status_code == 200 and 'image' in content_type
-        except requests.RequestException as e:
-            print(f"Request exception: {e}") #added print statement
-            return False
-
-    # Check if post_image is provided and valid
+    # Check if post_image is provided and valid (see image_validation.py)
     if post['post_image'] and not is_valid_image(post['post_image']):
         # If invalid, just set to None and inform the user
         st.warning("Invalid image URL. Your post will be created without an image.")
         post['post_image'] = None
 
     # Custom CSS and HTML rendering
-    st.markdown(
-        """
-        <style>
-        .post-container {
-            border-radius: 10px;
-            overflow: hidden;
-            border: 1px solid #ddd;
-        }
-        .user-box {
-            background-color: #4285F4;
-            padding: 10px;
-        }
-        .user-row {
-            display: flex;
-            align-items: center;
-        }
-        .user-row img {
-            border-radius: 50%;
-            margin-right: 10px;
-            height: 50px;
-            width: 50px;
-            object-fit: cover;
-        }
-        .timestamp-row {
-            background-color: #FBBC05;
-            padding: 10px;
-            display: flex;
-            justify-content: center;
-            align-items: center;
-            height: 50px;
-        }
-        </style>
-        """,
-        unsafe_allow_html=True
+    st.markdown(POST_STYLE, unsafe_allow_html=True)
+    st.markdown(post_html(None, post['username'], post['user_image'], post['timestamp'], post['content'], post['post_image']),
+                unsafe_allow_html=True)
+
+
+# Stylesheet for posts. display_posts sends it once per feed.
+POST_STYLE = """
+<style>
+.post-container {
+    border-radius: 10px;
+    overflow: hidden;
+    border: 1px solid #ddd;
+    margin-bottom: 16px;
+}
+.user-box {
+    background-color: #4285F4;
+    padding: 10px;
+}
+.user-row {
+    display: flex;
+    align-items: center;
+}
+.user-row img {
+    border-radius: 50%;
+    margin-right: 10px;
+    height: 50px;
+    width: 50px;
+    object-fit: cover;
+}
+.timestamp-row {
+    background-color: #FBBC05;
+    padding: 10px;
+    display: flex;
+    justify-content: center;
+    align-items: center;
+    height: 50px;
+}
+</style>
+"""
+
+
+@functools.lru_cache(maxsize=1024)
+def post_html(post_id, username, user_image, timestamp, content, post_image=None):
+    """Returns the HTML for one post, with every value HTML-escaped.
+
+    Results are memoized, so a post that is shown again (on every rerun of the
+    feed) is not rebuilt. post_id is part of the key so that two identical
+    posts still get their own entry.
+
+    Args:
+        post_id (str): The post's ID, or None for posts that aren't saved yet.
+        username, user_image, timestamp, content (str): The post's details.
+            None is shown as an empty string.
+        post_image (str, optional): The post's image URL. No image tag is
+            added when it is empty.
+
+    Returns:
+        str: An HTML fragment without leading indentation, so markdown
+            doesn't turn it into a code block.
+    """
+    def escape(value):
+        return html.escape(str(value)) if value else ""
+
+    # Posts from get_user_posts carry a datetime. It is formatted here, once
+    # per post thanks to the memo, instead of for every fetched row.
+    if isinstance(timestamp, datetime.datetime):
+        timestamp = timestamp.strftime('%Y-%m-%d %H:%M:%S')
+
+    # Skip the image tag entirely when there is no post image
+    image_html = f'<img src="{escape(post_image)}" style="width: 100%; height: auto;">' if post_image else ''
+    return (
+        '<div class="post-container">'
+        '<div class="user-box">'
+        '<div class="user-row">'
+        f'<img src="{escape(user_image)}">'
+        f'<h3>{escape(username)}</h3>'
+        '</div>'
+        f'<p>{escape(content)}</p>'
+        '</div>'
+        f'{image_html}'
+        '<div class="timestamp-row">'
+        f'<p>Posted on: {escape(timestamp)}</p>'
+        '</div>'
+        '</div>'
     )
 
-    # Handle None values
-    username_display = post['username'] if post['username'] else ""
-    user_image_display = post['user_image'] if post['user_image'] else ""
-    content_display = post['content'] if post['content'] else ""
-    timestamp_display = post['timestamp'] if post['timestamp'] else ""
-
-    # Create HTML content based on whether post_image is available or not
-    if post['post_image']:
-        html_content = f"""
-        <div class="post-container">
-            <div class="user-box">
-                <div class="user-row">
-                    <img src="{user_image_display}">
-                    <h3>{username_display}</h3>
-                </div>
-                <p>{content_display}</p>
-            </div>
-            <img src="{post['post_image']}" style="width: 100%; height: auto;">
-            <div class="timestamp-row">
-                <p>Posted on: {timestamp_display}</p>
-            </div>
-        </div>
-        """
-    else:
-        # No image version - skip the image tag entirely
-        html_content = f"""
-        <div class="post-container">
-            <div class="user-box">
-                <div class="user-row">
-                    <img src="{user_image_display}">
-                    <h3>{username_display}</h3>
-                </div>
-                <p>{content_display}</p>
-            </div>
-            <div class="timestamp-row">
-                <p>Posted on: {timestamp_display}</p>
-            </div>
-        </div>
-        """
-    
-    st.markdown(html_content, unsafe_allow_html=True)
 
-def display_activity_summary(workouts_list):
-    # Convert the workouts data into a DataFrame for easy display
-    df = pd.DataFrame(workouts_list)
+def display_posts(posts):
+    """Displays a feed of posts as a single markdown element.
+
+    The stylesheet is sent once for the whole feed, every post image is
+    checked in one concurrent batch, and each post's HTML comes from the
+    post_html memo. Posts whose image is invalid are shown without it.
+
+    Args:
+        posts (list): Post records as returned by get_user_posts, or
+            dictionaries with the same keys ('post_id', 'username',
+            'user_image', 'timestamp', 'content' and 'image').
+    """
+    if not posts:
+        return
+
+    valid_images = validate_images(post.get('image') for post in posts)
+    fragments = [
+        post_html(post.get('post_id'), post.get('username'), post.get('user_image'), post.get('timestamp'),
+                  post.get('content'), post.get('image') if valid_images.get(post.get('image')) else None)
+        for post in posts
+    ]
+    st.markdown(POST_STYLE + '<div class="post-feed">' + ''.join(fragments) + '</div>', unsafe_allow_html=True)
+
+
+def _load_more_posts(user_id):
+    # Button callback: fetch the page after the last one shown
+    feed = st.session_state[f'post_feed_{user_id}']
+    page = get_user_posts_page(user_id, cursor=feed['next_cursor'])
+    feed['posts'] = feed['posts'] + page['posts']
+    feed['next_cursor'] = page['next_cursor']
+
+
+def display_post_feed(user_id, first_page):
+    """Displays a user's posts one page at a time with a "Load more" button.
+
+    Only the pages the viewer asked for are fetched and drawn. Pages loaded
+    after the first are kept in st.session_state, and are dropped if the
+    first page changes (for example because of a new post).
+
+    Args:
+        user_id (str): The ID of the user whose posts are shown.
+        first_page (dict): The result of get_user_posts_page(user_id).
+    """
+    feed = st.session_state.setdefault(f'post_feed_{user_id}', {'after': None, 'posts': [], 'next_cursor': None})
+    if feed['after'] != first_page['next_cursor']:
+        feed.update(after=first_page['next_cursor'], posts=[], next_cursor=first_page['next_cursor'])
+
+    display_posts(first_page['posts'] + feed['posts'])
+
+    if feed['next_cursor'] is not None:
+        st.button("Load more", key=f'load_more_posts_{user_id}', on_click=_load_more_posts, args=(user_id,))
+
+
+@functools.lru_cache(maxsize=128)
+def activity_chart_spec(values_json, x_field='start_timestamp', x_title='Start Time'):
+    """Returns the Vega-Lite spec for the activity summary chart.
+
+    Distance is drawn as bars and calories burned as a line on a second axis,
+    both against the workout start time. The chart can be zoomed and panned
+    in the browser. Specs are memoized on the chart data, so rerunning the
+    page with the same rollup doesn't rebuild the spec.
+
+    Args:
+        values_json (str): The workouts as a JSON list of records with
+            x_field, 'distance' and 'calories_burned'.
+        x_field (str): The time field, such as 'period_start' for rollups.
+        x_title (str): The title of the time axis.
+
+    Returns:
+        dict: A Vega-Lite spec with the data inlined.
+    """
+    x = {'field': x_field, 'type': 'temporal', 'title': x_title}
+    tooltip = [
+        {'field': x_field, 'type': 'temporal', 'title': x_title},
+        {'field': 'distance', 'type': 'quantitative', 'title': 'Distance (km)'},
+        {'field': 'calories_burned', 'type': 'quantitative', 'title': 'Calories'},
+    ]
+    return {
+        'title': 'Distance vs. Time',
+        'data': {'values': json.loads(values_json)},
+        'layer': [
+            {
+                'params': [{'name': 'zoom', 'select': 'interval', 'bind': 'scales'}],
+                'mark': {'type': 'bar', 'color': 'blue'},
+                'encoding': {
+                    'x': x,
+                    'y': {'field': 'distance', 'type': 'quantitative', 'title': 'Distance (km)'},
+                    'tooltip': tooltip,
+                },
+            },
+            {
+                'mark': {'type': 'line', 'color': 'red', 'point': {'color': 'red'}},
+                'encoding': {
+                    'x': x,
+                    'y': {'field': 'calories_burned', 'type': 'quantitative', 'title': 'Calories'},
+                    'tooltip': tooltip,
+                },
+            },
+        ],
+        'resolve': {'scale': {'y': 'independent'}},
+    }
+
+
+# The most activity summary specs kept by activity_summary_spec
+ACTIVITY_SPECS_MAX_SIZE = 128
+
+# Activity summary specs by workouts fingerprint, least recently used first
+_activity_specs = collections.OrderedDict()
+_activity_specs_lock = threading.Lock()
+
+
+def activity_summary_spec(df):
+    """Returns the Vega-Lite spec for a DataFrame of workouts.
+
+    Specs are memoized on a hash of the charted columns, computed by pandas
+    without serializing anything, so a rerun with the same workouts neither
+    rebuilds the spec nor serializes the workouts again, while any changed
+    value gets a new spec.
+
+    Args:
+        df (pandas.DataFrame): Workouts with the columns of Workout.to_frame.
+
+    Returns:
+        dict: A Vega-Lite spec with the data inlined.
+    """
+    import pandas as pd
+
+    charted = df[['start_timestamp', 'distance', 'calories_burned']]
+    fingerprint = hashlib.sha256(pd.util.hash_pandas_object(charted, index=False).to_numpy().tobytes()).hexdigest()
+    with _activity_specs_lock:
+        spec = _activity_specs.get(fingerprint)
+        if spec is not None:
+            _activity_specs.move_to_end(fingerprint)
+            return spec
+
+    values_json = charted.to_json(orient='records', date_format='iso')
+    spec = activity_chart_spec.__wrapped__(values_json)
+    with _activity_specs_lock:
+        _activity_specs[fingerprint] = spec
+        while len(_activity_specs) > ACTIVITY_SPECS_MAX_SIZE:
+            _activity_specs.popitem(last=False)
+    return spec
+
+
+def _to_frame(rows, record_type):
+    # Turn a fetcher's result into a DataFrame: DataFrames are used as they
+    # are, records are converted in bulk and dictionaries by pandas. No rows
+    # still give the record's columns.
+    import pandas as pd
+
+    if isinstance(rows, pd.DataFrame):
+        return rows
+    rows = list(rows)
+    if not rows or isinstance(rows[0], Record):
+        return record_type.to_frame(rows)
+    return pd.DataFrame(rows)
+
+
+def display_activity_summary(workouts_list, chart='vega-lite'):
+    # Convert the workouts data into a DataFrame for easy display. Workouts
+    # fetched with output='dataframe' are already one.
+    df = _to_frame(workouts_list, Workout)
 
     # Display a table with the workout summary
     st.subheader("Activity Summary")
     st.dataframe(df)
 
+    if chart == 'vega-lite':
+        # Let the browser draw the chart from a (memoized) Vega-Lite spec
+        st.vega_lite_chart(activity_summary_spec(df), use_container_width=True)
+        return
+
+    import matplotlib.pyplot as plt
+
     # Create a bar plot of the distance vs. calories burned
     #GEN AI citation: I asked AI for help to determine the correct values for the graph, ensuring values are displayed accurately
     fig, ax = plt.subplots()
-    ax.bar(df['StartTimestamp'], df['distance'], color='blue', label='Distance (km)')
+    ax.bar(df['start_timestamp'], df['distance'], color='blue', label='Distance (km)')
     ax.set_xlabel('Start Time')
     ax.set_ylabel('Distance (km)')
     ax.set_title('Distance vs. Time')
 
     # Add another bar plot for calories burned
     ax2 = ax.twinx()
-    ax2.plot(df['StartTimestamp'], df['calories_burned'], color='red', label='Calories', marker='o')
+    ax2.plot(df['start_timestamp'], df['calories_burned'], color='red', label='Calories', marker='o')
     ax2.set_ylabel('Calories')
     ax2.legend(loc='upper left')
 
     st.pyplot(fig)
+    plt.close(fig)
+
+
+def display_activity_rollup(rollup, period='week'):
+    """Displays a user's activity totals per day or week, as returned by
+    get_activity_rollup.
+
+    Args:
+        rollup (list): The rollup rows, oldest first. None if they couldn't
+            be fetched.
+        period (str): 'day' or 'week', used for the labels.
+    """
+    st.subheader("Activity Summary")
+    if rollup is None:
+        st.warning("Your activity summary isn't available right now.")
+        return
+    if not rollup:
+        st.write("No workouts in this period yet. Let's get started!")
+        return
+
+    label = 'Week of' if period == 'week' else 'Day'
+    st.dataframe([{
+        label: row['period_start'],
+        'Workouts': row['workouts'],
+        'Distance (km)': round(row['distance'], 2),
+        'Steps': row['steps'],
+        'Calories Burned': round(row['calories_burned']),
+        'Active Minutes': round(row['active_minutes']),
+    } for row in rollup], hide_index=True)
+
+    values_json = json.dumps([
+        {'period_start': row['period_start'], 'distance': row['distance'], 'calories_burned': row['calories_burned']}
+        for row in rollup
+    ])
+    st.vega_lite_chart(activity_chart_spec(values_json, 'period_start', label), use_container_width=True)
+
+
+# Table headings of the workout fields shown by display_recent_workouts
+RECENT_WORKOUT_HEADINGS = {
+    'workout_id': 'Workout ID',
+    'start_timestamp': 'Start Time',
+    'end_timestamp': 'End Time',
+    'start_lat_lng': 'Start Location',
+    'end_lat_lng': 'End Location',
+    'distance': 'Distance (km)',
+    'steps': 'Steps',
+    'calories_burned': 'Calories Burned',
+}
 
 
 def display_recent_workouts(workouts_list):
-    if not workouts_list:
+    # Convert workouts_list into a DataFrame for easier display in table form.
+    # Columns named as in the workouts table (e.g. StartTimestamp) are renamed
+    # to the Workout field names first.
+    df = _to_frame(workouts_list if workouts_list is not None else [], Workout).rename(columns=WORKOUT_COLUMNS)
+    if df.empty:
         st.write("No recent workouts. Let's get started!")
         return
 
     #Gemini was used in this method to create the table using DataFrame
-    # Sort workouts by start time (most recent first)
-    workouts_list.sort(key=lambda x: x['StartTimestamp'], reverse=True)
-
-    # Convert workouts_list into a DataFrame for easier display in table form
-    df = pd.DataFrame(workouts_list)
+    # Sort workouts by start time (most recent first). Pages fetched with
+    # get_user_workouts(user_id, limit=k) are already in this order. Sorting
+    # makes a copy, so a frame shared with the cache isn't changed.
+    df = df.sort_values('start_timestamp', ascending=False).reset_index(drop=True)
 
     # Rename columns for better readability
-    df.columns = ['Workout ID', 'Start Time', 'End Time', 'Start Location', 'End Location', 'Distance (km)', 'Steps', 'Calories Burned']
+    df = df[[column for column in RECENT_WORKOUT_HEADINGS if column in df.columns]].rename(columns=RECENT_WORKOUT_HEADINGS)
 
     st.write("Here is a list of your most recent workout(s):")
     
@@ -200,42 +426,116 @@ def display_recent_workouts(workouts_list):
     st.table(df)
 
 
-def display_genai_advice(timestamp, content, image):
+def display_genai_advice(timestamp, content, image, stream=False):
+    """Displays advice from get_genai_advice.
 
-    genai_advice = get_genai_advice('user1') #get data from data_fetcher
+    The advice is fetched by the caller (app.py prefetches it), so showing it
+    doesn't make another Gemini call.
 
-    #get timestamp and display it 
-    timestamp = genai_advice['timestamp']
+    Args:
+        timestamp (str): When the advice was generated.
+        content (str): The motivational message.
+        image (str): The URL of the image shown with it, or None.
+        stream (bool): If True, content may be an iterator of text pieces,
+            which are shown as they arrive.
+    """
+
+    #display the timestamp
     if timestamp is not None:
         st.subheader(f" :blue[{timestamp}]", divider="green")
     else:
         st.subheader(f" :blue[No timestamp available]", divider="green")
 
-    #get motivational message and display it
-    content = genai_advice['content']
-    if content is not None:
+    #display the motivational message
+    if stream and content is not None and not isinstance(content, str):
+        # Show the message growing as Gemini generates it
+        placeholder = st.empty()
+        text = ""
+        for piece in content:
+            text += piece
+            placeholder.title(f" :red[{text.strip()}]")
+    elif content is not None:
         st.title(f" :red[{content}]")
     else:
         st.title(f" :red[No motivational message available]")
 
-    #get image and display it  
-    image = genai_advice['image']
+    #display the image
     if image is not None:
         st.image(image)
     else:
         st.title(f" :red[No image available]")
 
-def display_sensor_data(sensor_list):
+# The most points plotted for each sensor, however long the workout is
+SENSOR_PLOT_POINTS = 500
 
-    st.title("User Sensor Data Viewer")
 
-    #if user_id and workout_id:
-    #sensor_data_df = get_user_sensor_data(user_id, workout_id)
+def display_sensor_data(sensor_list, max_points=SENSOR_PLOT_POINTS, method='lttb'):
+    """Plots a workout's readings with one chart per sensor.
 
-    if sensor_list is not None:
-        #st.subheader(f"Sensor Data for User: {user_id}, Workout: {workout_id}")
-        st.dataframe(sensor_list)  # Display as a nice interactive table
-    #elif sensor_list is not None and sensor_list.empty:
-        #st.info("No sensor data found for the specified User ID and Workout ID.")
-    else:
+    Each sensor's series is downsampled to at most max_points points before it
+    is sent to the browser. The raw readings can still be shown as a table.
+
+    Args:
+        sensor_list (list or pandas.DataFrame): The readings, as returned by
+            get_user_sensor_data (SensorSample records or a DataFrame).
+        max_points (int): The most points plotted for each sensor.
+        method (str): The downsampling method, 'lttb' or 'min_max'.
+    """
+    import pandas as pd
+
+    st.title("User Sensor Data Viewer")
+
+    if sensor_list is None:
         st.warning("Invalid User ID and Workout ID.")
+        return
+
+    df = _to_frame(sensor_list, SensorSample)
+    if df.empty:
+        st.info("No sensor data found for this workout.")
+        return
+
+    readings = df.assign(
+        Timestamp=pd.to_datetime(df['Timestamp'], utc=True, errors='coerce'),
+        SensorValue=pd.to_numeric(df['SensorValue'], errors='coerce'),
+    )
+    reduced = downsample(readings, max_points=max_points, method=method)
+    for _, sensor in reduced.groupby('SensorId', sort=False):
+        name = sensor['Name'].iloc[0] if 'Name' in sensor else None
+        units = sensor['Units'].iloc[0] if 'Units' in sensor else None
+        title = name if isinstance(name, str) else str(sensor['SensorId'].iloc[0])
+        if isinstance(units, str) and units:
+            title = f"{title} ({units})"
+        st.subheader(title)
+        st.line_chart(sensor.set_index('Timestamp')['SensorValue'])
+
+    if st.toggle("Show raw data", key='show_raw_sensor_data'):
+        st.dataframe(df)  # Display as a nice interactive table
+
+
+def display_perf_panel():
+    """Shows the recent latency of each data fetch and Vertex AI call in the
+    sidebar, with downloads of the numbers as JSON and Prometheus text."""
+    sidebar = st.sidebar
+    sidebar.subheader("Performance")
+    summary = instrumentation.summary()
+    if not summary:
+        sidebar.write("No calls recorded yet.")
+        return
+
+    sidebar.dataframe([{
+        'Operation': operation,
+        'Calls': entry['count'],
+        'Errors': entry['errors'],
+        'p50 (ms)': round(entry['p50'] * 1000, 1),
+        'p90 (ms)': round(entry['p90'] * 1000, 1),
+        'p99 (ms)': round(entry['p99'] * 1000, 1),
+        'Rows': entry['rows'],
+        'MB processed': round(entry['bytes_processed'] / 1e6, 2),
+        'Slot ms': entry['slot_ms'],
+        'BQ cache hits': entry['cache_hits'],
+    } for operation, entry in summary.items()], hide_index=True)
+
+    stats = cache_stats()
+    sidebar.caption(f"Result cache: {stats['hits']} hits, {stats['misses']} misses, {stats['size']} entries")
+    sidebar.download_button("Download JSON", instrumentation.to_json(), file_name='perf.json', mime='application/json')
+    sidebar.download_button("Download Prometheus metrics", instrumentation.to_prometheus(), file_name='perf.prom', mime='text/plain')
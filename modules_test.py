@@ -11,6 +11,9 @@ from unittest.mock import patch
 import matplotlib.pyplot as plt
 from streamlit.testing.v1 import AppTest
 from modules import display_post, display_activity_summary, display_genai_advice, display_recent_workouts
+from modules import display_posts, post_html, activity_summary_spec, display_sensor_data, display_activity_rollup
+import pandas as pd
+from records import Post, Workout
 
 # Import for display_post
 from unittest.mock import patch, MagicMock
@@ -97,6 +100,178 @@ class TestDisplayActivitySummary(unittest.TestCase):
         mock_pyplot.assert_called_once()  # Ensure plot is called'''
 
 
+class TestDisplayPosts(unittest.TestCase):
+    """Tests the display_posts feed renderer."""
+
+    def setUp(self):
+        self.posts = [
+            {'post_id': 'post1', 'username': 'remi', 'user_image': 'https://example.com/remi.png',
+             'timestamp': '2025-03-12 10:00:00', 'content': 'First run!', 'image': 'https://example.com/run.png'},
+            {'post_id': 'post2', 'username': 'blake', 'user_image': 'https://example.com/blake.png',
+             'timestamp': '2025-03-13 10:00:00', 'content': '<script>alert("hi")</script>', 'image': 'https://bad.example.com/x'},
+        ]
+
+    @patch('modules.validate_images')
+    @patch('modules.st.markdown')
+    def test_single_markdown_with_one_stylesheet(self, mock_markdown, mock_validate_images):
+        """Tests that the whole feed is one element and the CSS is sent once."""
+        mock_validate_images.return_value = {'https://example.com/run.png': True, 'https://bad.example.com/x': False}
+
+        display_posts(self.posts)
+
+        mock_markdown.assert_called_once()
+        feed = mock_markdown.call_args[0][0]
+        self.assertEqual(feed.count('<style>'), 1)
+        self.assertEqual(feed.count('class="post-container"'), 2)
+        self.assertIn('src="https://example.com/run.png"', feed)
+        self.assertNotIn('https://bad.example.com/x', feed)
+        mock_validate_images.assert_called_once()
+
+    @patch('modules.validate_images', return_value={})
+    @patch('modules.st.markdown')
+    def test_content_is_escaped(self, mock_markdown, mock_validate_images):
+        """Tests that post text can't inject HTML."""
+        display_posts(self.posts)
+
+        feed = mock_markdown.call_args[0][0]
+        self.assertNotIn('<script>', feed)
+        self.assertIn('&lt;script&gt;alert(&quot;hi&quot;)&lt;/script&gt;', feed)
+
+    @patch('modules.validate_images', return_value={})
+    @patch('modules.st.markdown')
+    def test_post_html_is_memoized(self, mock_markdown, mock_validate_images):
+        """Tests that a rerun reuses the HTML built for each post."""
+        post_html.cache_clear()
+        display_posts(self.posts)
+        display_posts(self.posts)
+
+        info = post_html.cache_info()
+        self.assertEqual(info.misses, 2)
+        self.assertEqual(info.hits, 2)
+
+    @patch('modules.validate_images', return_value={'https://example.com/run.png': True})
+    @patch('modules.st.markdown')
+    def test_post_records(self, mock_markdown, mock_validate_images):
+        """Tests that Post records are shown with their timestamp formatted."""
+        post = Post('post1', 'user1', datetime.datetime(2025, 3, 12, 10, 0, tzinfo=datetime.timezone.utc),
+                    'First run!', 'https://example.com/run.png', 'remi', '')
+        display_posts([post])
+
+        feed = mock_markdown.call_args[0][0]
+        self.assertIn('Posted on: 2025-03-12 10:00:00<', feed)
+        self.assertIn('src="https://example.com/run.png"', feed)
+
+    @patch('modules.st.markdown')
+    def test_empty_feed(self, mock_markdown):
+        """Tests that an empty feed draws nothing."""
+        display_posts([])
+        mock_markdown.assert_not_called()
+
+
+class TestDisplayPostFeed(unittest.TestCase):
+    """Tests the paginated display_post_feed."""
+
+    @staticmethod
+    def feed_app():
+        from data_fetcher import get_user_posts_page
+        from modules import display_post_feed
+        display_post_feed('user1', get_user_posts_page('user1'))
+
+    @staticmethod
+    def page(post_ids, next_cursor):
+        return {
+            'posts': [{'post_id': post_id, 'username': 'remi', 'user_image': '', 'timestamp': '2025-03-12 10:00:00',
+                       'content': f'Content of {post_id}', 'image': ''} for post_id in post_ids],
+            'next_cursor': next_cursor,
+        }
+
+    @patch('data_fetcher.get_user_posts_page')
+    @patch('modules.get_user_posts_page')
+    def test_load_more(self, mock_next_page, mock_first_page):
+        """Tests that only the first page is shown until "Load more" is clicked."""
+        mock_first_page.return_value = self.page(['post2'], ('2025-03-12', 'post2'))
+        mock_next_page.return_value = self.page(['post1'], None)
+
+        at = AppTest.from_function(self.feed_app).run()
+        self.assertIn('Content of post2', at.markdown[0].value)
+        self.assertNotIn('Content of post1', at.markdown[0].value)
+        mock_next_page.assert_not_called()
+
+        at.button[0].click().run()
+        self.assertIn('Content of post2', at.markdown[0].value)
+        self.assertIn('Content of post1', at.markdown[0].value)
+        mock_next_page.assert_called_once_with('user1', cursor=('2025-03-12', 'post2'))
+        self.assertEqual(len(at.button), 0)
+
+
+class TestActivityChart(unittest.TestCase):
+    """Tests the Vega-Lite chart in display_activity_summary."""
+
+    def setUp(self):
+        self.workouts = [
+            Workout('workout1', datetime.datetime(2025, 3, 1, 8, 0), datetime.datetime(2025, 3, 1, 9, 0),
+                    None, None, 5.0, 6000, 400),
+            Workout('workout2', datetime.datetime(2025, 3, 2, 8, 30), datetime.datetime(2025, 3, 2, 9, 15),
+                    None, None, 7.2, 8000, 550),
+        ]
+
+    @patch('streamlit.pyplot')
+    @patch('streamlit.vega_lite_chart')
+    @patch('streamlit.dataframe')
+    def test_chart_is_vega_lite(self, mock_dataframe, mock_vega_lite_chart, mock_pyplot):
+        """Tests that the chart is sent as a spec instead of a rendered image."""
+        display_activity_summary(self.workouts)
+
+        mock_pyplot.assert_not_called()
+        spec = mock_vega_lite_chart.call_args[0][0]
+        self.assertEqual([layer['mark']['type'] for layer in spec['layer']], ['bar', 'line'])
+        self.assertEqual(spec['data']['values'], [
+            {'start_timestamp': '2025-03-01T08:00:00.000', 'distance': 5.0, 'calories_burned': 400},
+            {'start_timestamp': '2025-03-02T08:30:00.000', 'distance': 7.2, 'calories_burned': 550},
+        ])
+
+    @patch('streamlit.vega_lite_chart')
+    @patch('streamlit.dataframe')
+    def test_spec_is_memoized(self, mock_dataframe, mock_vega_lite_chart):
+        """Tests that the same workouts reuse the same spec without serializing them again."""
+        display_activity_summary(self.workouts)
+        with patch('pandas.DataFrame.to_json') as mock_to_json:
+            display_activity_summary(Workout.to_frame(self.workouts))
+
+        first, second = [call[0][0] for call in mock_vega_lite_chart.call_args_list]
+        self.assertIs(first, second)
+        mock_to_json.assert_not_called()
+        self.assertIsNot(activity_summary_spec(Workout.to_frame(self.workouts[:1])), first)
+
+    def test_changed_values_get_a_new_spec(self):
+        """Tests that changing a charted value of the same workout isn't served from the memo."""
+        import dataclasses
+        before = activity_summary_spec(Workout.to_frame(self.workouts))
+        changed = [dataclasses.replace(self.workouts[0], distance=12.0)] + self.workouts[1:]
+
+        after = activity_summary_spec(Workout.to_frame(changed))
+
+        self.assertEqual(before['data']['values'][0]['distance'], 5.0)
+        self.assertEqual(after['data']['values'][0]['distance'], 12.0)
+
+    @patch('streamlit.vega_lite_chart')
+    @patch('streamlit.dataframe')
+    def test_no_workouts(self, mock_dataframe, mock_vega_lite_chart):
+        """Tests that an empty workout list still draws an (empty) chart."""
+        display_activity_summary([])
+
+        self.assertEqual(mock_vega_lite_chart.call_args[0][0]['data']['values'], [])
+
+    @patch('streamlit.pyplot')
+    @patch('streamlit.dataframe')
+    def test_matplotlib_figure_is_closed(self, mock_dataframe, mock_pyplot):
+        """Tests the matplotlib fallback doesn't leave figures open."""
+        display_activity_summary(self.workouts, chart='matplotlib')
+
+        mock_pyplot.assert_called_once()
+        self.assertFalse(plt.fignum_exists(mock_pyplot.call_args[0][0].number))
+
+
 class TestDisplayGenAiAdvice(unittest.TestCase):
     """Tests the display_genai_advice function."""
     #use patching and mocking to generate tests
@@ -118,7 +293,7 @@ class TestDisplayGenAiAdvice(unittest.TestCase):
 
         display_genai_advice(timestamp, content, image)
 
-        mock_get_genai_advice.assert_called_once_with('user1')
+        mock_get_genai_advice.assert_not_called()  # shows what it is given
         mock_image.assert_called_once_with(image)
         mock_subheader.assert_called_once_with(" :blue[2024-01-01 00:00:00]", divider="green")
         mock_title.assert_called_once_with(" :red[You're doing great!]")
@@ -141,7 +316,7 @@ class TestDisplayGenAiAdvice(unittest.TestCase):
 
         display_genai_advice(timestamp, content, image)
 
-        mock_get_genai_advice.assert_called_once_with('user1')
+        mock_get_genai_advice.assert_not_called()  # shows what it is given
         mock_image.assert_called_once_with(image)
         mock_subheader.assert_any_call(" :blue[2024-01-01 00:00:00]", divider="green")
         mock_title.assert_any_call(" :red[]")
@@ -164,7 +339,7 @@ class TestDisplayGenAiAdvice(unittest.TestCase):
 
         display_genai_advice(timestamp, content, image)
 
-        mock_get_genai_advice.assert_called_once_with('user1')
+        mock_get_genai_advice.assert_not_called()  # shows what it is given
         mock_image.assert_called_once_with(image)
         mock_subheader.assert_any_call(" :blue[No timestamp available]", divider="green")
         mock_title.assert_any_call(" :red[No motivational message available]")
@@ -187,7 +362,7 @@ class TestDisplayGenAiAdvice(unittest.TestCase):
 
         display_genai_advice(timestamp, content, image)
 
-        mock_get_genai_advice.assert_called_once_with('user1')
+        mock_get_genai_advice.assert_not_called()  # shows what it is given
         mock_image.assert_called_once_with(image)
         mock_subheader.assert_any_call(" :blue[2024-01-01 00:00:00]", divider="green")
         mock_title.assert_any_call(" :red[Test content.]")
@@ -210,7 +385,7 @@ class TestDisplayGenAiAdvice(unittest.TestCase):
 
         display_genai_advice(timestamp, content, image)
 
-        mock_get_genai_advice.assert_called_once_with('user1')
+        mock_get_genai_advice.assert_not_called()  # shows what it is given
         mock_image.assert_not_called()
         mock_subheader.assert_called_once_with(" :blue[2024-01-01 00:00:00]", divider="green")
         mock_title.assert_any_call(" :red[Motivational message]")
@@ -234,11 +409,28 @@ class TestDisplayGenAiAdvice(unittest.TestCase):
 
         display_genai_advice(timestamp, content, image)
 
-        mock_get_genai_advice.assert_called_once_with('user1')
+        mock_get_genai_advice.assert_not_called()  # shows what it is given
         mock_image.assert_called_once_with(image)
         mock_subheader.assert_called_once_with(" :blue[No timestamp available]", divider="green")
         mock_title.assert_called_once_with(" :red[Motivational message]")
 
+    @patch("streamlit.empty")
+    @patch("streamlit.image")
+    @patch("streamlit.subheader")
+    @patch("streamlit.title")
+    @patch("modules.get_genai_advice")
+    def test_stream_updates_message(self, mock_get_genai_advice, mock_title, mock_subheader, mock_image, mock_empty):
+        """Tests that streamed advice is shown piece by piece in one placeholder."""
+        display_genai_advice("2024-01-01 00:00:00", iter(["Keep ", "going!"]), "https://example.com/image.jpg", stream=True)
+
+        mock_get_genai_advice.assert_not_called()
+        placeholder = mock_empty.return_value
+        self.assertEqual(placeholder.title.call_args_list, [
+            unittest.mock.call(" :red[Keep]"),
+            unittest.mock.call(" :red[Keep going!]"),
+        ])
+        mock_image.assert_called_once_with("https://example.com/image.jpg")
+
 
 
 class TestGetUserWorkouts(unittest.TestCase):
@@ -260,11 +452,60 @@ class TestGetUserWorkouts(unittest.TestCase):
         result = display_recent_workouts([])  # Pass an empty list
         mock_st_write.assert_called_with("No recent workouts. Let's get started!")
 
+    @patch('streamlit.table')
+    @patch('streamlit.write')
+    def test_display_recent_workouts_records(self, mock_st_write, mock_st_table):
+        """Tests that Workout records are shown newest first under readable headings."""
+        display_recent_workouts([
+            Workout('workout1', datetime.datetime(2024, 7, 29, 7), datetime.datetime(2024, 7, 29, 8), None, None, 5.0, 8000, 400.0),
+            Workout('workout2', datetime.datetime(2024, 7, 30, 9), datetime.datetime(2024, 7, 30, 10), None, None, 6.5, 10000, 500.0),
+        ])
+
+        table = mock_st_table.call_args[0][0]
+        self.assertEqual(list(table.columns), ['Workout ID', 'Start Time', 'End Time', 'Start Location', 'End Location',
+                                               'Distance (km)', 'Steps', 'Calories Burned'])
+        self.assertEqual(list(table['Workout ID']), ['workout2', 'workout1'])
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(table['Start Time']))
+
+    @patch('streamlit.table')
+    @patch('streamlit.write')
+    def test_display_recent_workouts_dataframe(self, mock_st_write, mock_st_table):
+        """Tests that a DataFrame from get_user_workouts(output='dataframe') is sorted and shows its locations."""
+        display_recent_workouts(pd.DataFrame({
+            'workout_id': ['workout1', 'workout2'],
+            'start_timestamp': pd.to_datetime(['2024-07-29T07:00:00', '2024-07-30T09:00:00']),
+            'end_timestamp': pd.to_datetime(['2024-07-29T08:00:00', '2024-07-30T10:00:00']),
+            'start_lat_lng': [(37.7749, -122.4194), None],
+            'end_lat_lng': [(37.8049, -122.4210), None],
+            'distance': [5.0, 6.5],
+            'steps': [8000, 10000],
+            'calories_burned': [400.0, 500.0],
+        }))
+
+        table = mock_st_table.call_args[0][0]
+        self.assertEqual(list(table['Workout ID']), ['workout2', 'workout1'])
+        self.assertEqual(list(table['Start Location']), [None, (37.7749, -122.4194)])
+
+    @patch('streamlit.table')
+    @patch('streamlit.write')
+    def test_display_recent_workouts_table_column_names(self, mock_st_write, mock_st_table):
+        """Tests that dictionaries keyed like the workouts table (e.g. StartTimestamp) are shown."""
+        display_recent_workouts([
+            {'WorkoutId': 'workout1', 'StartTimestamp': '2024-07-29T07:00:00', 'end_timestamp': '2024-07-29T08:00:00',
+             'start_lat_lng': None, 'end_lat_lng': None, 'distance': 5.0, 'steps': 8000, 'calories_burned': 400},
+            {'WorkoutId': 'workout2', 'StartTimestamp': '2024-07-30T09:00:00', 'end_timestamp': '2024-07-30T10:00:00',
+             'start_lat_lng': None, 'end_lat_lng': None, 'distance': 6.5, 'steps': 10000, 'calories_burned': 500},
+        ])
+
+        table = mock_st_table.call_args[0][0]
+        self.assertEqual(list(table['Workout ID']), ['workout2', 'workout1'])
+        self.assertEqual(list(table['Start Time']), ['2024-07-30T09:00:00', '2024-07-29T07:00:00'])
+
     @patch('streamlit.write')
     def test_display_recent_workouts_null_coords(self, mock_st_write):
         workout_list = [{
-            'WorkoutId': 'workout2',
-            'StartTimestamp': '2024-07-29T07:00:00',
+            'workout_id': 'workout2',
+            'start_timestamp': '2024-07-29T07:00:00',
             'end_timestamp': '2024-07-29T08:00:00',
             'start_lat_lng': None,
             'end_lat_lng': None,
@@ -298,8 +539,8 @@ class TestGetUserWorkouts(unittest.TestCase):
 
         result = display_recent_workouts([
             {
-                'WorkoutId': "workout1",
-                'StartTimestamp': "2024-07-29T07:00:00",
+                'workout_id': "workout1",
+                'start_timestamp': "2024-07-29T07:00:00",
                 'end_timestamp': "2024-07-29T08:00:00",
                 'start_lat_lng': (37.7749, -122.4194),
                 'end_lat_lng': (37.8049, -122.4210),
@@ -344,8 +585,8 @@ class TestGetUserWorkouts(unittest.TestCase):
 
         result = display_recent_workouts([
             {
-                'WorkoutId': "workout1",
-                'StartTimestamp': "2024-07-29T07:00:00",
+                'workout_id': "workout1",
+                'start_timestamp': "2024-07-29T07:00:00",
                 'end_timestamp': "2024-07-29T08:00:00",
                 'start_lat_lng': (37.7749, -122.4194),
                 'end_lat_lng': (37.8049, -122.4210),
@@ -354,8 +595,8 @@ class TestGetUserWorkouts(unittest.TestCase):
                 'calories_burned': 400,
             },
             {
-                'WorkoutId': "workout2",
-                'StartTimestamp': "2024-07-30T09:00:00",
+                'workout_id': "workout2",
+                'start_timestamp': "2024-07-30T09:00:00",
                 'end_timestamp': "2024-07-30T10:00:00",
                 'start_lat_lng': (40.7128, -74.0060),
                 'end_lat_lng': (40.7308, -73.9976),
@@ -369,5 +610,73 @@ class TestGetUserWorkouts(unittest.TestCase):
     
 
 
+class TestDisplayActivityRollup(unittest.TestCase):
+    """Tests the display_activity_rollup function."""
+
+    @patch('streamlit.vega_lite_chart')
+    @patch('streamlit.dataframe')
+    def test_weekly_totals(self, mock_dataframe, mock_vega_lite_chart):
+        """Tests that one table row and chart point is shown per week."""
+        rollup = [
+            {'period_start': '2024-07-22', 'workouts': 3, 'distance': 12.345, 'steps': 20000,
+             'calories_burned': 900.4, 'active_minutes': 150.0},
+            {'period_start': '2024-07-29', 'workouts': 1, 'distance': 5.0, 'steps': 8000,
+             'calories_burned': 400.0, 'active_minutes': 60.0},
+        ]
+        display_activity_rollup(rollup, 'week')
+
+        table = mock_dataframe.call_args[0][0]
+        self.assertEqual(table[0]['Week of'], '2024-07-22')
+        self.assertEqual(table[0]['Distance (km)'], 12.35)
+        spec = mock_vega_lite_chart.call_args[0][0]
+        self.assertEqual(spec['layer'][0]['encoding']['x']['field'], 'period_start')
+        self.assertEqual(len(spec['data']['values']), 2)
+
+    @patch('streamlit.warning')
+    def test_unavailable(self, mock_warning):
+        display_activity_rollup(None)
+        mock_warning.assert_called_once()
+
+
+class TestDisplaySensorData(unittest.TestCase):
+    """Tests the display_sensor_data function."""
+
+    @staticmethod
+    def sensor_app():
+        import numpy as np
+        import pandas as pd
+        from modules import display_sensor_data
+        timestamps = pd.date_range('2025-03-01 08:00', periods=20000, freq='s', tz='UTC')
+        display_sensor_data(pd.DataFrame({
+            'UserId': 'user1', 'SensorId': 'sensor1', 'Name': 'Heart Rate', 'Units': 'bpm',
+            'Timestamp': timestamps, 'SensorValue': np.linspace(60, 180, 20000),
+        }), max_points=300)
+
+    @patch('streamlit.toggle', return_value=False)
+    @patch('streamlit.dataframe')
+    @patch('streamlit.line_chart')
+    def test_plots_downsampled_series(self, mock_line_chart, mock_dataframe, mock_toggle):
+        """Tests that each sensor is plotted with at most max_points points."""
+        with patch('streamlit.subheader') as mock_subheader:
+            self.sensor_app()
+
+        mock_subheader.assert_called_once_with('Heart Rate (bpm)')
+        self.assertEqual(len(mock_line_chart.call_args[0][0]), 300)
+        mock_dataframe.assert_not_called()
+
+    def test_raw_table_toggle(self):
+        """Tests that the raw readings are only shown when asked for."""
+        at = AppTest.from_function(self.sensor_app).run()
+        at.toggle[0].set_value(True).run()
+
+        self.assertEqual(len(at.dataframe), 1)
+
+    @patch('streamlit.warning')
+    def test_no_data(self, mock_warning):
+        """Tests that a failed fetch shows a warning."""
+        display_sensor_data(None)
+        mock_warning.assert_called_once()
+
+
 if __name__ == "__main__":
     unittest.main()
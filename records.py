@@ -0,0 +1,200 @@
+#############################################################################
+# records.py
+#
+# This file contains the typed records the data fetchers return in their
+# default 'records' output: Workout, Post, SensorSample and UserProfile.
+#
+# Each record is a frozen dataclass with __slots__, so a row costs a small
+# fixed-size object instead of a dictionary, and values keep their native
+# types (datetime timestamps, float distances) instead of being formatted as
+# strings. Records are immutable because the fetchers' results are shared
+# between sessions through the result cache.
+#
+# Fields can also be read like dictionary keys (workout['distance'],
+# post.get('image')), so display code works with records and with plain
+# dictionaries alike. Use to_frame() to turn a list of records into a pandas
+# DataFrame in one go.
+#############################################################################
+
+import dataclasses
+import datetime
+import operator
+from typing import Optional
+
+
+class Record:
+    """The base class of the records."""
+
+    __slots__ = ()
+
+    # The field names, and the DataFrame column name of each field. Set by
+    # @record.
+    FIELDS = ()
+    COLUMNS = ()
+
+    def __getitem__(self, key):
+        if key not in self.FIELDS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key, default=None):
+        """Returns a field like dict.get does."""
+        return getattr(self, key) if key in self.FIELDS else default
+
+    def keys(self):
+        return self.FIELDS
+
+    def to_dict(self):
+        """Returns the record as a dictionary of its fields."""
+        return dict(zip(self.FIELDS, self._values(self)))
+
+    @classmethod
+    def to_frame(cls, records):
+        """Builds a DataFrame from a list of records, one column per field.
+
+        The columns are built directly from the fields, so timestamps become
+        datetime64 columns without being parsed from strings.
+
+        Args:
+            records (list): Records of this type.
+
+        Returns:
+            pandas.DataFrame: One row per record, with the columns in COLUMNS.
+        """
+        import pandas as pd
+
+        values = [cls._values(record) for record in records]
+        return pd.DataFrame.from_records(values, columns=list(cls.COLUMNS))
+
+
+def record(columns=None):
+    """Makes a class a Record: a frozen dataclass with __slots__.
+
+    Args:
+        columns (dict, optional): DataFrame column names for fields whose
+            column isn't named like the field.
+    """
+    def decorate(cls):
+        cls = dataclasses.dataclass(frozen=True, slots=True)(cls)
+        cls.FIELDS = tuple(field.name for field in dataclasses.fields(cls))
+        cls.COLUMNS = tuple((columns or {}).get(name, name) for name in cls.FIELDS)
+        getter = operator.attrgetter(*cls.FIELDS)
+        cls._values = staticmethod(getter if len(cls.FIELDS) > 1 else lambda item: (getter(item),))
+        return cls
+    return decorate
+
+
+def _lat_lng(lat, lng):
+    # A (latitude, longitude) pair, or None if either is missing
+    return (lat, lng) if lat is not None and lng is not None else None
+
+
+@record()
+class Workout(Record):
+    """A workout, as returned by get_user_workouts."""
+
+    workout_id: str
+    start_timestamp: Optional[datetime.datetime]
+    end_timestamp: Optional[datetime.datetime]
+    start_lat_lng: Optional[tuple]
+    end_lat_lng: Optional[tuple]
+    distance: Optional[float]
+    steps: Optional[int]
+    calories_burned: Optional[float]
+
+    @classmethod
+    def from_row(cls, row):
+        """Builds a Workout from a row of the workouts query."""
+        return cls(
+            row.WorkoutId,
+            row.StartTimestamp,
+            row.EndTimestamp,
+            _lat_lng(row.StartLocationLat, row.StartLocationLong),
+            _lat_lng(row.EndLocationLat, row.EndLocationLong),
+            row.TotalDistance,
+            row.TotalSteps,
+            row.CaloriesBurned,
+        )
+
+
+@record()
+class Post(Record):
+    """A post joined with its author, as returned by get_user_posts."""
+
+    post_id: str
+    user_id: str
+    timestamp: datetime.datetime
+    content: str
+    image: str
+    username: Optional[str]
+    user_image: Optional[str]
+
+    @classmethod
+    def from_row(cls, row):
+        """Builds a Post from a row of the posts queries. A missing content
+        or image becomes ''."""
+        return cls(
+            row['PostId'],
+            row['AuthorId'],
+            row['Timestamp'],
+            row['Content'] or '',
+            row['PostImageUrl'] or '',
+            row['Username'],
+            row['UserImageUrl'],
+        )
+
+
+# SensorSample's DataFrame columns are named like the columns of
+# get_user_sensor_data(output='dataframe'), which display_sensor_data reads
+SENSOR_SAMPLE_COLUMNS = {
+    'user_id': 'UserId',
+    'sensor_id': 'SensorId',
+    'name': 'Name',
+    'units': 'Units',
+    'timestamp': 'Timestamp',
+    'value': 'SensorValue',
+}
+
+
+@record(SENSOR_SAMPLE_COLUMNS)
+class SensorSample(Record):
+    """One sensor reading, as returned by get_user_sensor_data."""
+
+    user_id: str
+    sensor_id: str
+    name: Optional[str]
+    units: Optional[str]
+    timestamp: datetime.datetime
+    value: Optional[float]
+
+    @classmethod
+    def from_row(cls, row):
+        """Builds a SensorSample from a row of the sensor data query. Missing
+        columns become None."""
+        return cls(row.get('UserId'), row.get('SensorId'), row.get('Name'), row.get('Units'),
+                   row.get('Timestamp'), row.get('SensorValue'))
+
+    @classmethod
+    def from_arrow(cls, table):
+        """Builds SensorSamples from a pyarrow Table of the sensor data query,
+        converting each column in one go. Missing columns become None."""
+        missing = [None] * table.num_rows
+        columns = [table.column(column).to_pylist() if column in table.column_names else missing
+                   for column in cls.COLUMNS]
+        return [cls(*values) for values in zip(*columns)]
+
+
+@record()
+class UserProfile(Record):
+    """A user's profile, as returned by get_user_profile."""
+
+    full_name: str
+    username: str
+    date_of_birth: Optional[datetime.date]
+    profile_image: Optional[str]
+    friends: tuple
+
+    @classmethod
+    def from_row(cls, row):
+        """Builds a UserProfile from a row of the profile query."""
+        return cls(row.full_name, row.username, row.date_of_birth, row.profile_image, tuple(row.friends or ()))
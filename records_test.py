@@ -0,0 +1,156 @@
+#############################################################################
+# records_test.py
+#
+# This file contains tests for records.py.
+#
+# You will write these tests in Unit 3.
+#############################################################################
+import dataclasses
+import datetime
+import sys
+import unittest
+from types import SimpleNamespace
+
+import pandas as pd
+import pyarrow as pa
+
+from records import Post, SensorSample, UserProfile, Workout
+
+UTC = datetime.timezone.utc
+
+
+def workout_row(**overrides):
+    """Returns a fake row of the workouts query."""
+    row = dict(
+        WorkoutId='workout1',
+        StartTimestamp=datetime.datetime(2024, 7, 29, 7, 0, tzinfo=UTC),
+        EndTimestamp=datetime.datetime(2024, 7, 29, 8, 0, tzinfo=UTC),
+        StartLocationLat=37.7749, StartLocationLong=-122.4194,
+        EndLocationLat=None, EndLocationLong=-122.4210,
+        TotalDistance=5.0, TotalSteps=8000, CaloriesBurned=400.0,
+    )
+    row.update(overrides)
+    return SimpleNamespace(**row)
+
+
+class TestWorkout(unittest.TestCase):
+    """Tests the Workout record."""
+
+    def test_from_row(self):
+        """Tests that timestamps stay datetimes and locations become pairs."""
+        workout = Workout.from_row(workout_row())
+
+        self.assertEqual(workout.start_timestamp, datetime.datetime(2024, 7, 29, 7, 0, tzinfo=UTC))
+        self.assertEqual(workout.start_lat_lng, (37.7749, -122.4194))
+        self.assertIsNone(workout.end_lat_lng)
+        self.assertEqual(workout.distance, 5.0)
+
+    def test_is_slotted_and_frozen(self):
+        """Tests that records have no per-instance dictionary and can't change."""
+        workout = Workout.from_row(workout_row())
+
+        self.assertFalse(hasattr(workout, '__dict__'))
+        with self.assertRaises(dataclasses.FrozenInstanceError):
+            workout.distance = 1.0
+
+    def test_smaller_than_dictionary(self):
+        """Tests that a record takes less than half the memory of the old dictionary."""
+        workout = Workout.from_row(workout_row())
+        old = {
+            'WorkoutId': 'workout1',
+            'StartTimestamp': workout.start_timestamp.isoformat(),
+            'end_timestamp': workout.end_timestamp.isoformat(),
+            'start_lat_lng': workout.start_lat_lng,
+            'end_lat_lng': None,
+            'distance': 5.0,
+            'steps': 8000,
+            'calories_burned': 400.0,
+        }
+        record_size = sys.getsizeof(workout) + 2 * sys.getsizeof(workout.start_timestamp)
+        dict_size = sys.getsizeof(old) + sys.getsizeof(old['StartTimestamp']) + sys.getsizeof(old['end_timestamp'])
+
+        self.assertLess(record_size, dict_size / 2)
+
+    def test_mapping_access(self):
+        """Tests that fields can be read like dictionary keys."""
+        workout = Workout.from_row(workout_row())
+
+        self.assertEqual(workout['steps'], 8000)
+        self.assertEqual(workout.get('steps'), 8000)
+        self.assertIsNone(workout.get('WorkoutId'))
+        with self.assertRaises(KeyError):
+            workout['WorkoutId']
+        self.assertEqual(dict(workout), workout.to_dict())
+        self.assertEqual(list(workout.to_dict()), list(Workout.FIELDS))
+
+    def test_to_frame(self):
+        """Tests that a list of records becomes a typed DataFrame."""
+        workouts = [Workout.from_row(workout_row()), Workout.from_row(workout_row(WorkoutId='workout2', TotalSteps=None))]
+
+        frame = Workout.to_frame(workouts)
+
+        self.assertEqual(list(frame.columns), list(Workout.FIELDS))
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(frame['start_timestamp']))
+        self.assertEqual(frame['workout_id'].tolist(), ['workout1', 'workout2'])
+        self.assertTrue(pd.isna(frame['steps'].iloc[1]))
+
+    def test_empty_frame(self):
+        """Tests that no records still give the columns."""
+        frame = Workout.to_frame([])
+        self.assertTrue(frame.empty)
+        self.assertEqual(list(frame.columns), list(Workout.FIELDS))
+
+
+class TestPost(unittest.TestCase):
+    """Tests the Post record."""
+
+    def test_from_row(self):
+        """Tests that a missing content and image become empty strings."""
+        post = Post.from_row({
+            'PostId': 'post1', 'AuthorId': 'user1', 'Timestamp': datetime.datetime(2024, 1, 1, tzinfo=UTC),
+            'Content': None, 'PostImageUrl': None, 'Username': 'remi', 'UserImageUrl': 'https://example.com/remi.png',
+        })
+
+        self.assertEqual(post.timestamp, datetime.datetime(2024, 1, 1, tzinfo=UTC))
+        self.assertEqual(post.content, '')
+        self.assertEqual(post['image'], '')
+
+
+class TestSensorSample(unittest.TestCase):
+    """Tests the SensorSample record."""
+
+    def test_from_arrow_matches_from_row(self):
+        """Tests that both ways of building samples agree."""
+        rows = [{'UserId': 'user1', 'SensorId': 'sensor1', 'Name': 'Heart Rate', 'Units': 'bpm',
+                 'Timestamp': datetime.datetime(2024, 7, 29, 7, 0, second, tzinfo=UTC), 'SensorValue': 100.0 + second}
+                for second in range(3)]
+
+        samples = SensorSample.from_arrow(pa.Table.from_pylist(rows))
+
+        self.assertEqual(samples, [SensorSample.from_row(row) for row in rows])
+
+    def test_frame_uses_query_column_names(self):
+        """Tests that the DataFrame has the columns of output='dataframe'."""
+        sample = SensorSample('user1', 'sensor1', 'Heart Rate', 'bpm', datetime.datetime(2024, 7, 29, tzinfo=UTC), 100.0)
+
+        frame = SensorSample.to_frame([sample])
+
+        self.assertEqual(list(frame.columns), ['UserId', 'SensorId', 'Name', 'Units', 'Timestamp', 'SensorValue'])
+        self.assertEqual(frame['SensorValue'].tolist(), [100.0])
+
+
+class TestUserProfile(unittest.TestCase):
+    """Tests the UserProfile record."""
+
+    def test_from_row(self):
+        """Tests that the friends list becomes a tuple."""
+        profile = UserProfile.from_row(SimpleNamespace(
+            full_name='Remi', username='remi_the_rems', date_of_birth=datetime.date(1990, 1, 1),
+            profile_image=None, friends=['user2', 'user3']))
+
+        self.assertEqual(profile.friends, ('user2', 'user3'))
+        self.assertEqual(profile['date_of_birth'], datetime.date(1990, 1, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,182 @@
+#############################################################################
+# sensor_store.py
+#
+# This file contains the on-disk cache of workout sensor data.
+#
+# A workout's sensor readings never change once recorded, so after the first
+# fetch they are written to a local Arrow IPC file keyed by (data source,
+# user, workout). The data source (such as the BigQuery dataset) is part of
+# the key so that two backends never read each other's files.
+# Later reads memory-map the file, so the table's buffers come straight from
+# the OS page cache without a copy, and every process on the machine (every
+# Streamlit worker) shares the same files.
+#
+# The files are uncompressed Arrow IPC rather than Parquet because Parquet
+# has to be decoded into memory, which rules out zero-copy reads.
+#
+# The directory is kept under a size cap by deleting the least recently used
+# files. A file's modification time is bumped whenever it is read, so the
+# order is shared between processes too.
+#
+# The store is off unless SENSOR_CACHE_DIR is set.
+#############################################################################
+
+import hashlib
+import os
+import tempfile
+import threading
+
+# How many bytes the files may use in total, unless SENSOR_CACHE_MAX_BYTES
+# says otherwise
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+SUFFIX = '.arrow'
+
+
+class SensorDataStore:
+    """A directory of Arrow IPC files, one per (data source, user, workout)."""
+
+    def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+        """Opens (and creates if needed) a store.
+
+        Args:
+            directory (str): The directory holding the files.
+            max_bytes (int): The most bytes the files may use. The least
+                recently used files are deleted when a write goes over it.
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, source, user_id, workout_id):
+        """Returns the file used for a workout of a data source (a backend's
+        name). The key is hashed so any characters are safe in the file
+        name."""
+        digest = hashlib.sha256(f'{source}\0{user_id}\0{workout_id}'.encode()).hexdigest()[:32]
+        return os.path.join(self.directory, digest + SUFFIX)
+
+    def get(self, source, user_id, workout_id):
+        """Reads a workout's sensor data.
+
+        Args:
+            source (str): The name of the backend the data came from.
+
+        Returns:
+            pyarrow.Table: The stored table, backed by a memory map of its
+                file, or None if the workout isn't stored.
+        """
+        import pyarrow as pa
+
+        path = self.path(source, user_id, workout_id)
+        try:
+            source = pa.memory_map(path, 'r')
+        except FileNotFoundError:
+            return None
+        table = pa.ipc.open_file(source).read_all()
+        try:
+            os.utime(path)  # mark as recently used
+        except OSError:
+            pass
+        return table
+
+    def put(self, source, user_id, workout_id, table):
+        """Writes a workout's sensor data, then evicts files over the cap.
+
+        The file is written under a temporary name and renamed into place,
+        so readers in other processes never see a partial file.
+
+        Args:
+            source (str): The name of the backend the data came from.
+            table (pyarrow.Table): The workout's sensor readings.
+        """
+        import pyarrow as pa
+
+        path = self.path(source, user_id, workout_id)
+        handle, temporary_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as file:
+                with pa.ipc.new_file(file, table.schema) as writer:
+                    writer.write_table(table)
+            os.replace(temporary_path, path)
+        except BaseException:
+            os.unlink(temporary_path)
+            raise
+        self.evict(keep=path)
+
+    def evict(self, keep=None):
+        """Deletes the least recently used files until the store fits in
+        max_bytes.
+
+        Args:
+            keep (str, optional): A file that is never deleted, such as the
+                one just written.
+
+        Returns:
+            int: The number of files deleted.
+        """
+        with self._lock:
+            files = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(SUFFIX):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue  # deleted by another process
+                    files.append((stat.st_mtime_ns, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in files)
+            deleted = 0
+            for _, size, path in sorted(files):
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                deleted += 1
+            return deleted
+
+    def size(self):
+        """Returns the bytes used by the stored files."""
+        return sum(entry.stat().st_size for entry in os.scandir(self.directory) if entry.name.endswith(SUFFIX))
+
+    def clear(self):
+        """Deletes every stored file."""
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(SUFFIX):
+                os.unlink(entry.path)
+
+
+_store = None
+_store_created = False
+_store_lock = threading.Lock()
+
+
+def get_sensor_store():
+    """Returns the store get_user_sensor_data uses, or None if it is off.
+
+    The store is opt-in: it is only used when the SENSOR_CACHE_DIR
+    environment variable names its directory. It is created there on first
+    use, capped at SENSOR_CACHE_MAX_BYTES (optional, 0 turns it off).
+    """
+    global _store, _store_created
+    if not _store_created:
+        with _store_lock:
+            if not _store_created:
+                directory = os.environ.get('SENSOR_CACHE_DIR')
+                max_bytes = int(os.environ.get('SENSOR_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+                if directory and max_bytes > 0:
+                    _store = SensorDataStore(directory, max_bytes)
+                _store_created = True
+    return _store
+
+
+def set_sensor_store(store):
+    """Makes get_user_sensor_data use a different store, or no store (None)."""
+    global _store, _store_created
+    with _store_lock:
+        _store = store
+        _store_created = True
@@ -0,0 +1,144 @@
+#############################################################################
+# sensor_store_test.py
+#
+# This file contains tests for sensor_store.py.
+#
+# You will write these tests in Unit 3.
+#############################################################################
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import pyarrow as pa
+
+from sensor_store import SensorDataStore, get_sensor_store, set_sensor_store
+
+
+# The data source the tests store their tables under
+SOURCE = 'bigquery:project.dataset'
+
+
+def make_table(rows):
+    """Returns a sensor data table with `rows` readings."""
+    return pa.table({
+        'SensorId': ['sensor1'] * rows,
+        'SensorValue': [float(value) for value in range(rows)],
+    })
+
+
+class TestSensorDataStore(unittest.TestCase):
+    """Tests the SensorDataStore class."""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = SensorDataStore(self.directory.name)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_round_trip(self):
+        """Tests that a stored table is read back unchanged."""
+        table = make_table(100)
+        self.store.put(SOURCE, 'user1', 'workout1', table)
+
+        result = self.store.get(SOURCE, 'user1', 'workout1')
+
+        self.assertTrue(result.equals(table))
+        self.assertIsNone(self.store.get(SOURCE, 'user1', 'workout2'))
+        self.assertIsNone(self.store.get(SOURCE, 'user2', 'workout1'))
+
+    def test_sources_are_separate(self):
+        """Tests that two backends never read each other's files."""
+        self.store.put(SOURCE, 'user1', 'workout1', make_table(10))
+
+        self.assertIsNone(self.store.get('sqlite:/tmp/local.db', 'user1', 'workout1'))
+        self.assertNotEqual(self.store.path(SOURCE, 'user1', 'workout1'),
+                            self.store.path('bigquery:project.other', 'user1', 'workout1'))
+
+    def test_overwrite(self):
+        """Tests that storing a workout again replaces its file."""
+        self.store.put(SOURCE, 'user1', 'workout1', make_table(10))
+        self.store.put(SOURCE, 'user1', 'workout1', make_table(20))
+
+        self.assertEqual(self.store.get(SOURCE, 'user1', 'workout1').num_rows, 20)
+        self.assertEqual(len(os.listdir(self.directory.name)), 1)
+
+    def test_ids_are_hashed(self):
+        """Tests that IDs with path characters stay inside the directory."""
+        path = self.store.path(SOURCE, '../user', 'workout/1')
+        self.assertEqual(os.path.dirname(path), self.directory.name)
+
+    def test_evicts_least_recently_used(self):
+        """Tests that going over the cap deletes the file read longest ago."""
+        for workout_id in ('workout1', 'workout2', 'workout3'):
+            self.store.put(SOURCE, 'user1', workout_id, make_table(1000))
+        file_size = os.path.getsize(self.store.path(SOURCE, 'user1', 'workout1'))
+        # Read workout1 last so workout2 is the least recently used
+        for age, workout_id in ((30, 'workout1'), (20, 'workout2'), (10, 'workout3')):
+            past = os.path.getmtime(self.store.path(SOURCE, 'user1', workout_id)) - age
+            os.utime(self.store.path(SOURCE, 'user1', workout_id), (past, past))
+        self.store.get(SOURCE, 'user1', 'workout1')
+
+        self.store.max_bytes = 3 * file_size
+        self.store.put(SOURCE, 'user1', 'workout4', make_table(1000))
+
+        self.assertIsNone(self.store.get(SOURCE, 'user1', 'workout2'))
+        for workout_id in ('workout1', 'workout3', 'workout4'):
+            self.assertIsNotNone(self.store.get(SOURCE, 'user1', workout_id))
+        self.assertLessEqual(self.store.size(), self.store.max_bytes)
+
+    def test_keeps_file_just_written(self):
+        """Tests that a file bigger than the cap is still kept."""
+        self.store.max_bytes = 1
+        self.store.put(SOURCE, 'user1', 'workout1', make_table(10))
+        self.store.put(SOURCE, 'user1', 'workout2', make_table(10))
+
+        self.assertIsNone(self.store.get(SOURCE, 'user1', 'workout1'))
+        self.assertIsNotNone(self.store.get(SOURCE, 'user1', 'workout2'))
+
+    def test_clear(self):
+        """Tests that clear deletes every file."""
+        self.store.put(SOURCE, 'user1', 'workout1', make_table(10))
+        self.store.clear()
+        self.assertEqual(self.store.size(), 0)
+        self.assertIsNone(self.store.get(SOURCE, 'user1', 'workout1'))
+
+
+class TestGetSensorStore(unittest.TestCase):
+    """Tests how the shared store is configured."""
+
+    def tearDown(self):
+        set_sensor_store(None)
+
+    def test_from_environment(self):
+        """Tests that the directory and cap come from the environment."""
+        import sensor_store
+        with tempfile.TemporaryDirectory() as directory:
+            with patch.dict(os.environ, {'SENSOR_CACHE_DIR': directory, 'SENSOR_CACHE_MAX_BYTES': '1000'}), \
+                    patch.object(sensor_store, '_store_created', False):
+                store = get_sensor_store()
+            self.assertEqual(store.directory, directory)
+            self.assertEqual(store.max_bytes, 1000)
+
+    def test_turned_off(self):
+        """Tests that a cap of 0 turns the store off."""
+        import sensor_store
+        with tempfile.TemporaryDirectory() as directory:
+            with patch.dict(os.environ, {'SENSOR_CACHE_DIR': directory, 'SENSOR_CACHE_MAX_BYTES': '0'}), \
+                    patch.object(sensor_store, '_store_created', False), \
+                    patch.object(sensor_store, '_store', None):
+                self.assertIsNone(get_sensor_store())
+
+    def test_off_by_default(self):
+        """Tests that the store is only used when SENSOR_CACHE_DIR is set."""
+        import sensor_store
+        environment = {key: value for key, value in os.environ.items() if not key.startswith('SENSOR_CACHE_')}
+        with patch.dict(os.environ, environment, clear=True), \
+                patch.object(sensor_store, '_store_created', False), \
+                patch.object(sensor_store, '_store', None):
+            self.assertIsNone(get_sensor_store())
+
+
+if __name__ == '__main__':
+    unittest.main()
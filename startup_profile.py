@@ -0,0 +1,141 @@
+#############################################################################
+# startup_profile.py
+#
+# This file contains the startup profiling mode, which measures how long
+# each module takes to import.
+#
+# Run the app with STARTUP_PROFILE=1 to print a report of the slowest imports
+# to stderr (the container logs) once the first page has been drawn, or
+# profile a few modules from the command line:
+#
+#     python startup_profile.py modules data_fetcher
+#
+# Times are like `python -X importtime`: 'self' is the time spent running a
+# module's own code and 'cumulative' also includes the modules it imported.
+#############################################################################
+
+import importlib
+import os
+import sys
+import threading
+import time
+
+_timings = {}  # module name -> (self seconds, cumulative seconds)
+_stack = threading.local()
+_finder = None
+_reported = False
+
+
+class _ImportTimer:
+    """A meta path finder that times how long each module takes to load.
+
+    It finds nothing itself. It asks the other finders for the module's spec
+    and wraps the loader's exec_module so the time it takes is recorded.
+    """
+
+    def find_spec(self, fullname, path, target=None):
+        for finder in sys.meta_path:
+            find_spec = getattr(finder, 'find_spec', None)
+            if finder is self or find_spec is None:
+                continue
+            spec = find_spec(fullname, path, target)
+            if spec is not None:
+                break
+        else:
+            return None
+
+        loader = spec.loader
+        # Built-in and frozen modules use the loader class itself, which is
+        # shared by every such module, so they are left alone
+        if loader is not None and not isinstance(loader, type) and hasattr(loader, 'exec_module'):
+            exec_module = loader.exec_module
+            if not getattr(exec_module, '_timed', False):
+                loader.exec_module = _timed(exec_module)
+        return spec
+
+
+def _timed(exec_module):
+    # Wrap a loader's exec_module so it records the module's import time
+    def timed_exec_module(module):
+        frames = _stack.__dict__.setdefault('frames', [])
+        frames.append(0.0)
+        start = time.perf_counter()
+        try:
+            exec_module(module)
+        finally:
+            cumulative = time.perf_counter() - start
+            children = frames.pop()
+            if frames:
+                frames[-1] += cumulative
+            _timings[module.__name__] = (cumulative - children, cumulative)
+
+    timed_exec_module._timed = True
+    return timed_exec_module
+
+
+def enable():
+    """Starts timing imports. Modules that were already imported aren't
+    included in the report."""
+    global _finder
+    if _finder is None:
+        _finder = _ImportTimer()
+        sys.meta_path.insert(0, _finder)
+
+
+def disable():
+    """Stops timing imports and forgets the recorded timings."""
+    global _finder, _reported
+    if _finder is not None:
+        sys.meta_path.remove(_finder)
+        _finder = None
+    _timings.clear()
+    _reported = False
+
+
+def enabled():
+    """Returns True while imports are being timed."""
+    return _finder is not None
+
+
+def enable_from_env():
+    """Starts timing imports if the STARTUP_PROFILE environment variable is set."""
+    if os.environ.get('STARTUP_PROFILE'):
+        enable()
+
+
+def report(limit=25):
+    """Returns the slowest imports so far.
+
+    Args:
+        limit (int, optional): How many modules to return. None returns all.
+
+    Returns:
+        list: (module name, self seconds, cumulative seconds) tuples, slowest
+            cumulative time first.
+    """
+    rows = sorted(((name,) + times for name, times in _timings.items()), key=lambda row: row[2], reverse=True)
+    return rows if limit is None else rows[:limit]
+
+
+def print_report(limit=25, file=None):
+    """Prints report(limit) as a table (to stderr by default)."""
+    file = file if file is not None else sys.stderr
+    print(f"{'self (ms)':>10} {'cumulative (ms)':>16}  module", file=file)
+    for name, self_time, cumulative in report(limit):
+        print(f"{self_time * 1000:10.1f} {cumulative * 1000:16.1f}  {name}", file=file)
+
+
+def print_report_once(limit=25):
+    """Prints the report the first time it is called while profiling is on,
+    for example after the app's first page has been drawn."""
+    global _reported
+    if enabled() and not _reported:
+        _reported = True
+        print_report(limit)
+
+
+if __name__ == '__main__':
+    enable()
+    for module_name in sys.argv[1:] or ['modules']:
+        importlib.import_module(module_name)
+    print_report()
@@ -0,0 +1,79 @@
+#############################################################################
+# startup_profile_test.py
+#
+# This file contains tests for startup_profile.py and for keeping slow
+# dependencies out of the app's imports.
+#############################################################################
+
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+import unittest.mock
+
+import startup_profile
+
+
+class TestStartupProfile(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        with open(os.path.join(self.directory.name, 'profiled_outer.py'), 'w') as file:
+            file.write("import time\nimport profiled_inner\ntime.sleep(0.02)\n")
+        with open(os.path.join(self.directory.name, 'profiled_inner.py'), 'w') as file:
+            file.write("import time\ntime.sleep(0.05)\n")
+        sys.path.insert(0, self.directory.name)
+
+    def tearDown(self):
+        startup_profile.disable()
+        sys.path.remove(self.directory.name)
+        sys.modules.pop('profiled_outer', None)
+        sys.modules.pop('profiled_inner', None)
+        self.directory.cleanup()
+
+    def test_times_nested_imports(self):
+        """Tests that each module's own time excludes the modules it imports."""
+        startup_profile.enable()
+        import profiled_outer  # noqa: F401
+
+        timings = {name: (self_time, cumulative) for name, self_time, cumulative in startup_profile.report(None)}
+        self.assertGreaterEqual(timings['profiled_inner'][0], 0.05)
+        self.assertGreaterEqual(timings['profiled_outer'][1], 0.07)
+        self.assertLess(timings['profiled_outer'][0], 0.05)
+        self.assertEqual(startup_profile.report(1)[0][0], 'profiled_outer')
+
+    def test_report_printed_once(self):
+        """Tests that the report is only printed once, and only while profiling."""
+        with unittest.mock.patch('sys.stderr', new_callable=io.StringIO) as stderr:
+            startup_profile.print_report_once()
+            self.assertEqual(stderr.getvalue(), '')
+            startup_profile.enable()
+            import profiled_outer  # noqa: F401
+            startup_profile.print_report_once()
+            startup_profile.print_report_once()
+        self.assertEqual(stderr.getvalue().count('profiled_outer'), 1)
+
+
+class TestLazyImports(unittest.TestCase):
+
+    def test_slow_dependencies_not_imported(self):
+        """Tests that importing the app's modules doesn't import the slow dependencies."""
+        code = ("import sys, modules, data_fetcher; "
+                "print(sorted(m for m in ('vertexai', 'google.cloud.bigquery', 'matplotlib', 'pandas') if m in sys.modules))")
+        result = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True,
+                                cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+        self.assertEqual(result.stdout.strip(), '[]')
+
+    def test_lazy_attributes(self):
+        """Tests that the slow dependencies are still reachable through data_fetcher."""
+        import data_fetcher
+        from google.cloud import bigquery
+        self.assertIs(data_fetcher.bigquery, bigquery)
+        with self.assertRaises(AttributeError):
+            data_fetcher.not_a_dependency
+
+
+if __name__ == "__main__":
+    unittest.main()